@@ -1,59 +1,37 @@
 # Converted from Jupyter Notebook
 
-import joblib
+import os
+import sys
+import subprocess
 import pandas as pd
 from openpyxl import load_workbook
 from openpyxl.styles import Alignment
 from datetime import datetime, timedelta
-from statsmodels.tsa.statespace.sarimax import SARIMAX
 import matplotlib.pyplot as plt
 from sklearn.metrics import mean_absolute_error
 
-# Sauvegarde et rechargement du modèle
-MODEL_PATH = 'sarima_model.joblib'
+# Sauvegarde et rechargement du modèle (versions publiées via model_store)
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_FILENAME = 'sarima_model.joblib'
+sys.path.append(os.path.dirname(MODEL_DIR))
+from model_store import artifact_path, publish_version
+from sarima_search import fit_sarima, load_selected_orders, model_metadata
+from sarima_artifact import SLIM_FILENAME, load_sarima, slim_sarima
 
-# Définir les chemins des fichiers d'entrée et de sortie
-input_files = {
-    2022: 'PRESENCE_2022.xlsx',
-    2023: 'PRESENCE_2023.xlsx',
-    2024: 'PRESENCE_2024.xlsx'
-}
-output_files = {
-    2022: 'Total_Presents_2022.xlsx',
-    2023: 'Total_Presents_2023.xlsx',
-    2024: 'Total_Presents_2024.xlsx'
-}
-final_output_file = 'Total_Presents_Final.xlsx'
-
-# Fonction pour traiter un fichier donné et générer un fichier avec une colonne "Année"
-def process_file(file_path, year, output_path):
-    excel_data = pd.ExcelFile(file_path)
-    week_sheets = sorted([sheet for sheet in excel_data.sheet_names if sheet.startswith('S')])
-    
-    results = []
-    for sheet in week_sheets:
-        data = pd.read_excel(file_path, sheet_name=sheet, header=None)
-        row_index = data.apply(lambda row: row.astype(str).str.contains("Total présents", case=False, na=False).any(), axis=1)
-        row_indices = row_index[row_index].index.tolist()
-        
-        if row_indices:
-            target_row = data.iloc[row_indices[0]]
-            row_sum = pd.to_numeric(target_row, errors='coerce').sum()
-            
-            # Soustraire 14 pour les années 2022 et 2023
-            if year in [2022, 2023]:
-                row_sum = max(0, row_sum - 14)  # Assure que le total reste positif
-            
-            results.append({'Annee': year, 'Semaines': sheet, 'Presences': row_sum})
-        else:
-            results.append({'Annee': year, 'Semaines': sheet, 'Presences': 0})
-    
-    results_df = pd.DataFrame(results)
-    results_df.to_excel(output_path, index=False)
+SEARCH_ORDERS = '--search' in sys.argv[1:] or os.getenv('RH_SARIMA_SEARCH') == '1'
+
+# Chemins des fichiers et lecture des classeurs de présence : voir transform_RH
+# (un seul passage en lecture seule par classeur). Ce script n'a pas de bloc
+# __main__ : les années sont traitées dans ce processus (n_jobs=1).
+from transform_RH import input_files, output_files, final_output_file, process_years
 
 # Traiter chaque fichier (2022, 2023, 2024)
-for year, input_file in input_files.items():
-    process_file(input_file, year, output_files[year])
+errors = {year: error for year, error in process_years(
+    [(input_file, year, output_files[year]) for year, input_file in input_files.items()],
+    n_jobs=1
+).items() if error is not None}
+if errors:
+    raise RuntimeError(f"Erreur lors du traitement des fichiers de présence : {errors}")
 
 # Fusionner les fichiers en un seul fichier final
 final_results = []
@@ -85,18 +63,24 @@ time_series = df['Presences']
 train = time_series[:-10]
 test = time_series[-10:]
 
+# --search : recherche parallèle des ordres SARIMA (sarima_search.py, lancé dans son
+# propre processus) puis réentraînement avec les ordres retenus
+if SEARCH_ORDERS:
+    subprocess.run([sys.executable, '-u', os.path.join(MODEL_DIR, 'sarima_search.py'), '--input', final_output_file], check=True)
+
 # Vérifier si le modèle est déjà sauvegardé
-try:
-    sarima_model = joblib.load(MODEL_PATH)
-    print("Modèle chargé depuis", MODEL_PATH)
-except FileNotFoundError:
-    # Si le modèle n'existe pas, l'entraîner et le sauvegarder
-    p, d, q = 2, 1, 2
-    P, D, Q, s = 1, 1, 1, 52
-    model = SARIMAX(train, order=(p, d, q), seasonal_order=(P, D, Q, s), enforce_stationarity=False, enforce_invertibility=False)
-    sarima_model = model.fit(disp=False)
-    joblib.dump(sarima_model, MODEL_PATH)
-    print("Modèle entraîné et sauvegardé dans", MODEL_PATH)
+# (artefact allégé, ou pickle complet des versions publiées avant lui)
+model_path = artifact_path(MODEL_DIR, MODEL_FILENAME)
+slim_path = artifact_path(MODEL_DIR, SLIM_FILENAME)
+if not SEARCH_ORDERS and (os.path.exists(slim_path) or os.path.exists(model_path)):
+    sarima_model, model_format = load_sarima(slim_path, model_path)
+    print("Modèle chargé depuis", slim_path if model_format == 'slim' else model_path)
+else:
+    # Ordres retenus par la dernière recherche, sinon (2, 1, 2)x(1, 1, 1, 52)
+    order, seasonal_order, order_source = load_selected_orders()
+    print(f"Ordres SARIMA{order}x{seasonal_order} ({order_source})")
+    sarima_model = fit_sarima(train, order, seasonal_order)
+    print("Modèle entraîné")
 
 # Prédictions et mise à jour du modèle
 forecast = sarima_model.get_forecast(steps=len(test))
@@ -107,9 +91,9 @@ mae_percentage = (mae / test.mean()) * 100
 print(f"Erreur absolue moyenne (MAE) : {mae:.2f}")
 print(f"Précision moyenne : {100 - mae_percentage:.2f}%")
 
-# Sauvegarder les modifications dans le modèle
-joblib.dump(sarima_model, MODEL_PATH)
-print("Modèle mis à jour et resauvegardé.")
+# Publier le modèle dans une nouvelle version (bascule atomique du pointeur CURRENT)
+version = publish_version(MODEL_DIR, {SLIM_FILENAME: slim_sarima(sarima_model)}, metadata=model_metadata(sarima_model))
+print(f"Version publiée : {version}")
 
 import json
 from datetime import datetime
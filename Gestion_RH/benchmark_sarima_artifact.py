@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Compare le pickle complet du modèle SARIMA (sarima_model.joblib) et l'artefact
+allégé (sarima_model.slim.joblib) : taille sur disque, temps de chargement
+jusqu'à la première prévision, mémoire allouée et écart entre les prévisions.
+
+Utilise le modèle publié s'il est lisible, sinon entraîne un modèle avec les
+ordres retenus sur le fichier consolidé des présences.
+
+    python benchmark_sarima_artifact.py [--repeat 5] [--steps 104] [--output bench.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(MODEL_DIR))
+from model_store import artifact_path
+from sarima_artifact import SLIM_FILENAME, restore_sarima, slim_sarima
+from sarima_search import HOLDOUT_WEEKS, INPUT_FILE, fit_sarima, load_presence_series, load_selected_orders
+
+MODEL_FILENAME = 'sarima_model.joblib'
+
+def load_or_fit(input_file):
+    model_path = artifact_path(MODEL_DIR, MODEL_FILENAME)
+    try:
+        sarima_model = joblib.load(model_path)
+        print(f"Modèle chargé depuis {model_path}")
+        return sarima_model
+    except Exception as e:
+        print(f"Modèle publié illisible ({e}), entraînement sur {input_file}")
+    order, seasonal_order, _ = load_selected_orders()
+    series = load_presence_series(input_file)
+    return fit_sarima(series[:-HOLDOUT_WEEKS], order, seasonal_order)
+
+def measure(load, repeat):
+    """Meilleur temps de chargement + première prévision, et pic de mémoire allouée (octets)"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = load()
+        result.get_forecast(steps=1)
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    result = load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(durations), peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des artefacts du modèle SARIMA RH")
+    parser.add_argument('--input', default=os.path.join(MODEL_DIR, INPUT_FILE), help="Fichier consolidé des présences")
+    parser.add_argument('--repeat', type=int, default=5, help="Nombre de chargements mesurés")
+    parser.add_argument('--steps', type=int, default=104, help="Horizon des prévisions comparées (semaines)")
+    parser.add_argument('--output', help="Écrit les résultats en JSON dans ce fichier")
+    args = parser.parse_args()
+
+    sarima_model = load_or_fit(args.input)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy_path = os.path.join(tmp_dir, MODEL_FILENAME)
+        slim_path = os.path.join(tmp_dir, SLIM_FILENAME)
+        joblib.dump(sarima_model, legacy_path)
+        joblib.dump(slim_sarima(sarima_model), slim_path)
+
+        legacy, legacy_seconds, legacy_peak = measure(lambda: joblib.load(legacy_path), args.repeat)
+        slim, slim_seconds, slim_peak = measure(lambda: restore_sarima(joblib.load(slim_path)), args.repeat)
+        results = {
+            'legacy_bytes': os.path.getsize(legacy_path),
+            'slim_bytes': os.path.getsize(slim_path),
+            'legacy_load_seconds': legacy_seconds,
+            'slim_load_seconds': slim_seconds,
+            'legacy_peak_memory_bytes': legacy_peak,
+            'slim_peak_memory_bytes': slim_peak
+        }
+
+    legacy_forecast = legacy.get_forecast(steps=args.steps)
+    slim_forecast = slim.get_forecast(steps=args.steps)
+    results['max_mean_difference'] = float(np.max(np.abs(
+        np.asarray(legacy_forecast.predicted_mean) - np.asarray(slim_forecast.predicted_mean))))
+    results['max_interval_difference'] = float(np.max(np.abs(
+        np.asarray(legacy_forecast.conf_int()) - np.asarray(slim_forecast.conf_int()))))
+
+    print(f"\n{'':<22}{'complet':>14}{'allégé':>14}")
+    print(f"{'Taille (Mo)':<22}{results['legacy_bytes'] / 1e6:>14.3f}{results['slim_bytes'] / 1e6:>14.3f}")
+    print(f"{'Chargement (ms)':<22}{legacy_seconds * 1e3:>14.1f}{slim_seconds * 1e3:>14.1f}")
+    print(f"{'Mémoire allouée (Mo)':<22}{legacy_peak / 1e6:>14.3f}{slim_peak / 1e6:>14.3f}")
+    print(f"\nÉcart maximal sur {args.steps} semaines : prévision {results['max_mean_difference']:.2e}, "
+          f"intervalles {results['max_interval_difference']:.2e}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == "__main__":
+    main()
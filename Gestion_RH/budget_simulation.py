@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Simulation Monte-Carlo du budget de personnel à partir du modèle SARIMA RH.
+
+Les trajectoires futures des présences hebdomadaires sont tirées directement
+dans la représentation espace d'états du modèle :
+
+    y_t     = d + Z a_t + eps_t,        eps_t ~ N(0, H)
+    a_(t+1) = c + T a_t + R eta_t,      eta_t ~ N(0, Q)
+
+en partant de l'état prédit à la fin des données (et de son incertitude).
+Toutes les trajectoires avancent ensemble, une semaine à la fois, par produit
+matriciel (T est creuse : matrice compagnon de la partie ARIMA saisonnière) :
+aucune boucle Python par trajectoire (SARIMAXResults.simulate avec
+`repetitions` refait une simulation complète par répétition).
+
+Les coûts sont ensuite appliqués par scénario, sur les mêmes trajectoires :
+
+    coût_semaine = présences x facteur_présences x taux_semaine + coût_fixe_semaine
+"""
+
+import numpy as np
+from scipy import sparse
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+def _normal_factor(cov):
+    """Facteur L tel que L L' = cov, valable pour une covariance seulement semi-définie positive"""
+    cov = (cov + cov.T) / 2
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
+    return eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+
+def simulate_paths(sarima_model, steps, n_paths, seed=None):
+    """
+    Tire `n_paths` trajectoires des `steps` prochaines valeurs du modèle
+
+    Returns:
+        np.ndarray: tableau (n_paths, steps)
+    """
+    rng = np.random.default_rng(seed)
+    ssm = sarima_model.model.ssm
+    if ssm.k_endog != 1 or not ssm.time_invariant:
+        raise ValueError("Seuls les modèles univariés à matrices constantes sont pris en charge")
+    design = np.asarray(ssm['design'], dtype=float)                  # (1, k_states)
+    obs_intercept = np.asarray(ssm['obs_intercept'], dtype=float)    # (1,)
+    obs_cov = np.asarray(ssm['obs_cov'], dtype=float)                # (1, 1)
+    transition = np.asarray(ssm['transition'], dtype=float)          # (k_states, k_states)
+    state_intercept = np.asarray(ssm['state_intercept'], dtype=float)  # (k_states,)
+    selection = np.asarray(ssm['selection'], dtype=float)            # (k_states, k_posdef)
+    state_cov = np.asarray(ssm['state_cov'], dtype=float)            # (k_posdef, k_posdef)
+
+    # État prédit pour la première semaine future, sachant toutes les données
+    state_mean = np.asarray(sarima_model.predicted_state[:, -1], dtype=float)
+    state_factor = _normal_factor(np.asarray(sarima_model.predicted_state_cov[:, :, -1], dtype=float))
+    states = state_mean + rng.standard_normal((n_paths, state_mean.size)) @ state_factor.T
+
+    # Chocs de toutes les semaines tirés en une fois
+    obs_std = np.sqrt(max(float(obs_cov[0, 0]), 0.0))
+    obs_shocks = rng.standard_normal((steps, n_paths)) * obs_std
+    shock_factor = selection @ _normal_factor(state_cov)  # (k_states, k_posdef)
+    state_shocks = rng.standard_normal((steps, n_paths, shock_factor.shape[1]))
+
+    # États en colonnes (k_states, n_paths) pour multiplier à gauche par T creuse
+    states = np.ascontiguousarray(states.T)
+    transition = sparse.csr_matrix(transition)
+    paths = np.empty((n_paths, steps))
+    design_row = design[0]
+    state_intercept = state_intercept[:, None]
+    for t in range(steps):
+        paths[:, t] = obs_intercept[0] + design_row @ states + obs_shocks[t]
+        states = state_intercept + transition @ states + shock_factor @ state_shocks[t].T
+    return paths
+
+def expand_rates(rates, steps):
+    """Taux par semaine sur l'horizon : un taux unique, ou une liste complétée avec son dernier taux"""
+    rates = np.atleast_1d(np.asarray(rates, dtype=float))
+    if rates.size == 0:
+        raise ValueError("Aucun taux de coût fourni")
+    if rates.size >= steps:
+        return rates[:steps]
+    return np.concatenate([rates, np.full(steps - rates.size, rates[-1])])
+
+def weekly_costs(paths, rates, presence_factor=1.0, fixed_weekly_cost=0.0):
+    """Coût de chaque semaine de chaque trajectoire (présences négatives ramenées à 0)"""
+    presences = np.clip(paths, 0, None) * presence_factor
+    return presences * expand_rates(rates, paths.shape[1]) + fixed_weekly_cost
+
+def summarize(values, quantiles=DEFAULT_QUANTILES):
+    """
+    Quantiles et moyenne par semaine (colonnes de `values`)
+
+    Returns:
+        dict: {'mean': [...], 'q5': [...], 'q50': [...], ...}
+    """
+    levels = np.quantile(values, quantiles, axis=0)
+    summary = {'mean': values.mean(axis=0)}
+    for q, level in zip(quantiles, levels):
+        summary[quantile_key(q)] = level
+    return summary
+
+def quantile_key(q):
+    return f"q{round(q * 100, 2):g}"
+
+def simulate_budget(sarima_model, steps, scenarios, n_paths=5000, quantiles=DEFAULT_QUANTILES, seed=None):
+    """
+    Simule les présences puis applique chaque scénario de coût aux mêmes trajectoires
+
+    Args:
+        scenarios: liste de dict {'name', 'rates', 'presence_factor', 'fixed_weekly_cost'}
+
+    Returns:
+        dict: {'presences': résumé hebdomadaire, 'scenarios': {nom: {'weekly', 'cumulative', 'total'}}}
+    """
+    paths = simulate_paths(sarima_model, steps, n_paths, seed=seed)
+    results = {'presences': summarize(np.clip(paths, 0, None), quantiles), 'scenarios': {}}
+    for scenario in scenarios:
+        costs = weekly_costs(paths, scenario['rates'], scenario.get('presence_factor', 1.0),
+                             scenario.get('fixed_weekly_cost', 0.0))
+        cumulative = np.cumsum(costs, axis=1)
+        results['scenarios'][scenario['name']] = {
+            'weekly': summarize(costs, quantiles),
+            'cumulative': summarize(cumulative, quantiles),
+            'total': {key: float(values[-1]) for key, values in summarize(cumulative[:, -1:], quantiles).items()}
+        }
+    return results
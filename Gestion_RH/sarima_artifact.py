@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Artefact allégé du modèle SARIMA RH.
+
+joblib.dump(sarima_model) sérialise tout l'objet de résultats statsmodels :
+données d'entraînement, sorties du filtre et du lissage pour chaque semaine,
+matrices de covariance... La prévision n'a besoin que de la spécification du
+modèle, des paramètres estimés et de l'état du filtre de Kalman à la fin des
+données. L'artefact allégé ne garde que cela, plus les dernières observations :
+
+    slim = slim_sarima(sarima_model)      # dictionnaire de tableaux numpy
+    sarima_model = restore_sarima(slim)   # résultats prêts pour get_forecast/simulate
+
+La restauration construit un SARIMAX sur ces dernières observations, initialisé
+avec l'état prédit (et sa covariance) de la première d'entre elles, puis le
+filtre avec les paramètres enregistrés sans réestimation. Le filtre étant
+déterministe, l'état final est celui du modèle complet : les prévisions et
+intervalles sont identiques. L'index de ces observations (dates et fréquence,
+ou positions entières) est conservé : get_forecast retourne les mêmes Series
+et DataFrame indexés que le modèle complet.
+"""
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+SLIM_FILENAME = 'sarima_model.slim.joblib'
+SLIM_FORMAT_VERSION = 2
+# Version 1 : observations sans index (prévisions en tableaux numpy)
+SUPPORTED_FORMAT_VERSIONS = (1, 2)
+# Observations conservées (les résultats restaurés n'exposent que celles-ci)
+TAIL_LENGTH = 10
+
+def _index_record(index):
+    """Index des observations conservées, sous forme de tableaux numpy et d'une fréquence"""
+    if isinstance(index, pd.PeriodIndex):
+        return {'kind': 'period', 'values': index.to_timestamp().to_numpy(), 'freq': index.freqstr}
+    if isinstance(index, pd.DatetimeIndex):
+        return {'kind': 'datetime', 'values': index.to_numpy(), 'freq': index.freqstr}
+    return {'kind': 'range', 'values': np.asarray(index, dtype=np.int64), 'freq': None}
+
+def _restore_index(record):
+    if record['kind'] == 'period':
+        return pd.DatetimeIndex(record['values']).to_period(record['freq'])
+    if record['kind'] == 'datetime':
+        return pd.DatetimeIndex(record['values'], freq=record['freq'])
+    values = record['values']
+    return pd.RangeIndex(int(values[0]), int(values[-1]) + 1)
+
+def slim_sarima(sarima_model, tail=TAIL_LENGTH):
+    """Extrait d'un résultat SARIMAX ce qu'il faut pour prévoir"""
+    model = sarima_model.model
+    nobs = int(sarima_model.nobs)
+    tail = max(1, min(tail, nobs))
+    start = nobs - tail
+    return {
+        'format_version': SLIM_FORMAT_VERSION,
+        'spec': {
+            'order': list(model.order),
+            'seasonal_order': list(model.seasonal_order),
+            'trend': model.trend,
+            'enforce_stationarity': bool(model.enforce_stationarity),
+            'enforce_invertibility': bool(model.enforce_invertibility),
+            'simple_differencing': bool(model.simple_differencing),
+            'concentrate_scale': bool(model.concentrate_scale)
+        },
+        'param_names': list(model.param_names),
+        'params': np.asarray(sarima_model.params, dtype=float),
+        'endog': np.asarray(model.endog, dtype=float)[start:, 0],
+        # Index résolu par statsmodels (dates avec fréquence, ou positions entières) ;
+        # aucun pour un modèle ajusté sur un tableau numpy (prévisions en tableaux)
+        'index': _index_record(model._index[start:]) if model.data.row_labels is not None else None,
+        # État prédit pour la première observation conservée, sachant les précédentes
+        'state': np.asarray(sarima_model.predicted_state[:, start], dtype=float),
+        'state_cov': np.asarray(sarima_model.predicted_state_cov[:, :, start], dtype=float)
+    }
+
+def restore_sarima(slim):
+    """Reconstruit des résultats SARIMAX prêts à prévoir à partir de l'artefact allégé"""
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    if slim.get('format_version') not in SUPPORTED_FORMAT_VERSIONS:
+        raise ValueError(f"Format d'artefact SARIMA non pris en charge : {slim.get('format_version')}")
+    spec = slim['spec']
+    endog = slim['endog']
+    if slim.get('index') is not None:
+        endog = pd.Series(endog, index=_restore_index(slim['index']))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = SARIMAX(endog, order=tuple(spec['order']),
+                        seasonal_order=tuple(spec['seasonal_order']), trend=spec['trend'],
+                        enforce_stationarity=spec['enforce_stationarity'],
+                        enforce_invertibility=spec['enforce_invertibility'],
+                        simple_differencing=spec['simple_differencing'],
+                        concentrate_scale=spec['concentrate_scale'])
+        if list(model.param_names) != list(slim['param_names']):
+            raise ValueError("Les paramètres de l'artefact ne correspondent pas à la spécification SARIMA")
+        model.ssm.initialize_known(slim['state'], slim['state_cov'])
+        return model.filter(slim['params'])
+
+def load_sarima(slim_path, legacy_path):
+    """
+    Charge l'artefact allégé s'il existe, sinon le pickle complet (versions
+    publiées avant l'artefact allégé)
+
+    Returns:
+        tuple: (résultats SARIMAX, 'slim' ou 'legacy')
+    """
+    import joblib
+
+    if os.path.exists(slim_path):
+        return restore_sarima(joblib.load(slim_path)), 'slim'
+    if os.path.exists(legacy_path):
+        return joblib.load(legacy_path), 'legacy'
+    raise FileNotFoundError(f"Aucun modèle SARIMA trouvé : {slim_path}")
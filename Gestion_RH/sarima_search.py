@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Recherche parallèle des ordres SARIMA du modèle RH.
+
+Chaque combinaison (p, d, q)(P, D, Q, s) de la grille est ajustée dans son
+propre processus, au plus n_jobs à la fois ; un ajustement qui dépasse le délai
+est interrompu. Les candidats sont classés par AIC et par MAE sur les
+dernières semaines (holdout) et le rapport est écrit en JSON. Les scripts
+d'entraînement lisent ensuite les ordres retenus dans ce rapport.
+
+    python sarima_search.py [--p 0,1,2] [--q 0,1,2] [--timeout 300] [--n-jobs 4]
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(MODEL_DIR))
+from process_tasks import run_process_tasks
+
+REPORT_FILENAME = 'sarima_search_report.json'
+INPUT_FILE = 'Total_Presents_Final.xlsx'
+
+# Ordres utilisés tant qu'aucune recherche n'a été faite
+DEFAULT_ORDER = (2, 1, 2)
+DEFAULT_SEASONAL_ORDER = (1, 1, 1, 52)
+DEFAULT_GRID = {
+    'p': (0, 1, 2), 'd': (1,), 'q': (0, 1, 2),
+    'P': (0, 1), 'D': (1,), 'Q': (0, 1), 's': 52
+}
+DEFAULT_TIMEOUT = 300
+HOLDOUT_WEEKS = 10
+
+# Convertir Année et Semaines en Date
+def year_week_to_date(year, week):
+    first_day = datetime(year, 1, 1)
+    first_week_start = first_day + timedelta(days=(7 - first_day.weekday()))  # Premier lundi
+    return first_week_start + timedelta(weeks=week - 1)
+
+def load_presence_series(input_file=INPUT_FILE):
+    """Série hebdomadaire des présences, comme dans train_RH"""
+    df = pd.read_excel(input_file)
+    df['Annee'] = df['Annee'].ffill()
+    df = df.dropna(subset=['Semaines', 'Presences'])
+    df['Semaines'] = df['Semaines'].str.extract(r'(\d+)').astype(int)
+    df['Date'] = df.apply(lambda row: year_week_to_date(int(row['Annee']), int(row['Semaines'])), axis=1)
+    return df.set_index('Date')['Presences']
+
+def build_grid(p, d, q, P, D, Q, s):
+    """Liste des candidats [(order, seasonal_order)]"""
+    return [
+        ((p_, d_, q_), (P_, D_, Q_, s))
+        for p_, d_, q_, P_, D_, Q_ in itertools.product(p, d, q, P, D, Q)
+    ]
+
+def fit_sarima(train, order, seasonal_order):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = SARIMAX(train, order=tuple(order), seasonal_order=tuple(seasonal_order),
+                        enforce_stationarity=False, enforce_invertibility=False)
+        return model.fit(disp=False)
+
+def _evaluate_candidate(conn, train, test, order, seasonal_order):
+    """Exécuté dans un processus dédié : envoie AIC et MAE holdout par le pipe"""
+    start = time.perf_counter()
+    try:
+        fitted = fit_sarima(train, order, seasonal_order)
+        forecast = np.asarray(fitted.get_forecast(steps=len(test)).predicted_mean, dtype=float)
+        conn.send({
+            'status': 'ok',
+            'aic': float(fitted.aic),
+            'mae': float(np.mean(np.abs(np.asarray(test, dtype=float) - forecast))),
+            'fit_seconds': time.perf_counter() - start
+        })
+    except Exception as e:
+        conn.send({'status': 'error', 'error': str(e), 'fit_seconds': time.perf_counter() - start})
+    finally:
+        conn.close()
+
+def search_orders(train, test, grid, n_jobs=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Ajuste chaque candidat dans son propre processus (au plus n_jobs à la fois).
+    Un processus qui dépasse `timeout` secondes est arrêté et le candidat
+    marqué 'timeout' (voir process_tasks).
+
+    Returns:
+        list: résultats classés (voir rank_candidates)
+    """
+    results = []
+
+    def record(candidate, result):
+        order, seasonal_order = candidate
+        results.append({'order': list(order), 'seasonal_order': list(seasonal_order), **result})
+        scores = f"AIC={result['aic']:.1f}, MAE={result['mae']:.2f}" if result['status'] == 'ok' else result.get('error', '')
+        print(f"   [{len(results)}/{len(grid)}] SARIMA{tuple(order)}x{tuple(seasonal_order)} : {result['status']} {scores}")
+
+    tasks = [((order, seasonal_order), (train, test, order, seasonal_order)) for order, seasonal_order in grid]
+    run_process_tasks(tasks, _evaluate_candidate, n_jobs=n_jobs, timeout=timeout, on_result=record)
+    return rank_candidates(results)
+
+def rank_candidates(results):
+    """
+    Classe les candidats ajustés par la moyenne de leur rang AIC et de leur
+    rang MAE holdout (à égalité, la plus petite MAE) ; les échecs et
+    dépassements de délai sont placés à la fin, sans rang
+    """
+    ok = [r for r in results if r['status'] == 'ok' and math.isfinite(r['aic']) and math.isfinite(r['mae'])]
+    ok_ids = {id(r) for r in ok}
+    failed = [r for r in results if id(r) not in ok_ids]
+    aic_rank = {id(r): i + 1 for i, r in enumerate(sorted(ok, key=lambda r: r['aic']))}
+    mae_rank = {id(r): i + 1 for i, r in enumerate(sorted(ok, key=lambda r: r['mae']))}
+    for r in ok:
+        r['aic_rank'], r['mae_rank'] = aic_rank[id(r)], mae_rank[id(r)]
+        r['score'] = (r['aic_rank'] + r['mae_rank']) / 2
+    ranked = sorted(ok, key=lambda r: (r['score'], r['mae']))
+    for i, r in enumerate(ranked):
+        r['rank'] = i + 1
+    return ranked + [{**r, 'rank': None} for r in failed]
+
+def run_search(series, grid, holdout=HOLDOUT_WEEKS, n_jobs=None, timeout=DEFAULT_TIMEOUT,
+               report_path=os.path.join(MODEL_DIR, REPORT_FILENAME)):
+    """Lance la recherche sur la série et écrit le rapport JSON ; retourne le rapport"""
+    train, test = series[:-holdout], series[-holdout:]
+    print(f"Recherche des ordres SARIMA : {len(grid)} candidats, délai {timeout}s par candidat")
+    start = time.perf_counter()
+    ranked = search_orders(train, test, grid, n_jobs=n_jobs, timeout=timeout)
+    best = ranked[0] if ranked and ranked[0]['rank'] == 1 else None
+    report = {
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'elapsed_seconds': time.perf_counter() - start,
+        'train_weeks': len(train),
+        'holdout_weeks': len(test),
+        'timeout_seconds': timeout,
+        'candidates_count': len(grid),
+        'fitted_count': sum(1 for r in ranked if r['status'] == 'ok'),
+        'timeout_count': sum(1 for r in ranked if r['status'] == 'timeout'),
+        'best': best,
+        'candidates': ranked
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    print(f"Recherche terminée en {report['elapsed_seconds']:.1f}s "
+          f"({report['fitted_count']} ajustés, {report['timeout_count']} hors délai)")
+    if best:
+        print(f"Meilleur candidat : SARIMA{tuple(best['order'])}x{tuple(best['seasonal_order'])} "
+              f"(AIC={best['aic']:.1f}, MAE holdout={best['mae']:.2f})")
+    print(f"Rapport écrit dans {report_path}")
+    return report
+
+def load_selected_orders(report_path=os.path.join(MODEL_DIR, REPORT_FILENAME)):
+    """
+    Ordres retenus par la dernière recherche, sinon les ordres par défaut
+
+    Returns:
+        tuple: (order, seasonal_order, source) avec source 'search' ou 'default'
+    """
+    try:
+        with open(report_path) as f:
+            best = json.load(f).get('best')
+    except (FileNotFoundError, json.JSONDecodeError):
+        best = None
+    if not best:
+        return DEFAULT_ORDER, DEFAULT_SEASONAL_ORDER, 'default'
+    return tuple(best['order']), tuple(best['seasonal_order']), 'search'
+
+def model_metadata(sarima_model, report_path=os.path.join(MODEL_DIR, REPORT_FILENAME)):
+    """
+    Ordres du modèle publié et, s'ils viennent de la dernière recherche, le
+    résumé de son rapport (enregistrés dans metadata.json de la version)
+    """
+    order = list(sarima_model.model.order)
+    seasonal_order = list(sarima_model.model.seasonal_order)
+    metadata = {'order': order, 'seasonal_order': seasonal_order}
+    try:
+        with open(report_path) as f:
+            report = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return metadata
+    best = report.get('best')
+    if best and best['order'] == order and best['seasonal_order'] == seasonal_order:
+        metadata['order_search'] = {
+            key: report[key] for key in ('generated_at', 'candidates_count', 'fitted_count', 'timeout_count', 'best')
+        }
+    return metadata
+
+def _int_list(value):
+    return tuple(int(v) for v in value.split(','))
+
+def main():
+    parser = argparse.ArgumentParser(description="Recherche parallèle des ordres SARIMA du modèle RH")
+    parser.add_argument('--input', default=INPUT_FILE, help="Fichier consolidé des présences")
+    for name in ('p', 'd', 'q', 'P', 'D', 'Q'):
+        parser.add_argument(f'--{name}', type=_int_list, default=DEFAULT_GRID[name],
+                            help=f"Valeurs de {name} (ex. 0,1,2)")
+    parser.add_argument('--s', type=int, default=DEFAULT_GRID['s'], help="Période saisonnière")
+    parser.add_argument('--holdout', type=int, default=HOLDOUT_WEEKS, help="Semaines réservées à l'évaluation")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="Délai maximal par candidat (secondes)")
+    parser.add_argument('--n-jobs', type=int, default=None, help="Nombre de processus (par défaut : nombre de CPU)")
+    parser.add_argument('--report', default=os.path.join(MODEL_DIR, REPORT_FILENAME), help="Chemin du rapport JSON")
+    args = parser.parse_args()
+
+    series = load_presence_series(args.input)
+    grid = build_grid(args.p, args.d, args.q, args.P, args.D, args.Q, args.s)
+    report = run_search(series, grid, holdout=args.holdout, n_jobs=args.n_jobs,
+                        timeout=args.timeout, report_path=args.report)
+    if report['best'] is None:
+        raise SystemExit("Aucun candidat n'a pu être ajusté")
+
+if __name__ == "__main__":
+    main()
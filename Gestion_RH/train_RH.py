@@ -1,14 +1,22 @@
-import joblib
+import os
+import sys
+import subprocess
 import pandas as pd
 import json
 import numpy as np
 from datetime import datetime, timedelta
-from statsmodels.tsa.statespace.sarimax import SARIMAX
 import matplotlib.pyplot as plt
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
-# Sauvegarde et rechargement du modèle
-MODEL_PATH = 'sarima_model.joblib'
+# Sauvegarde et rechargement du modèle (versions publiées via model_store)
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_FILENAME = 'sarima_model.joblib'
+sys.path.append(os.path.dirname(MODEL_DIR))
+from model_store import artifact_path, publish_version
+from sarima_search import fit_sarima, load_selected_orders, model_metadata
+from sarima_artifact import SLIM_FILENAME, load_sarima, slim_sarima
+
+SEARCH_ORDERS = '--search' in sys.argv[1:] or os.getenv('RH_SARIMA_SEARCH') == '1'
 METRICS_PATH = 'model_metrics.json'
 
 # Définir le chemin du fichier d'entrée
@@ -34,18 +42,24 @@ time_series = df['Presences']
 train = time_series[:-10]
 test = time_series[-10:]
 
+# --search : recherche parallèle des ordres SARIMA (sarima_search.py, lancé dans son
+# propre processus) puis réentraînement avec les ordres retenus
+if SEARCH_ORDERS:
+    subprocess.run([sys.executable, '-u', os.path.join(MODEL_DIR, 'sarima_search.py'), '--input', input_file], check=True)
+
 # Vérifier si le modèle est déjà sauvegardé
-try:
-    sarima_model = joblib.load(MODEL_PATH)
-    print("Modèle chargé depuis", MODEL_PATH)
-except FileNotFoundError:
-    # Si le modèle n'existe pas, l'entraîner et le sauvegarder
-    p, d, q = 2, 1, 2
-    P, D, Q, s = 1, 1, 1, 52
-    model = SARIMAX(train, order=(p, d, q), seasonal_order=(P, D, Q, s), enforce_stationarity=False, enforce_invertibility=False)
-    sarima_model = model.fit(disp=False)
-    joblib.dump(sarima_model, MODEL_PATH)
-    print("Modèle entraîné et sauvegardé dans", MODEL_PATH)
+# (artefact allégé, ou pickle complet des versions publiées avant lui)
+model_path = artifact_path(MODEL_DIR, MODEL_FILENAME)
+slim_path = artifact_path(MODEL_DIR, SLIM_FILENAME)
+if not SEARCH_ORDERS and (os.path.exists(slim_path) or os.path.exists(model_path)):
+    sarima_model, model_format = load_sarima(slim_path, model_path)
+    print("Modèle chargé depuis", slim_path if model_format == 'slim' else model_path)
+else:
+    # Ordres retenus par la dernière recherche, sinon (2, 1, 2)x(1, 1, 1, 52)
+    order, seasonal_order, order_source = load_selected_orders()
+    print(f"Ordres SARIMA{order}x{seasonal_order} ({order_source})")
+    sarima_model = fit_sarima(train, order, seasonal_order)
+    print("Modèle entraîné")
 
 # Prédictions et calcul des métriques
 forecast = sarima_model.get_forecast(steps=len(test))
@@ -78,9 +92,9 @@ print(f"MAE : {mae:.4f}")
 print(f"RMSE : {rmse:.4f}")
 print(f"Précision (%) : {accuracy:.2f}%")
 
-# Sauvegarder les modifications dans le modèle
-joblib.dump(sarima_model, MODEL_PATH)
-print("\nModèle mis à jour et resauvegardé.")
+# Publier le modèle dans une nouvelle version (bascule atomique du pointeur CURRENT)
+version = publish_version(MODEL_DIR, {SLIM_FILENAME: slim_sarima(sarima_model)}, metadata=model_metadata(sarima_model))
+print(f"Version publiée : {version}")
 
 # Afficher quelques détails sur les prédictions pour diagnostic
 print("\nDiagnostic des prédictions :")
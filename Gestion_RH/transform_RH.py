@@ -1,4 +1,20 @@
+"""
+Calcul du total hebdomadaire des présents à partir des classeurs PRESENCE_<année>.xlsx.
+
+Chaque classeur est ouvert une seule fois en lecture seule (openpyxl, mode
+streaming) : les feuilles hebdomadaires S* sont parcourues ligne par ligne et
+la lecture d'une feuille s'arrête à la ligne "Total présents". Les années sont
+traitées en parallèle (un processus par classeur).
+"""
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+from openpyxl import load_workbook
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingestion_manifest import IngestionManifest
 
 # Configuration des chemins
 input_files = {
@@ -12,57 +28,144 @@ output_files = {
     2024: 'Total_Presents_2024.xlsx'
 }
 final_output_file = 'Total_Presents_Final.xlsx'
+manifest_file = 'ingestion_manifest.json'
+
+TOTAL_ROW_LABEL = "total présents"
+# Soustraire 14 pour les années 2022 et 2023
+ADJUSTED_YEARS = (2022, 2023)
+ADJUSTMENT = 14
+
+def _to_number(value):
+    """Valeur numérique d'une cellule (nombres et textes numériques), None sinon"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            return None
+    return None
+
+def scan_sheet(worksheet):
+    """
+    Parcourt une feuille hebdomadaire jusqu'à la ligne "Total présents" et
+    retourne la somme de ses cellules numériques (None si la ligne est absente)
+    """
+    for row in worksheet.iter_rows(values_only=True):
+        if any(isinstance(value, str) and TOTAL_ROW_LABEL in value.lower() for value in row):
+            numbers = [_to_number(value) for value in row]
+            return sum(number for number in numbers if number is not None)
+    return None
+
+def scan_workbook(file_path, year):
+    """
+    Ouvre le classeur une seule fois et retourne le total des présents de
+    chaque feuille hebdomadaire : [{'Annee', 'Semaines', 'Presences'}]
+    """
+    # data_only : valeurs calculées des formules, comme pd.read_excel
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        week_sheets = sorted([sheet for sheet in workbook.sheetnames if sheet.startswith('S')])
+        results = []
+        for sheet in week_sheets:
+            row_sum = scan_sheet(workbook[sheet])
+            if row_sum is None:
+                print(f"Aucun total trouvé pour {year}/{sheet}, enregistrement de 0")
+                row_sum = 0
+            elif year in ADJUSTED_YEARS:
+                row_sum = max(0, row_sum - ADJUSTMENT)  # Assure que le total reste positif
+            results.append({'Annee': year, 'Semaines': sheet, 'Presences': row_sum})
+    finally:
+        workbook.close()
+    return results
 
 # Fonction pour traiter un fichier donné et générer un fichier avec une colonne "Année"
 def process_file(file_path, year, output_path):
     print(f"\n=== Traitement du fichier {file_path} pour l'année {year} ===")
-    print("Lecture du fichier Excel...")
-    excel_data = pd.ExcelFile(file_path)
-    week_sheets = sorted([sheet for sheet in excel_data.sheet_names if sheet.startswith('S')])
-    print(f"Nombre de feuilles hebdomadaires trouvées : {len(week_sheets)}")
-    
-    results = []
-    for sheet in week_sheets:
-        print(f"\nAnalyse de la feuille : {sheet}")
-        data = pd.read_excel(file_path, sheet_name=sheet, header=None)
-        row_index = data.apply(lambda row: row.astype(str).str.contains("Total présents", case=False, na=False).any(), axis=1)
-        row_indices = row_index[row_index].index.tolist()
-        
-        if row_indices:
-            target_row = data.iloc[row_indices[0]]
-            row_sum = pd.to_numeric(target_row, errors='coerce').sum()
-            
-            # Soustraire 14 pour les années 2022 et 2023
-            if year in [2022, 2023]:
-                print(f"Ajustement du total pour {year} : soustraction de 14")
-                row_sum = max(0, row_sum - 14)  # Assure que le total reste positif
-            
-            print(f"Total des présences pour {sheet} : {row_sum}")
-            results.append({'Annee': year, 'Semaines': sheet, 'Presences': row_sum})
-        else:
-            print(f"Aucun total trouvé pour {sheet}, enregistrement de 0")
-            results.append({'Annee': year, 'Semaines': sheet, 'Presences': 0})
-    
-    results_df = pd.DataFrame(results)
+    results_df = pd.DataFrame(scan_workbook(file_path, year), columns=['Annee', 'Semaines', 'Presences'])
     results_df.to_excel(output_path, index=False)
-    print(f"\nFichier de sortie créé : {output_path}")
-
-# Traitement des fichiers (2022, 2023, 2024)
-print("\n=== Début du traitement des fichiers ===")
-for year, input_file in input_files.items():
-    print(f"\nTraitement de l'année {year}")
-    process_file(input_file, year, output_files[year])
-
-# Fusionner les fichiers en un seul fichier final
-print("\n=== Fusion des fichiers en un fichier final ===")
-final_results = []
-for year, output_file in output_files.items():
-    print(f"Lecture du fichier {output_file}")
-    year_df = pd.read_excel(output_file)
-    final_results.append(year_df)
-
-# Consolider toutes les données en une seule DataFrame
-final_df = pd.concat(final_results, ignore_index=True)
-final_df.to_excel(final_output_file, index=False)
-
-print("✅ Transformation des fichiers terminée. Fichier final généré :", final_output_file)
\ No newline at end of file
+    print(f"Fichier de sortie créé : {output_path} ({len(results_df)} semaines)")
+    return results_df
+
+def _process_task(task):
+    """Tâche exécutée dans un processus du pool : (année, erreur)"""
+    file_path, year, output_path = task
+    try:
+        process_file(file_path, year, output_path)
+        return year, None
+    except Exception as e:
+        return year, str(e)
+
+def process_years(tasks, n_jobs=None):
+    """
+    Traite les classeurs annuels en parallèle
+
+    Args:
+        tasks (list): [(fichier d'entrée, année, fichier de sortie)]
+
+    Returns:
+        dict: {année: message d'erreur ou None}
+    """
+    if not tasks:
+        return {}
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(tasks)))
+    if n_jobs == 1:
+        return dict(_process_task(task) for task in tasks)
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        return dict(pool.map(_process_task, tasks))
+
+def main(n_jobs=None, force=False):
+    # Traitement des fichiers (2022, 2023, 2024) nouveaux ou modifiés depuis le dernier passage
+    print("\n=== Début du traitement des fichiers ===")
+    manifest = IngestionManifest(manifest_file)
+    # Sorties des classeurs supprimés : retirées pour ne pas être fusionnées
+    for orphan in manifest.remove_missing(input_files.values()):
+        if os.path.exists(orphan):
+            os.remove(orphan)
+    to_process = manifest.plan(input_files.values(), force=force)
+    for year, input_file in input_files.items():
+        if not os.path.exists(input_file):
+            print(f"Année {year} absente ({input_file}), ignorée")
+        elif input_file not in to_process:
+            print(f"Année {year} inchangée ({input_file}), traitement ignoré")
+
+    tasks = [(input_file, year, output_files[year]) for year, input_file in input_files.items() if input_file in to_process]
+    for year, error in process_years(tasks, n_jobs).items():
+        if error is not None:
+            print(f"❌ Erreur lors du traitement de l'année {year} : {error}")
+            manifest.record_failure(input_files[year])
+        else:
+            manifest.record(input_files[year], [output_files[year]])
+
+    # Fusionner les fichiers en un seul fichier final (seulement si une année a changé)
+    if manifest.report.failed:
+        print("\n⚠️ Fichier final non régénéré : au moins une année est en erreur")
+    elif manifest.changed or not os.path.exists(final_output_file):
+        print("\n=== Fusion des fichiers en un fichier final ===")
+        final_results = []
+        for year, output_file in output_files.items():
+            if not os.path.exists(output_file):
+                continue
+            print(f"Lecture du fichier {output_file}")
+            year_df = pd.read_excel(output_file)
+            final_results.append(year_df)
+
+        # Consolider toutes les données en une seule DataFrame
+        final_df = pd.concat(final_results, ignore_index=True)
+        final_df.to_excel(final_output_file, index=False)
+        manifest.mark_rewritten(final_output_file)
+
+    manifest.save()
+    print("\n=== Rapport d'ingestion ===")
+    for line in manifest.report.lines():
+        print(line)
+    print("✅ Transformation des fichiers terminée. Fichier final :", final_output_file)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Total hebdomadaire des présents par année")
+    parser.add_argument('--n-jobs', type=int, default=None, help="Nombre de processus (par défaut : un par année)")
+    parser.add_argument('--force', action='store_true', help="Retraiter tous les classeurs, même inchangés")
+    args = parser.parse_args()
+    main(n_jobs=args.n_jobs, force=args.force)
@@ -89,7 +89,9 @@ INSERT INTO `prediction_history` (`id`, `date`, `article`, `quantity_ordered`, `
 -- Index pour la table `metrics_history`
 --
 ALTER TABLE `metrics_history`
-  ADD PRIMARY KEY (`id`);
+  ADD PRIMARY KEY (`id`),
+  ADD KEY `ix_metrics_history_model_date` (`model_name`,`training_date`),
+  ADD KEY `ix_metrics_history_training_date` (`training_date`);
 
 --
 -- AUTO_INCREMENT pour les tables déchargées
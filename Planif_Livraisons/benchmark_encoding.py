@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Compare les encodages de 'Désignation article' (dense, sparse, categorical) :
+temps de préparation et d'entraînement, mémoire de la matrice d'entraînement,
+taille de l'artefact et temps d'inférence
+"""
+
+import os
+import time
+import tempfile
+from datetime import datetime
+import numpy as np
+from scipy import sparse
+import train
+from predict import DeliveryModelRegistry, build_feature_matrix
+
+FILE_PATH = 'Planif livraisons.xlsx'
+BATCH_SIZE = 5000
+
+def matrix_nbytes(X):
+    """Mémoire occupée par la matrice d'entraînement"""
+    if sparse.issparse(X):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return int(X.memory_usage(deep=True).sum())
+
+def benchmark_encoding(encoding, workdir):
+    results = {'encoding': encoding}
+
+    start = time.perf_counter()
+    data = train.load_and_preprocess_data(FILE_PATH, encoding=encoding)
+    articles = list(data['article'].cat.categories) if encoding != 'dense' else None
+    X_train, X_test, y_train, y_test = train.prepare_train_test_data(data)
+    X_train, X_test, feature_names = train.encode_features(X_train, X_test, encoding, articles)
+    results['preparation_s'] = time.perf_counter() - start
+    results['train_matrix_mb'] = matrix_nbytes(X_train) / 1e6
+
+    start = time.perf_counter()
+    model = train.train_xgboost_model(X_train, y_train, encoding=encoding)
+    results['fit_s'] = time.perf_counter() - start
+
+    metrics = train.evaluate_model(model, X_train, y_train, X_test, y_test)
+    results['test_r2'] = metrics['test_r2']
+
+    model_dir = os.path.join(workdir, encoding)
+    os.makedirs(model_dir, exist_ok=True)
+    metadata = train.save_model_and_metadata(model, feature_names, metrics, model_dir=model_dir,
+                                             encoding=encoding, articles=articles)
+    version_dir = os.path.join(model_dir, 'versions', metadata['version'])
+    results['artifact_kb'] = sum(
+        os.path.getsize(os.path.join(version_dir, f)) for f in os.listdir(version_dir)
+    ) / 1e3
+
+    # Inférence via le registre, comme dans le service
+    snapshot = DeliveryModelRegistry(model_dir=model_dir).get()
+    rng = np.random.default_rng(42)
+    dates = np.datetime64('2025-01-01') + rng.integers(0, 365, BATCH_SIZE).astype('timedelta64[D]')
+    positions = rng.choice(list(snapshot.article_index.values()), BATCH_SIZE)
+    quantities = rng.integers(1, 5000, BATCH_SIZE).astype(float)
+
+    start = time.perf_counter()
+    features = build_feature_matrix(snapshot, dates, positions, quantities)
+    snapshot.predict_matrix(features)
+    results['batch_ms'] = (time.perf_counter() - start) * 1e3
+
+    date = datetime(2025, 1, 31)
+    start = time.perf_counter()
+    for position, quantity in zip(positions[:1000], quantities[:1000]):
+        snapshot.score_one(date, position, quantity)
+    results['single_us'] = (time.perf_counter() - start) / 1000 * 1e6
+
+    return results
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        rows = [benchmark_encoding(encoding, workdir) for encoding in train.ENCODINGS]
+
+    header = ['encoding', 'preparation_s', 'train_matrix_mb', 'fit_s', 'test_r2',
+              'artifact_kb', 'batch_ms', 'single_us']
+    print(f"\n=== Comparaison des encodages (lot de {BATCH_SIZE} commandes) ===")
+    print("".join(f"{col:>16}" for col in header))
+    for row in rows:
+        print("".join(
+            f"{row[col]:>16.3f}" if isinstance(row[col], float) else f"{row[col]:>16}"
+            for col in header
+        ))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Micro-benchmark de la latence d'une prédiction de livraison :
+chemin DataFrame historique vs vecteur préalloué + inplace_predict
+"""
+
+import time
+from datetime import datetime
+import numpy as np
+from predict import registry, prepare_input_data
+
+def time_per_call(func, repeat=2000, warmup=50):
+    """Retourne la latence médiane et le p95 d'un appel, en microsecondes"""
+    for _ in range(warmup):
+        func()
+    durations = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations[i] = time.perf_counter() - start
+    return np.median(durations) * 1e6, np.percentile(durations, 95) * 1e6
+
+def main():
+    snapshot = registry.get()
+    date = datetime(2025, 1, 31)
+    article = snapshot.valid_articles[0]
+    quantity = 801.0
+    position = snapshot.article_index[article]
+
+    def dataframe_path():
+        input_data = prepare_input_data(date, article, quantity, model_columns=snapshot.columns)
+        return float(snapshot.model.predict(input_data)[0])
+
+    def fast_path():
+        return snapshot.score_one(date, position, quantity)
+
+    # Les deux chemins doivent donner la même prédiction
+    reference, fast = dataframe_path(), fast_path()
+    print(f"Article: {article} | Qté cdée: {quantity}")
+    print(f"Prédiction DataFrame: {reference:.4f} | Prédiction rapide: {fast:.4f}")
+
+    print(f"\n{'Chemin':<25}{'médiane (µs)':>15}{'p95 (µs)':>15}")
+    results = {}
+    for name, func in [("DataFrame + predict", dataframe_path), ("Vecteur + inplace_predict", fast_path)]:
+        median, p95 = time_per_call(func)
+        results[name] = median
+        print(f"{name:<25}{median:>15.1f}{p95:>15.1f}")
+
+    speedup = results["DataFrame + predict"] / results["Vecteur + inplace_predict"]
+    print(f"\nGain de latence par requête : x{speedup:.1f}")
+
+if __name__ == "__main__":
+    main()
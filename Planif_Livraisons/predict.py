@@ -4,21 +4,58 @@
 import pandas as pd
 import numpy as np
 import joblib
+from scipy import sparse
 from datetime import datetime
 import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(MODEL_DIR))
+from model_store import ArtifactWatcher, artifact_fingerprint, artifact_path
+
+MODEL_FILENAME = 'xgb_model.joblib'
+COLUMNS_FILENAME = 'model_columns.joblib'
+ENCODING_FILENAME = 'model_encoding.joblib'
+BASE_FEATURES = ['Year', 'Month', 'Day', 'Qté cdée']
+
+# Seuils de taux de livraison (%) : (seuil minimal, statut, recommandation)
+DELIVERY_STATUS_RULES = [
+    (95, "excellent", "Livraison optimale prévue"),
+    (85, "good", "Bonne livraison prévue"),
+]
+DEFAULT_DELIVERY_STATUS = ("warning", "Risque de sous-livraison, considérer l'ajustement de la commande")
+
+@contextmanager
+def measure_stage(timings, stage):
+    """
+    Mesure la durée d'une étape de prédiction ; sans effet si timings vaut None
+    """
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
 
 def load_model_and_columns(model_filename='xgb_model.joblib', columns_filename='model_columns.joblib'):
     """
-    Charge le modèle et les colonnes sauvegardés
+    Charge le modèle et les colonnes sauvegardés (version courante)
     """
-    model = joblib.load(model_filename)
-    columns = joblib.load(columns_filename)
+    version = artifact_fingerprint(MODEL_DIR, [model_filename, columns_filename])
+    model = joblib.load(artifact_path(MODEL_DIR, model_filename, version))
+    columns = joblib.load(artifact_path(MODEL_DIR, columns_filename, version))
     return model, columns
 
 def load_model():
     """Charge le modèle de prédiction"""
     try:
-        model_path = os.path.join(os.path.dirname(__file__), 'xgb_model.joblib')
+        model_path = artifact_path(MODEL_DIR, MODEL_FILENAME)
         print(f"Tentative de chargement du modèle depuis: {model_path}")
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Le fichier du modèle n'existe pas: {model_path}")
@@ -28,10 +65,192 @@ def load_model():
     except Exception as e:
         raise Exception(f"Erreur lors du chargement du modèle: {str(e)}")
 
+class ModelSnapshot:
+    """
+    Instantané immuable d'une version du modèle : booster, colonnes et index des articles
+    """
+    def __init__(self, model, columns, version, encoding=None):
+        encoding = encoding or {}
+        self.model = model
+        self.columns = [col for col in columns if col != 'Qté livrée']
+        self.version = version
+        self.encoding = encoding.get('encoding', 'dense')
+        self.column_index = {col: idx for idx, col in enumerate(self.columns)}
+        if self.encoding == 'categorical':
+            # Article -> code de catégorie, écrit dans l'unique colonne 'article'
+            self.article_index = {article: code for code, article in enumerate(encoding['articles'])}
+            self.article_column = self.column_index['article']
+        else:
+            # Article -> position de sa colonne one-hot dans l'ordre du modèle
+            self.article_index = {
+                col[8:]: idx for idx, col in enumerate(self.columns) if col.startswith('article_')
+            }
+            self.article_column = None
+        self.valid_articles = list(self.article_index)
+        self.loaded_at = datetime.now()
+
+        # Chemin de scoring rapide : booster natif et positions des variables de base
+        self.booster = model.get_booster() if hasattr(model, 'get_booster') else None
+        best_iteration = getattr(model, 'best_iteration', None)
+        self.iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+        # Un modèle entraîné sur matrice CSR a vu les zéros comme valeurs manquantes
+        self.missing = 0.0 if self.encoding == 'sparse' else np.nan
+        self.base_columns = [col for col in BASE_FEATURES if col in self.column_index]
+        self.base_positions = np.array([self.column_index[col] for col in self.base_columns], dtype=np.intp)
+        self._buffers = threading.local()
+
+    def _buffer(self):
+        """Vecteur de variables préalloué (un par thread), dans l'ordre du modèle"""
+        buffer = getattr(self._buffers, 'value', None)
+        if buffer is None:
+            buffer = np.zeros((1, len(self.columns)), dtype=np.float32)
+            self._buffers.value = buffer
+        return buffer
+
+    def predict_matrix(self, features):
+        """Évalue une matrice de variables déjà ordonnée, sans passer par pandas"""
+        if self.booster is None:
+            if sparse.issparse(features):
+                features = features.toarray()
+            return np.asarray(self.model.predict(pd.DataFrame(features, columns=self.columns)), dtype=float)
+        return np.asarray(
+            self.booster.inplace_predict(
+                features,
+                iteration_range=self.iteration_range,
+                missing=self.missing,
+                validate_features=False
+            ),
+            dtype=float
+        )
+
+    def score_one(self, date, article_position, quantity, timings=None):
+        """
+        Prédiction d'une seule commande : seules les cases Year/Month/Day/Qté cdée
+        et la case de l'article sont écrites dans le vecteur préalloué
+        """
+        buffer = self._buffer()
+        with measure_stage(timings, 'feature_build'):
+            base_values = {'Year': date.year, 'Month': date.month, 'Day': date.day, 'Qté cdée': quantity}
+            buffer[0, self.base_positions] = [base_values[col] for col in self.base_columns]
+            if self.article_column is not None:
+                buffer[0, self.article_column] = article_position
+            else:
+                buffer[0, article_position] = 1.0
+        try:
+            with measure_stage(timings, 'scoring'):
+                return float(self.predict_matrix(buffer)[0])
+        finally:
+            if self.article_column is None:
+                buffer[0, article_position] = 0.0
+
+class DeliveryModelRegistry(ArtifactWatcher):
+    """
+    Garde le modèle de livraison en mémoire entre les requêtes.
+
+    Les entraînements publient chaque version dans versions/<version>/ puis
+    basculent le pointeur CURRENT (voir model_store) ; le pointeur est surveillé
+    en arrière-plan et la nouvelle version est chargée puis substituée à
+    l'ancienne en une seule affectation, sans redémarrer le service. Les fichiers
+    historiques d'un dossier non versionné ne sont chargés qu'au démarrage.
+    """
+    def __init__(self, model_dir=MODEL_DIR, model_filename=MODEL_FILENAME,
+                 columns_filename=COLUMNS_FILENAME, encoding_filename=ENCODING_FILENAME,
+                 check_interval=2.0):
+        self.model_dir = model_dir
+        self.model_filename = model_filename
+        self.columns_filename = columns_filename
+        self.encoding_filename = encoding_filename
+        super().__init__("Modèle de livraison", self._artifacts_version, self._load, interval=check_interval)
+
+    def _artifacts_version(self):
+        # Fichier d'encodage optionnel (absent pour les modèles one-hot historiques)
+        return artifact_fingerprint(self.model_dir, [self.model_filename, self.columns_filename],
+                                    [self.encoding_filename])
+
+    def _load(self, version):
+        model = joblib.load(artifact_path(self.model_dir, self.model_filename, version))
+        columns = joblib.load(artifact_path(self.model_dir, self.columns_filename, version))
+        encoding_path = artifact_path(self.model_dir, self.encoding_filename, version)
+        encoding = joblib.load(encoding_path) if os.path.exists(encoding_path) else None
+        return ModelSnapshot(model, list(columns), version, encoding)
+
+    def reload(self):
+        """Vérifie immédiatement le pointeur de version et bascule si nécessaire"""
+        self.check()
+        return self.get()
+
+registry = DeliveryModelRegistry()
+
+class PredictionCache:
+    """
+    Cache LRU borné des prédictions de livraison.
+
+    La clé combine les entrées normalisées (date du jour, article, quantité) et
+    la version du modèle ; tout changement de version vide le cache.
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(date, article, quantity):
+        """Normalise les entrées : seule la date (sans heure) est utilisée par le modèle"""
+        day = date.date() if isinstance(date, datetime) else date
+        return (day, article, float(quantity))
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+
+    def put(self, key, version, result):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "model_version": self._version
+            }
+
+prediction_cache = PredictionCache(maxsize=int(os.getenv("DELIVERY_CACHE_SIZE", "4096")))
+
 def prepare_input_data(date: datetime, article: str, quantity: float, model_columns=None):
     """Prépare les données d'entrée pour la prédiction"""
-    print(f"Création du DataFrame initial avec date={date}, article={article}, quantity={quantity}")
-    
     input_data = pd.DataFrame({
         'Year': [date.year],
         'Month': [date.month],
@@ -40,8 +259,6 @@ def prepare_input_data(date: datetime, article: str, quantity: float, model_colu
     })
     
     if model_columns is not None:
-        print(f"Colonnes du modèle: {model_columns}")
-        
         # Créer un dictionnaire pour les colonnes one-hot de l'article
         article_cols = {}
         for col in model_columns:
@@ -51,16 +268,12 @@ def prepare_input_data(date: datetime, article: str, quantity: float, model_colu
         # Ajouter les colonnes one-hot
         for col, value in article_cols.items():
             input_data[col] = value
-            
-        print(f"Colonnes après one-hot encoding: {input_data.columns.tolist()}")
-                
+
         # S'assurer que toutes les colonnes nécessaires sont présentes
         model_cols_set = set(model_columns)
         input_cols_set = set(input_data.columns)
         missing_cols = model_cols_set - input_cols_set - {'Qté livrée'}
         
-        print(f"Colonnes manquantes: {missing_cols}")
-        
         # Ajouter les colonnes manquantes avec des zéros
         for col in missing_cols:
             input_data[col] = [0]
@@ -68,8 +281,6 @@ def prepare_input_data(date: datetime, article: str, quantity: float, model_colu
         # Réorganiser les colonnes dans le même ordre que le modèle
         final_columns = [col for col in model_columns if col != 'Qté livrée']
         input_data = input_data[final_columns]
-        
-        print(f"Colonnes finales: {input_data.columns.tolist()}")
     
     return input_data
 
@@ -103,7 +314,115 @@ def predict_quantity(model, colonnes_modele, annee, mois, jour, qte_commandee, d
     qte_livree_predite = model.predict(input_data)[0]
     return qte_livree_predite
 
-def predict_delivery(date: datetime, article: str, quantity: float) -> dict:
+def classify_delivery_rates(delivery_rates):
+    """
+    Détermine statut et recommandation pour un tableau de taux de livraison (%)
+    """
+    delivery_rates = np.asarray(delivery_rates, dtype=float)
+    conditions = [delivery_rates >= threshold for threshold, _, _ in DELIVERY_STATUS_RULES]
+    statuses = np.select(conditions, [status for _, status, _ in DELIVERY_STATUS_RULES],
+                         default=DEFAULT_DELIVERY_STATUS[0])
+    recommendations = np.select(conditions, [reco for _, _, reco in DELIVERY_STATUS_RULES],
+                                default=DEFAULT_DELIVERY_STATUS[1])
+    return statuses, recommendations
+
+def build_feature_matrix(snapshot, dates, article_positions, quantities):
+    """
+    Construit en une passe la matrice des variables (une ligne par commande)
+    dans l'ordre des colonnes du modèle
+    """
+    dates = pd.DatetimeIndex(dates)
+    n_rows = len(dates)
+    columns = {'Year': dates.year, 'Month': dates.month, 'Day': dates.day, 'Qté cdée': np.asarray(quantities)}
+    base_values = np.zeros((n_rows, len(snapshot.base_columns)), dtype=np.float32)
+    for i, col in enumerate(snapshot.base_columns):
+        base_values[:, i] = columns[col]
+
+    if snapshot.encoding == 'sparse':
+        # Matrice CSR : variables de base + un seul 1 par ligne pour l'article
+        rows = np.repeat(np.arange(n_rows), len(snapshot.base_columns) + 1)
+        cols = np.column_stack([np.tile(snapshot.base_positions, (n_rows, 1)), article_positions])
+        values = np.column_stack([base_values, np.ones(n_rows, dtype=np.float32)])
+        features = sparse.csr_matrix(
+            (values.ravel(), (rows, cols.ravel())),
+            shape=(n_rows, len(snapshot.columns))
+        )
+        features.eliminate_zeros()
+        return features
+
+    features = np.zeros((n_rows, len(snapshot.columns)), dtype=np.float32)
+    features[:, snapshot.base_positions] = base_values
+    if snapshot.article_column is not None:
+        # Code de catégorie de l'article
+        features[:, snapshot.article_column] = article_positions
+    else:
+        # Activation de la colonne one-hot de chaque article
+        features[np.arange(n_rows), article_positions] = 1
+    return features
+
+def predict_delivery_batch(dates, articles, quantities) -> pd.DataFrame:
+    """
+    Prédit les quantités livrées pour un lot de commandes en un seul appel au modèle
+    
+    Args:
+        dates: Dates de livraison
+        articles: Désignations des articles
+        quantities: Quantités commandées
+        
+    Returns:
+        pd.DataFrame: Une ligne par commande, avec une colonne 'error' renseignée
+        pour les lignes qui n'ont pas pu être évaluées
+    """
+    snapshot = registry.get()
+
+    lines = pd.DataFrame({
+        'date': pd.to_datetime(pd.Series(dates), errors='coerce'),
+        'article': pd.Series(articles, dtype=object),
+        'quantity': pd.to_numeric(pd.Series(quantities), errors='coerce')
+    })
+    positions = lines['article'].map(snapshot.article_index)
+
+    # Validation vectorisée des lignes
+    errors = pd.Series(None, index=lines.index, dtype=object)
+    errors[lines['date'].isna()] = "Date invalide"
+    errors[errors.isna() & ~(lines['quantity'] > 0)] = "La quantité doit être positive"
+    errors[errors.isna() & positions.isna()] = "Article non valide"
+    valid = errors.isna().to_numpy()
+
+    results = lines.assign(
+        predicted_quantity=np.nan,
+        delivery_rate=np.nan,
+        prediction_error=np.nan,
+        prediction_accuracy=np.nan,
+        status=None,
+        recommendation=None,
+        error=errors
+    )
+
+    if valid.any():
+        quantity = lines['quantity'].to_numpy(dtype=float)[valid]
+        features = build_feature_matrix(
+            snapshot,
+            lines['date'][valid],
+            positions[valid].to_numpy(dtype=np.int64),
+            quantity
+        )
+        predicted = snapshot.predict_matrix(features)
+
+        delivery_rate = predicted / quantity * 100
+        prediction_error = np.abs(quantity - predicted) / quantity * 100
+        statuses, recommendations = classify_delivery_rates(delivery_rate)
+
+        results.loc[valid, 'predicted_quantity'] = predicted
+        results.loc[valid, 'delivery_rate'] = delivery_rate
+        results.loc[valid, 'prediction_error'] = prediction_error
+        results.loc[valid, 'prediction_accuracy'] = 100 - prediction_error
+        results.loc[valid, 'status'] = statuses
+        results.loc[valid, 'recommendation'] = recommendations
+
+    return results
+
+def predict_delivery(date: datetime, article: str, quantity: float, timings: dict = None) -> dict:
     """
     Prédit la quantité qui sera livrée
     
@@ -111,41 +430,34 @@ def predict_delivery(date: datetime, article: str, quantity: float) -> dict:
         date (datetime): Date de livraison
         article (str): Désignation de l'article
         quantity (float): Quantité commandée
+        timings (dict, optional): reçoit la durée en secondes de chaque étape
+            (model_load, cache_lookup, feature_build, scoring)
         
     Returns:
         dict: Résultats de la prédiction avec recommandations
     """
     try:
+        # Récupérer le modèle en mémoire et consulter le cache pour cette version
+        with measure_stage(timings, 'model_load'):
+            snapshot = registry.get()
+        with measure_stage(timings, 'cache_lookup'):
+            cache_key = PredictionCache.make_key(date, article, quantity)
+            cached = prediction_cache.get(cache_key, snapshot.version)
+        if cached is not None:
+            return cached
+
         print(f"Début de la prédiction pour: date={date}, article={article}, quantity={quantity}")
         
-        # Charger le modèle et vérifier la validité de l'article
-        model = load_model()
-        columns_path = os.path.join(os.path.dirname(__file__), 'model_columns.joblib')
-        model_columns = joblib.load(columns_path)
-        
-        # Extraire la liste des articles valides
-        valid_articles = [col[8:] for col in model_columns if col.startswith('article_')]
-        
         # Vérifier que l'article est valide
-        if article not in valid_articles:
-            raise ValueError(f"Article non valide: {article}. Articles valides: {', '.join(valid_articles)}")
+        if article not in snapshot.article_index:
+            raise ValueError(f"Article non valide: {article}. Articles valides: {', '.join(snapshot.valid_articles)}")
             
         # Vérifier que la quantité est positive
         if quantity <= 0:
             raise ValueError("La quantité doit être positive")
         
-        # Préparer les données
-        print("Préparation des données d'entrée...")
-        input_data = prepare_input_data(
-            date=date,
-            article=article,
-            quantity=quantity,
-            model_columns=model_columns
-        )
-        
-        # Faire la prédiction
-        print("Exécution de la prédiction...")
-        predicted_qty = float(model.predict(input_data)[0])  # Conversion en float Python standard
+        # Faire la prédiction (vecteur préalloué, sans DataFrame)
+        predicted_qty = snapshot.score_one(date, snapshot.article_index[article], quantity, timings)
         
         # Calculer le taux de livraison
         delivery_rate = float((predicted_qty / quantity) * 100)  # Conversion en float Python standard
@@ -157,17 +469,11 @@ def predict_delivery(date: datetime, article: str, quantity: float) -> dict:
         prediction_accuracy = 100 - prediction_error
         
         # Déterminer le statut en fonction du taux de livraison
-        if delivery_rate >= 95:
-            status = "excellent"
-            recommendation = "Livraison optimale prévue"
-        elif delivery_rate >= 85:
-            status = "good"
-            recommendation = "Bonne livraison prévue"
-        else:
-            status = "warning"
-            recommendation = "Risque de sous-livraison, considérer l'ajustement de la commande"
+        statuses, recommendations = classify_delivery_rates([delivery_rate])
+        status = str(statuses[0])
+        recommendation = str(recommendations[0])
         
-        return {
+        result = {
             "predicted_quantity": predicted_qty,
             "delivery_rate": delivery_rate,
             "prediction_error": prediction_error,
@@ -175,6 +481,8 @@ def predict_delivery(date: datetime, article: str, quantity: float) -> dict:
             "status": status,
             "recommendation": recommendation
         }
+        prediction_cache.put(cache_key, snapshot.version, result)
+        return result
         
     except Exception as e:
         print(f"❌ Erreur détaillée lors de la prédiction: {str(e)}")
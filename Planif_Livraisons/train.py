@@ -3,17 +3,58 @@
 
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.model_selection import train_test_split, cross_val_score, TimeSeriesSplit, ParameterGrid
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 from xgboost import XGBRegressor
-import joblib
+from scipy import sparse
+from joblib import Parallel, delayed
 import json
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
-def load_and_preprocess_data(file_path):
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(MODEL_DIR))
+from model_store import publish_version
+
+# Encodages possibles de 'Désignation article' :
+# - dense : une colonne one-hot par article (pd.get_dummies)
+# - sparse : mêmes colonnes one-hot, stockées en matrice CSR
+# - categorical : une seule colonne de codes, gérée nativement par XGBoost
+ENCODINGS = ('dense', 'sparse', 'categorical')
+
+# Grille de recherche des hyperparamètres (mode --search)
+PARAM_GRID = {
+    'max_depth': [4, 6, 8],
+    'learning_rate': [0.05, 0.1],
+    'min_child_weight': [1, 5],
+    'subsample': [0.8, 1.0]
+}
+MAX_ESTIMATORS = 1000
+EARLY_STOPPING_ROUNDS = 30
+
+@contextmanager
+def timed_stage(timings, stage):
+    """
+    Mesure la durée (wall-clock) d'une étape de l'entraînement
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(time.perf_counter() - start, 3)
+        print(f"⏱ {stage}: {timings[stage]:.2f}s")
+
+def load_and_preprocess_data(file_path, encoding='dense'):
     """
     Charge et prétraite les données depuis le fichier Excel
     """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Encodage inconnu: {encoding}. Encodages possibles: {', '.join(ENCODINGS)}")
+
     # Chargement des données
     data = pd.read_excel(file_path)
     
@@ -21,8 +62,13 @@ def load_and_preprocess_data(file_path):
     if 'Poids' in data.columns:
         data = data.drop(['Poids', 'Poids total'], axis=1)
     
-    # Encodage one-hot des variables catégorielles
-    data_encoded = pd.get_dummies(data, columns=['Désignation article'], prefix='article')
+    if encoding == 'dense':
+        # Encodage one-hot des variables catégorielles
+        data_encoded = pd.get_dummies(data, columns=['Désignation article'], prefix='article')
+    else:
+        # Les articles restent une seule colonne catégorielle (codes entiers)
+        data_encoded = data.rename(columns={'Désignation article': 'article'})
+        data_encoded['article'] = data_encoded['article'].astype('category')
     
     # Conversion des dates
     if 'Date expédition' in data_encoded.columns:
@@ -41,15 +87,135 @@ def prepare_train_test_data(data):
     y = data['Qté livrée']
     return train_test_split(X, y, test_size=0.2, random_state=42)
 
-def train_xgboost_model(X_train, y_train):
+def prepare_time_ordered_data(data, test_size=0.2):
+    """
+    Trie les données par date et réserve les commandes les plus récentes pour le test
+    """
+    data = data.sort_values(['Year', 'Month', 'Day'], kind='stable').reset_index(drop=True)
+    X = data.drop('Qté livrée', axis=1)
+    y = data['Qté livrée']
+    split = int(len(data) * (1 - test_size))
+    return X.iloc[:split], X.iloc[split:], y.iloc[:split], y.iloc[split:]
+
+def build_sparse_matrix(X, articles):
+    """
+    Construit la matrice CSR (variables numériques + une colonne par article)
+    sans jamais matérialiser les colonnes one-hot denses
+    """
+    numeric = X.drop(columns='article')
+    codes = pd.Categorical(X['article'], categories=articles).codes
+    rows = np.flatnonzero(codes >= 0)
+
+    article_part = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, codes[rows])),
+        shape=(len(X), len(articles))
+    )
+    matrix = sparse.hstack(
+        [sparse.csr_matrix(numeric.to_numpy(dtype=np.float32)), article_part],
+        format='csr'
+    )
+    # Les zéros absents de la matrice sont traités comme valeurs manquantes par XGBoost
+    matrix.eliminate_zeros()
+
+    feature_names = list(numeric.columns) + [f'article_{article}' for article in articles]
+    return matrix, feature_names
+
+def encode_features(X_train, X_test, encoding, articles=None):
+    """
+    Met les variables au format attendu par XGBoost pour l'encodage choisi
+
+    Returns:
+        tuple: (X_train, X_test, noms des colonnes du modèle)
+    """
+    if encoding == 'sparse':
+        X_train_matrix, feature_names = build_sparse_matrix(X_train, articles)
+        X_test_matrix, _ = build_sparse_matrix(X_test, articles)
+        return X_train_matrix, X_test_matrix, feature_names
+    return X_train, X_test, list(X_train.columns)
+
+def take_rows(X, indices):
+    """Sélectionne des lignes d'un DataFrame ou d'une matrice CSR"""
+    return X[indices] if sparse.issparse(X) else X.iloc[indices]
+
+def fit_fold(params, X, y, train_idx, val_idx, encoding):
+    """
+    Entraîne un candidat sur un pli chronologique et retourne (RMSE de validation, nombre d'arbres retenus)
+
+    Les 10% les plus récents du pli d'entraînement servent à l'arrêt anticipé.
+    """
+    n_stop = max(1, int(len(train_idx) * 0.1))
+    fit_idx, stop_idx = train_idx[:-n_stop], train_idx[-n_stop:]
+
+    model = XGBRegressor(
+        n_estimators=MAX_ESTIMATORS,
+        tree_method='hist',
+        enable_categorical=(encoding == 'categorical'),
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+        random_state=42,
+        n_jobs=1,  # le parallélisme se fait entre plis et candidats
+        **params
+    )
+    model.fit(
+        take_rows(X, fit_idx), y.iloc[fit_idx],
+        eval_set=[(take_rows(X, stop_idx), y.iloc[stop_idx])],
+        verbose=False
+    )
+    y_pred = model.predict(take_rows(X, val_idx))
+    rmse = np.sqrt(mean_squared_error(y.iloc[val_idx], y_pred))
+    return rmse, model.best_iteration + 1
+
+def search_hyperparameters(X, y, encoding='dense', param_grid=PARAM_GRID, n_splits=5, n_jobs=-1):
+    """
+    Validation croisée chronologique (origine glissante) sur une grille d'hyperparamètres,
+    plis et candidats étant exécutés en parallèle sur tous les cœurs
+
+    Returns:
+        tuple: (meilleurs paramètres avec n_estimators, résultats par candidat)
+    """
+    candidates = list(ParameterGrid(param_grid))
+    folds = list(TimeSeriesSplit(n_splits=n_splits).split(np.arange(X.shape[0])))
+    print(f"Recherche: {len(candidates)} candidats x {len(folds)} plis")
+
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(fit_fold)(params, X, y, train_idx, val_idx, encoding)
+        for params in candidates
+        for train_idx, val_idx in folds
+    )
+
+    cv_results = []
+    for i, params in enumerate(candidates):
+        fold_scores = scores[i * len(folds):(i + 1) * len(folds)]
+        rmses = [rmse for rmse, _ in fold_scores]
+        cv_results.append({
+            'params': params,
+            'cv_rmse': float(np.mean(rmses)),
+            'cv_rmse_std': float(np.std(rmses)),
+            'n_estimators': int(np.median([n_trees for _, n_trees in fold_scores]))
+        })
+    cv_results.sort(key=lambda result: result['cv_rmse'])
+
+    best = cv_results[0]
+    print(f"Meilleur candidat: {best['params']} (RMSE CV: {best['cv_rmse']:.4f} ±{best['cv_rmse_std']:.4f})")
+    return {**best['params'], 'n_estimators': best['n_estimators']}, cv_results
+
+def train_xgboost_model(X_train, y_train, encoding='dense', params=None):
     """
     Entraîne le modèle XGBoost
     """
+    model_params = {
+        'n_estimators': 200,
+        'learning_rate': 0.1,
+        'max_depth': 6
+    }
+    if encoding == 'categorical':
+        model_params.update({'tree_method': 'hist', 'enable_categorical': True})
+    if params:
+        # Paramètres issus de la recherche : histogrammes pour tous les encodages
+        model_params.update({'tree_method': 'hist', **params})
+
     xgb_model = XGBRegressor(
-        n_estimators=200,
-        learning_rate=0.1,
-        max_depth=6,
-        random_state=42
+        random_state=42,
+        **model_params
     )
     xgb_model.fit(X_train, y_train)
     return xgb_model
@@ -81,28 +247,48 @@ def evaluate_model(model, X_train, y_train, X_test, y_test):
     return metrics
 
 def save_model_and_metadata(model, columns, metrics, 
+                          model_dir=MODEL_DIR,
                           model_filename='xgb_model.joblib', 
                           columns_filename='model_columns.joblib',
-                          metrics_filename='model_metrics.json'):
+                          metrics_filename='model_metrics.json',
+                          encoding='dense', articles=None,
+                          encoding_filename='model_encoding.joblib',
+                          extra_metadata=None):
     """
-    Sauvegarde le modèle, les colonnes et les métriques avec horodatage
+    Publie le modèle, les colonnes et l'encodage des articles dans une nouvelle
+    version de model_dir (bascule atomique du pointeur CURRENT, voir model_store),
+    puis sauvegarde les métriques avec horodatage
     """
     # Création d'un dictionnaire de métadonnées
     metadata = {
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'metrics': metrics
+        'encoding': encoding,
+        'metrics': metrics,
+        **(extra_metadata or {})
     }
     
-    # Sauvegarde du modèle et des colonnes
-    joblib.dump(model, model_filename)
-    joblib.dump(columns, columns_filename)
+    # Publication des artefacts (la liste des articles donne la correspondance article -> code)
+    metadata['version'] = publish_version(model_dir, {
+        model_filename: model,
+        columns_filename: columns,
+        encoding_filename: {
+            'encoding': encoding,
+            'articles': list(articles) if articles is not None else None
+        }
+    }, metadata={'encoding': encoding, 'metrics': metrics})
     
     # Sauvegarde des métriques et métadonnées
-    with open(metrics_filename, 'w') as f:
-        json.dump(metadata, f, indent=4)
+    write_metadata(metadata, model_dir, metrics_filename)
     
     return metadata
 
+def write_metadata(metadata, model_dir=MODEL_DIR, metrics_filename='model_metrics.json'):
+    """
+    Écrit les métriques et métadonnées de la dernière version publiée
+    """
+    with open(os.path.join(model_dir, metrics_filename), 'w') as f:
+        json.dump(metadata, f, indent=4)
+
 def print_metrics(metrics):
     """
     Affiche les métriques de manière formatée
@@ -137,38 +323,66 @@ def save_metrics_to_json(metrics, filename='model_metrics.json'):
     with open(filename, 'w', encoding='utf-8') as f:
         json.dump(metrics_dict, f, indent=4, ensure_ascii=False)
 
-def main():
+def main(encoding='dense', search=False, n_jobs=-1):
     # Chemin du fichier
     file_path = 'Planif livraisons.xlsx'
+    timings = {}
     
     try:
         # Chargement et prétraitement des données
-        print("Chargement et prétraitement des données...")
-        data = load_and_preprocess_data(file_path)
+        print(f"Chargement et prétraitement des données (encodage: {encoding})...")
+        with timed_stage(timings, 'chargement'):
+            data = load_and_preprocess_data(file_path, encoding=encoding)
+            articles = list(data['article'].cat.categories) if encoding != 'dense' else None
         
         # Préparation des données d'entraînement et de test
         print("Préparation des données d'entraînement et de test...")
-        X_train, X_test, y_train, y_test = prepare_train_test_data(data)
+        with timed_stage(timings, 'preparation'):
+            if search:
+                # Le test porte sur la période la plus récente
+                X_train, X_test, y_train, y_test = prepare_time_ordered_data(data)
+            else:
+                X_train, X_test, y_train, y_test = prepare_train_test_data(data)
+            X_train, X_test, feature_names = encode_features(X_train, X_test, encoding, articles)
         
+        best_params, cv_results = None, None
+        if search:
+            print("Recherche des hyperparamètres (validation croisée chronologique)...")
+            with timed_stage(timings, 'recherche_cv'):
+                best_params, cv_results = search_hyperparameters(X_train, y_train, encoding, n_jobs=n_jobs)
+
         # Entraînement du modèle
         print("Entraînement du modèle XGBoost...")
-        model = train_xgboost_model(X_train, y_train)
+        with timed_stage(timings, 'entrainement'):
+            model = train_xgboost_model(X_train, y_train, encoding=encoding, params=best_params)
         
         # Évaluation du modèle
         print("Évaluation du modèle...")
-        metrics = evaluate_model(model, X_train, y_train, X_test, y_test)
+        with timed_stage(timings, 'evaluation'):
+            metrics = evaluate_model(model, X_train, y_train, X_test, y_test)
+        if cv_results:
+            metrics['cv_rmse'] = cv_results[0]['cv_rmse']
+            metrics['cv_rmse_std'] = cv_results[0]['cv_rmse_std']
         
         # Affichage des métriques
         print_metrics(metrics)
-
-        metrics = evaluate_model(model, X_train, y_train, X_test, y_test)
         save_metrics_to_json(metrics)
         
         # Sauvegarde du modèle et des métadonnées
-        metadata = save_model_and_metadata(model, X_train.columns, metrics)
+        extra_metadata = {}
+        if search:
+            extra_metadata.update({'best_params': best_params, 'cv_results': cv_results[:10]})
+        with timed_stage(timings, 'sauvegarde'):
+            metadata = save_model_and_metadata(model, feature_names, metrics,
+                                               encoding=encoding, articles=articles,
+                                               extra_metadata=extra_metadata)
+        # Les durées ne sont complètes qu'une fois la sauvegarde terminée
+        metadata['timings'] = dict(timings)
+        write_metadata(metadata)
         
         print("\nEntraînement terminé avec succès!")
-        print(f"Modèle sauvegardé le: {metadata['timestamp']}")
+        print(f"Modèle sauvegardé le: {metadata['timestamp']} (version {metadata['version']})")
+        print(f"Durée totale: {sum(timings.values()):.2f}s")
         
         # Retourner les métriques pour utilisation ultérieure si nécessaire
         return metrics
@@ -178,4 +392,15 @@ def main():
         return None
 
 if __name__ == "__main__":
-    metrics = main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Entraînement du modèle de planification des livraisons")
+    parser.add_argument('--encoding', choices=ENCODINGS, default='dense',
+                        help="Encodage de 'Désignation article' (défaut: dense)")
+    parser.add_argument('--search', action='store_true',
+                        help="Validation croisée chronologique et recherche d'hyperparamètres")
+    parser.add_argument('--n-jobs', type=int, default=-1,
+                        help="Nombre de processus pour la recherche (défaut: tous les cœurs)")
+    args = parser.parse_args()
+    metrics = main(encoding=args.encoding, search=args.search, n_jobs=args.n_jobs)
+    # Code de sortie non nul en cas d'échec : le job d'entraînement passe alors en "failed"
+    if metrics is None:
+        sys.exit(1)
@@ -1,14 +1,32 @@
 """
 Ce script Python combine deux fonctionnalités :
 1. Transformation des fichiers Excel avec des colonnes journalières (J1-J31) en format ligne par date
-2. Concaténation des fichiers transformés en fichiers CSV par année et un fichier global
+2. Concaténation des données transformées en fichiers par année et un fichier global (Parquet par défaut)
+
+Les mois sont transformés en parallèle (un processus par fichier) et stockés
+en partitions (une par mois) dans Logistique-new/<année>/. Un manifeste
+d'empreintes permet de ne retransformer que les fichiers nouveaux ou modifiés
+et de ne reconcaténer que les années concernées.
 """
 
 import pandas as pd
-from datetime import datetime, timedelta
 import calendar
 import os
+import sys
+import argparse
 import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingestion_manifest import IngestionManifest
+
+MONTH_MAP = {
+    '1-janvier': 1, '2-fevrier': 2, '3-mars': 3, '4-avril': 4, '5-mai': 5, '6-juin': 6,
+    '7-juillet': 7, '8-aout': 8, '9-septembre': 9, '10-octobre': 10, '11-novembre': 11, '12-decembre': 12
+}
+OUTPUT_COLUMNS = ['ETBDES', 'ARTDES', 'DATE', 'QUANTITE']
+OUTPUT_FORMATS = ('parquet', 'csv')
 
 def setup_logging(log_file="Logs/execution_logs.log"):
     """Configure le système de logging."""
@@ -36,149 +54,111 @@ def create_directory_if_not_exists(directory):
         os.makedirs(directory)
         logging.info(f"📁 Dossier créé : {directory}")
 
-def transform_excel_file(input_file, output_file, month_number):
-    """Transforme un fichier Excel du format colonnes vers le format lignes."""
-    logging.info(f"📄 Début du traitement de {input_file}")
+def transform_month(input_file, year, month_number):
+    """
+    Transforme un fichier mensuel du format colonnes (J1..Jn) vers le format
+    lignes (ETBDES, ARTDES, DATE, QUANTITE), de façon vectorisée (melt)
+    """
     data = pd.read_excel(input_file, header=1)
-    
-    year = int(output_file.split(os.sep)[-2])
     num_days = calendar.monthrange(year, month_number)[1]
-    start_date = datetime(year, month_number, 1)
-    
-    date_columns = [(start_date + timedelta(days=i)).strftime("%d/%m/%Y") for i in range(num_days)]
-    
-    logging.info(f"📅 Nombre de jours dans le mois {month_number}: {num_days}")
-    
-    columns_to_keep = ['ETBDES', 'ARTDES'] + [f'J{i+1}' for i in range(num_days)]
-    if 'PTLDES' in data.columns:
-        columns_to_keep.insert(1, 'PTLDES')
-        
-    data = data[columns_to_keep]
-    
-    new_columns = []
-    for col in data.columns:
-        if col.startswith("J"):
-            day_num = int(col[1:])
-            if 1 <= day_num <= num_days:
-                new_columns.append(date_columns[day_num - 1])
-            else:
-                logging.warning(f"⚠️ Colonne ignorée: {col} (le mois n'a que {num_days} jours)")
-        else:
-            new_columns.append(col)
-    
-    data.columns = new_columns
-    
-    new_rows = []
-    for idx, row in data.iterrows():
-        etbdes = row['ETBDES']
-        artdes = row['ARTDES']
-        
-        for col in data.columns:
-            if len(col.split('/')) == 3:
-                quantite = row[col]
-                if pd.notna(quantite) and quantite != 0:
-                    new_rows.append({
-                        'ETBDES': etbdes,
-                        'ARTDES': artdes,
-                        'DATE': datetime.strptime(col, '%d/%m/%Y').strftime('%Y-%m-%d'),
-                        'QUANTITE': quantite
-                    })
-    
-    if not new_rows:
-        logging.warning(f"⚠️ Attention : Aucune donnée valide trouvée dans {input_file}")
-        return
-        
-    new_df = pd.DataFrame(new_rows)
-    new_df = new_df.sort_values(['ETBDES', 'ARTDES', 'DATE'])
-    
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    new_df.to_excel(output_file, index=False)
-    logging.info(f"✅ Fichier {output_file} créé avec succès")
-
-def process_year_directory(year_dir, output_base_dir):
-    """Traite tous les fichiers d'une année."""
-    month_map = {
-        '1-janvier': 1, '2-fevrier': 2, '3-mars': 3, '4-avril': 4, '5-mai': 5, '6-juin': 6,
-        '7-juillet': 7, '8-aout': 8, '9-septembre': 9, '10-octobre': 10, '11-novembre': 11, '12-decembre': 12
-    }
-    
-    year = os.path.basename(year_dir)
-    output_year_dir = os.path.join(output_base_dir, year)
-    create_directory_if_not_exists(output_year_dir)
-    
-    files = [f for f in os.listdir(year_dir) if f.endswith('.xlsx') and not f.endswith('-final.xlsx') 
+    day_columns = [f'J{i+1}' for i in range(num_days)]
+
+    long_df = data[['ETBDES', 'ARTDES'] + day_columns].melt(
+        id_vars=['ETBDES', 'ARTDES'], value_vars=day_columns,
+        var_name='JOUR', value_name='QUANTITE'
+    )
+    long_df = long_df[long_df['QUANTITE'].notna() & (long_df['QUANTITE'] != 0)]
+
+    # J<n> -> date du n-ième jour du mois
+    days = long_df['JOUR'].str.slice(1).astype(int)
+    long_df['DATE'] = pd.Timestamp(year, month_number, 1) + pd.to_timedelta(days - 1, unit='D')
+
+    return long_df[OUTPUT_COLUMNS].sort_values(['ETBDES', 'ARTDES', 'DATE']).reset_index(drop=True)
+
+def _transform_task(task):
+    """Tâche exécutée dans un processus du pool : (tâche, DataFrame, erreur)"""
+    input_file, year, month_number = task
+    try:
+        return task, transform_month(input_file, year, month_number), None
+    except Exception as e:
+        return task, None, str(e)
+
+def list_month_files(year_dir, year):
+    """Liste les fichiers mensuels d'une année : [(chemin, année, mois)]"""
+    tasks = []
+    files = [f for f in os.listdir(year_dir) if f.endswith('.xlsx') and not f.endswith('-final.xlsx')
              and not f == f'{year}.xlsx' and not f.startswith('global')]
-    
     for file in sorted(files):
-        file_prefix = file.split(year + '.xlsx')[0]
-        month_number = month_map.get(file_prefix)
-        
+        month_number = MONTH_MAP.get(file.split(year + '.xlsx')[0])
         if month_number:
-            input_file = os.path.join(year_dir, file)
-            output_file = os.path.join(output_year_dir, file.replace('.xlsx', '-final.xlsx'))
-            logging.info(f"🔄 Traitement de {file}...")
-            try:
-                transform_excel_file(input_file, output_file, month_number)
-            except Exception as e:
-                logging.error(f"❌ Erreur lors du traitement de {file}: {str(e)}")
+            tasks.append((os.path.join(year_dir, file), int(year), month_number))
         else:
             logging.warning(f"⚠️ Format de nom de fichier non reconnu pour {file}")
+    return tasks
 
-def concatener_fichiers_annee(dossier_annee, annee):
-    """Concatène tous les fichiers transformés d'une année en un seul CSV."""
-    logging.info(f"📅 Concaténation des fichiers de l'année {annee}")
-    
-    all_dfs = []
-    fichiers_traites = 0
-    fichiers_erreur = 0
-    
-    # Modification ici : on ne prend que les fichiers qui se terminent par '-final.xlsx'
-    fichiers = [f for f in os.listdir(dossier_annee) if f.endswith('-final.xlsx')]
-    
-    if not fichiers:
-        logging.warning(f"⚠️ Aucun fichier '-final.xlsx' trouvé dans le dossier de l'année {annee}")
-        return None
-    
-    for fichier in sorted(fichiers):
-        try:
-            chemin_complet = os.path.join(dossier_annee, fichier)
-            df = pd.read_excel(chemin_complet)
-            
-            # Vérification des colonnes requises
-            colonnes_requises = ['ETBDES', 'ARTDES', 'DATE', 'QUANTITE']
-            if not all(col in df.columns for col in colonnes_requises):
-                logging.error(f"❌ Colonnes manquantes dans {fichier}. Colonnes requises : {colonnes_requises}")
-                fichiers_erreur += 1
-                continue
-            
-            all_dfs.append(df)
-            fichiers_traites += 1
-            logging.info(f"✅ Fichier {fichier} lu avec succès ({len(df)} lignes)")
-        except Exception as e:
-            logging.error(f"❌ Erreur lors de la lecture de {fichier}: {str(e)}")
-            fichiers_erreur += 1
-    
-    if not all_dfs:
-        logging.error(f"❌ Aucun fichier valide traité pour l'année {annee}")
-        return None
-    
-    df_final = pd.concat(all_dfs, ignore_index=True)
-    df_final = df_final.sort_values(['DATE', 'ETBDES', 'ARTDES'])
+def transform_months(tasks, n_jobs=None):
+    """
+    Transforme les fichiers mensuels en parallèle
+
+    Returns:
+        list: (tâche, DataFrame ou None en cas d'erreur) dans l'ordre des tâches
+    """
+    if not tasks:
+        return []
+    results = []
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(tasks)))
+    logging.info(f"🔄 {len(tasks)} fichiers mensuels à transformer, {n_jobs} processus")
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        for task, df, error in pool.map(_transform_task, tasks):
+            file = os.path.basename(task[0])
+            if error is not None:
+                logging.error(f"❌ Erreur lors du traitement de {file}: {error}")
+            elif df.empty:
+                logging.warning(f"⚠️ Attention : Aucune donnée valide trouvée dans {file}")
+            else:
+                logging.info(f"✅ {file} transformé ({len(df)} lignes)")
+            results.append((task, df))
+    return results
+
+def partition_path(output_dir, input_file, year, output_format='parquet'):
+    """Partition produite par un fichier mensuel : Logistique-new/<année>/<fichier>.<format>"""
+    month_file = os.path.splitext(os.path.basename(input_file))[0]
+    return os.path.join(output_dir, str(year), f"{month_file}.{output_format}")
+
+def read_table(path):
+    """Relit une partition ou une sortie écrite par write_table"""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, parse_dates=['DATE'])
+
+def write_table(df, basename, output_format='parquet'):
+    """Écrit un DataFrame au format demandé et retourne le chemin du fichier"""
+    path = f"{basename}.{output_format}"
+    if output_format == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, date_format='%Y-%m-%d')
+    return path
+
+def concatener_annee(dfs, annee, output_format='parquet'):
+    """Concatène les données mensuelles d'une année et écrit le fichier de l'année."""
+    logging.info(f"📅 Concaténation des données de l'année {annee}")
+    df_final = pd.concat(dfs, ignore_index=True)
+    df_final = df_final.sort_values(['DATE', 'ETBDES', 'ARTDES'], kind='stable').reset_index(drop=True)
     
-    nom_fichier_sortie = f"donnees_completes_{annee}.csv"
-    df_final.to_csv(nom_fichier_sortie, index=False)
+    nom_fichier_sortie = write_table(df_final, f"donnees_completes_{annee}", output_format)
     
     logging.info(f"📊 Résumé {annee}:")
-    logging.info(f"   - Fichiers traités avec succès: {fichiers_traites}")
-    logging.info(f"   - Fichiers en erreur: {fichiers_erreur}")
+    logging.info(f"   - Mois transformés: {len(dfs)}")
     logging.info(f"   - Nombre total de lignes: {len(df_final)}")
     logging.info(f"   - Fichier de sortie: {nom_fichier_sortie}")
     
     return df_final
 
-def main():
+def main(output_format='parquet', n_jobs=None, force=False):
     """Fonction principale qui orchestre tout le processus."""
     setup_logging()
+    start = time.perf_counter()
     
     # Configuration des chemins
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -189,37 +169,87 @@ def main():
         logging.error(f"❌ Erreur : Le dossier {input_dir} n'existe pas")
         return
     
-    # 1. Transformation des fichiers
     create_directory_if_not_exists(output_dir)
+    manifest = IngestionManifest(os.path.join(output_dir, 'manifest.json'), base_dir=script_dir)
     year_dirs = ['2022', '2023', '2024']
     
-    logging.info("🔄 Phase 1: Transformation des fichiers")
+    tasks = []
     for year in year_dirs:
         year_dir = os.path.join(input_dir, year)
         if os.path.exists(year_dir):
-            logging.info(f"📂 Traitement du dossier {year}...")
-            process_year_directory(year_dir, output_dir)
-    
-    # 2. Concaténation des fichiers
-    logging.info("🔄 Phase 2: Concaténation des fichiers")
-    all_years_dfs = []
-    
-    for year in year_dirs:
-        year_dir = os.path.join(output_dir, year)
-        if os.path.exists(year_dir):
-            df_year = concatener_fichiers_annee(year_dir, year)
-            if df_year is not None:
-                all_years_dfs.append(df_year)
+            tasks.extend(list_month_files(year_dir, year))
+    if not tasks:
+        logging.error("❌ Aucun fichier mensuel à traiter")
+        return
     
-    if all_years_dfs:
-        df_final_global = pd.concat(all_years_dfs, ignore_index=True)
-        df_final_global = df_final_global.sort_values(['DATE', 'ETBDES', 'ARTDES'])
-        
-        nom_fichier_global = f"donnees_completes_{min(year_dirs)}-{max(year_dirs)}.csv"
-        df_final_global.to_csv(nom_fichier_global, index=False)
-        logging.info(f"✨ Fichier final créé : {nom_fichier_global} ({len(df_final_global)} lignes)")
+    # Années touchées : fichiers nouveaux/modifiés ou disparus depuis le dernier passage
+    affected_years = set()
+    for orphan in manifest.remove_missing([task[0] for task in tasks]):
+        affected_years.add(int(os.path.basename(os.path.dirname(orphan))))
+        if os.path.exists(orphan):
+            os.remove(orphan)
+    to_process = set(manifest.plan([task[0] for task in tasks], force=force))
     
-    logging.info("🎉 Traitement terminé avec succès!")
+    # 1. Transformation des fichiers modifiés (en parallèle)
+    logging.info("🔄 Phase 1: Transformation des fichiers")
+    for (input_file, year, month_number), df in transform_months(
+            [task for task in tasks if task[0] in to_process], n_jobs):
+        affected_years.add(year)
+        if df is None:
+            manifest.record_failure(input_file)
+            continue
+        partitions = []
+        if not df.empty:
+            path = partition_path(output_dir, input_file, year, output_format)
+            create_directory_if_not_exists(os.path.dirname(path))
+            write_table(df, os.path.splitext(path)[0], output_format)
+            partitions.append(path)
+        manifest.record(input_file, partitions)
+    
+    # 2. Concaténation des années concernées (les autres ne sont relues que pour le fichier global)
+    logging.info("🔄 Phase 2: Concaténation des données")
+    nom_fichier_global = f"donnees_completes_{min(year_dirs)}-{max(year_dirs)}.{output_format}"
+    if manifest.report.failed:
+        # Reconcaténer sans le mois en erreur perdrait ses lignes : les sorties précédentes sont conservées
+        logging.warning("⚠️ Fichiers annuels et global non régénérés : au moins un fichier mensuel est en erreur")
+    else:
+        years = sorted({task[1] for task in tasks})
+        year_dfs = {}
+        for year in years:
+            year_output = f"donnees_completes_{year}.{output_format}"
+            if year in affected_years or not os.path.exists(year_output):
+                partitions = [path for task in tasks if task[1] == year for path in manifest.partitions(task[0])]
+                if not partitions:
+                    continue
+                year_dfs[year] = concatener_annee([read_table(path) for path in partitions], year, output_format)
+                manifest.mark_rewritten(year_output)
+
+        if manifest.report.rewritten or not os.path.exists(nom_fichier_global):
+            for year in years:
+                year_output = f"donnees_completes_{year}.{output_format}"
+                if year not in year_dfs and os.path.exists(year_output):
+                    year_dfs[year] = read_table(year_output)
+        if year_dfs and (manifest.report.rewritten or not os.path.exists(nom_fichier_global)):
+            df_final_global = pd.concat([year_dfs[year] for year in sorted(year_dfs)], ignore_index=True)
+            df_final_global = df_final_global.sort_values(['DATE', 'ETBDES', 'ARTDES'], kind='stable')
+
+            write_table(df_final_global, os.path.splitext(nom_fichier_global)[0], output_format)
+            manifest.mark_rewritten(nom_fichier_global)
+            logging.info(f"✨ Fichier final créé : {nom_fichier_global} ({len(df_final_global)} lignes)")
+    
+    manifest.save()
+    logging.info("📋 Rapport d'ingestion :")
+    for line in manifest.report.lines():
+        logging.info(f"   {line}")
+    logging.info(f"🎉 Traitement terminé avec succès en {time.perf_counter() - start:.1f}s !")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Transformation des fichiers de commandes mensuels")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='parquet',
+                        help="Format des fichiers de sortie (parquet par défaut)")
+    parser.add_argument('--n-jobs', type=int, default=None,
+                        help="Nombre de processus (par défaut : nombre de cœurs)")
+    parser.add_argument('--force', action='store_true',
+                        help="Retransforme tous les fichiers, sans tenir compte du manifeste")
+    args = parser.parse_args()
+    main(output_format=args.format, n_jobs=args.n_jobs, force=args.force)
\ No newline at end of file
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Backtest à origines glissantes des modèles de commandes.
+
+Pour chaque origine et chaque modèle, le modèle est ajusté une seule fois sur
+l'historique antérieur à l'origine et prévoit l'horizon maximal ; les
+métriques de chaque horizon h (R², MAPE, RMSE sur les h premiers jours) sont
+ensuite obtenues par tranches de cette unique prévision, en sommes cumulées.
+Les couples (modèle, origine) sont évalués en parallèle dans des processus.
+
+Résultats (aucun graphique n'est produit ici) :
+- <sortie>/horizon_metrics.csv : métriques par modèle, origine et horizon
+- <sortie>/horizon_metrics_summary.csv : moyenne sur les origines par modèle et horizon
+
+    python backtest.py [--start 2023-04-01] [--origins 4] [--step 7] [--horizon 21]
+                       [--models exp_smoothing,prophet] [--article "ALESE LOCATION"] [--n-jobs 4]
+"""
+
+import argparse
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+INPUT_FILE = 'donnees_finales.csv'
+OUTPUT_DIR = 'backtest'
+DEFAULT_START = '2023-04-01'
+DEFAULT_HORIZON = 21
+METRIC_COLUMNS = ['R2', 'MAPE', 'RMSE']
+
+def load_orders(input_file=INPUT_FILE):
+    """Lignes de commandes avec date d'expédition et quantité commandée"""
+    df = pd.read_csv(input_file, parse_dates=["Date expédition"], dayfirst=True)
+    df = df.dropna(subset=["Qté cdée"])
+    df["Qté cdée"] = pd.to_numeric(df["Qté cdée"], errors='coerce')
+    return df.drop_duplicates()
+
+def prepare_series(data, article=None):
+    """Quantités commandées par jour (jours sans commande à 0)"""
+    if article:
+        data = data[data["Désignation article"] == article]
+    ts = data.groupby("Date expédition")["Qté cdée"].sum().sort_index()
+    ts.index = pd.DatetimeIndex(ts.index)
+    return ts.asfreq('D', fill_value=0)
+
+def forecast_exp_smoothing(train, horizon):
+    """Holt-Winters additif, saisonnalité hebdomadaire"""
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+    model = ExponentialSmoothing(train, seasonal_periods=7, trend='add', seasonal='add')
+    return np.asarray(model.fit(optimized=True).forecast(steps=horizon), dtype=float)
+
+def forecast_prophet(train, horizon):
+    """Prophet sur les jours avec commandes, prévision des `horizon` jours suivant l'origine"""
+    from prophet import Prophet
+
+    history = train[train != 0].rename_axis('ds').reset_index(name='y')
+    model = Prophet(daily_seasonality=True, weekly_seasonality=True)
+    model.fit(history)
+    future = pd.DataFrame({'ds': pd.date_range(train.index[-1] + pd.Timedelta(days=1), periods=horizon, freq='D')})
+    return model.predict(future)['yhat'].to_numpy(dtype=float)
+
+MODELS = {
+    'exp_smoothing': forecast_exp_smoothing,
+    'prophet': forecast_prophet
+}
+
+def horizon_metrics(actual, predictions):
+    """
+    R², MAPE et RMSE sur les h premiers jours pour chaque h = 1..len(actual),
+    en une passe de sommes cumulées. Le MAPE ignore les jours sans commande
+    (division par zéro) ; le R² est indéfini (NaN) tant que la variance des
+    valeurs réelles est nulle.
+    """
+    actual = np.asarray(actual, dtype=float)
+    predictions = np.asarray(predictions, dtype=float)[:len(actual)]
+    h = np.arange(1, len(actual) + 1)
+    errors = actual - predictions
+
+    sse = np.cumsum(errors ** 2)
+    mean = np.cumsum(actual) / h
+    sst = np.cumsum(actual ** 2) - h * mean ** 2
+    nonzero = actual != 0
+    ape = np.where(nonzero, np.abs(errors) / np.where(nonzero, np.abs(actual), 1), 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = np.where(sst > 1e-12, 1 - sse / sst, np.nan)
+        mape = np.cumsum(ape) / np.cumsum(nonzero) * 100
+    return pd.DataFrame({
+        'horizon': h,
+        'R2': r2,
+        'MAPE': mape,
+        'RMSE': np.sqrt(sse / h)
+    })
+
+def _evaluate_origin(task):
+    """Ajuste un modèle à une origine et retourne ses métriques par horizon (exécuté dans un processus)"""
+    model_name, origin, series, horizon = task
+    start = time.perf_counter()
+    train = series[series.index < origin]
+    actual = series[origin:origin + pd.Timedelta(days=horizon - 1)]
+    try:
+        if len(actual) < horizon:
+            raise ValueError(f"{len(actual)} jours observés après l'origine, {horizon} attendus")
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            predictions = MODELS[model_name](train, horizon)
+        metrics = horizon_metrics(actual.to_numpy(), predictions)
+        error = None
+    except Exception as e:
+        metrics = pd.DataFrame({'horizon': np.arange(1, horizon + 1), **{c: np.nan for c in METRIC_COLUMNS}})
+        error = str(e)
+    metrics.insert(0, 'origin', origin.strftime('%Y-%m-%d'))
+    metrics.insert(0, 'model', model_name)
+    metrics['fit_seconds'] = time.perf_counter() - start
+    metrics['error'] = error
+    return metrics
+
+def rolling_origins(start, count, step):
+    """`count` origines espacées de `step` jours à partir de `start`"""
+    return [pd.Timestamp(start) + pd.Timedelta(days=step * i) for i in range(count)]
+
+def run_backtest(series_by_model, origins, horizon=DEFAULT_HORIZON, n_jobs=None):
+    """
+    Évalue chaque (modèle, origine) en parallèle
+
+    Args:
+        series_by_model (dict): {nom du modèle: série journalière à prévoir}
+
+    Returns:
+        tuple: (métriques par origine, moyenne sur les origines) en DataFrames
+    """
+    tasks = [(model_name, origin, series, horizon)
+             for model_name, series in series_by_model.items() for origin in origins]
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(tasks)))
+    if n_jobs == 1:
+        results = [_evaluate_origin(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(_evaluate_origin, tasks))
+
+    metrics = pd.concat(results, ignore_index=True)
+    for (model_name, origin), group in metrics.groupby(['model', 'origin'], sort=False):
+        error = group['error'].iloc[0]
+        status = f"erreur : {error}" if error else f"{group['fit_seconds'].iloc[0]:.1f}s"
+        print(f"   {model_name} @ {origin} : {status}")
+    summary = (metrics[metrics['error'].isna()]
+               .groupby(['model', 'horizon'])[METRIC_COLUMNS]
+               .mean()
+               .reset_index())
+    return metrics, summary
+
+def write_tables(metrics, summary, output_dir=OUTPUT_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+    metrics.to_csv(os.path.join(output_dir, 'horizon_metrics.csv'), index=False)
+    summary.to_csv(os.path.join(output_dir, 'horizon_metrics_summary.csv'), index=False)
+    print(f"Tables écrites dans {output_dir}/")
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest à origines glissantes des modèles de commandes")
+    parser.add_argument('--input', default=INPUT_FILE, help="Fichier des commandes")
+    parser.add_argument('--start', default=DEFAULT_START, help="Première origine (AAAA-MM-JJ)")
+    parser.add_argument('--origins', type=int, default=1, help="Nombre d'origines")
+    parser.add_argument('--step', type=int, default=7, help="Jours entre deux origines")
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help="Horizon maximal (jours)")
+    parser.add_argument('--models', default=','.join(MODELS), help="Modèles évalués, séparés par des virgules")
+    parser.add_argument('--article', help="Article prévu par Prophet (par défaut : toutes les commandes)")
+    parser.add_argument('--n-jobs', type=int, default=None, help="Nombre de processus (par défaut : nombre de CPU)")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="Dossier des tables de résultats")
+    args = parser.parse_args()
+
+    models = [name.strip() for name in args.models.split(',') if name.strip()]
+    unknown = set(models) - set(MODELS)
+    if unknown:
+        parser.error(f"Modèles inconnus : {sorted(unknown)} (disponibles : {list(MODELS)})")
+
+    df = load_orders(args.input)
+    series_by_model = {
+        name: prepare_series(df, args.article if name == 'prophet' else None) for name in models
+    }
+    origins = rolling_origins(args.start, args.origins, args.step)
+    print(f"Backtest : {len(models)} modèle(s) x {len(origins)} origine(s), horizon {args.horizon} jours")
+    start = time.perf_counter()
+    metrics, summary = run_backtest(series_by_model, origins, args.horizon, args.n_jobs)
+    print(f"Backtest terminé en {time.perf_counter() - start:.1f}s")
+    write_tables(metrics, summary, args.output_dir)
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,34 @@
 import pandas as pd
 import numpy as np
-import json
-import joblib
-from prophet import Prophet
 import warnings
-from datetime import datetime
-import os
+from model_registry import registry, EXP_SMOOTHING, PROPHET_GLOBAL, PROPHET_ARTICLE
 
 # Suppression des avertissements
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
+# Les modèles sont chargés une seule fois par le registre (model_registry) et
+# leur prévision calculée jusqu'à 30 jours : chaque prédiction en est une tranche
+
 def load_model_metrics():
     """Charge les métriques des modèles"""
-    with open('models/metrics.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return registry.load_metrics()
 
 def predict_exponential_smoothing(horizon):
     """Fait des prédictions avec le modèle ExponentialSmoothing"""
-    model = joblib.load('models/exp_smoothing_model.joblib')
-    predictions = model.forecast(steps=horizon)
-    
-    return pd.DataFrame({
-        'date': predictions.index,
-        'prediction': predictions.values.round(0)
-    })
+    return registry.predict(EXP_SMOOTHING, horizon)
 
 def predict_prophet_global(horizon):
     """Fait des prédictions avec le modèle Prophet global"""
-    model = Prophet()
-    model.load('models/prophet_model.json')
-    
-    future = model.make_future_dataframe(periods=horizon)
-    forecast = model.predict(future)
-    
-    results = pd.DataFrame({
-        'date': forecast.tail(horizon)['ds'],
-        'prediction': forecast.tail(horizon)['yhat'].round(0),
-        'limite_basse': forecast.tail(horizon)['yhat_lower'].round(0),
-        'limite_haute': forecast.tail(horizon)['yhat_upper'].round(0)
-    })
-    
-    return results
+    return registry.predict(PROPHET_GLOBAL, horizon)
 
 def predict_prophet_article(article_name, horizon):
     """Fait des prédictions pour un article spécifique avec Prophet"""
-    model_path = f'models/articles/prophet_{article_name.replace("/", "_")}.json'
-    
-    if not os.path.exists(model_path):
-        raise ValueError(f"Pas de modèle trouvé pour l'article '{article_name}'")
-    
-    model = Prophet()
-    model.load(model_path)
-    
-    future = model.make_future_dataframe(periods=horizon)
-    forecast = model.predict(future)
-    
-    results = pd.DataFrame({
-        'date': forecast.tail(horizon)['ds'],
-        'prediction': forecast.tail(horizon)['yhat'].round(0),
-        'limite_basse': forecast.tail(horizon)['yhat_lower'].round(0),
-        'limite_haute': forecast.tail(horizon)['yhat_upper'].round(0),
-        'article': article_name
-    })
-    
-    return results
+    return registry.predict(PROPHET_ARTICLE, horizon, article_name)
 
 def get_available_articles():
     """Retourne la liste des articles disponibles"""
-    articles = []
-    for file in os.listdir('models/articles'):
-        if file.startswith('prophet_') and file.endswith('.json'):
-            article = file[8:-5].replace('_', '/')  # Supprime 'prophet_' et '.json'
-            articles.append(article)
-    return articles
+    return registry.available_articles()
 
 def main():
     # Affichage des métriques disponibles
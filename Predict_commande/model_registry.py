@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Registre des modèles de prévision des commandes.
+
+Chaque modèle (lissage exponentiel, Prophet global, Prophet par article) est
+désérialisé une seule fois, puis sa prévision est calculée jusqu'à l'horizon
+maximal de 30 jours ; une prédiction n'est ensuite qu'une tranche de cette
+table. Les modèles par article sont gardés dans un cache LRU borné. Chaque
+accès compare le mtime/taille du fichier du modèle (file_fingerprint) : un
+modèle réentraîné est rechargé au prochain accès.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+import pandas as pd
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(MODEL_DIR))
+from model_store import file_fingerprint
+
+MODELS_DIR = os.path.join(MODEL_DIR, 'models')
+ARTICLES_DIRNAME = 'articles'
+EXP_SMOOTHING_FILENAME = 'exp_smoothing_model.joblib'
+PROPHET_GLOBAL_FILENAME = 'prophet_model.json'
+METRICS_FILENAME = 'metrics.json'
+MAX_HORIZON = 30
+
+EXP_SMOOTHING = 'exp_smoothing'
+PROPHET_GLOBAL = 'prophet_global'
+PROPHET_ARTICLE = 'prophet_article'
+
+def article_filename(article_name):
+    return f'prophet_{article_name.replace("/", "_")}.json'
+
+def load_prophet(path):
+    """Modèle Prophet sérialisé en JSON (prophet.serialize.model_to_json)"""
+    from prophet.serialize import model_from_json
+
+    with open(path, 'r') as f:
+        return model_from_json(f.read())
+
+def forecast_exp_smoothing(model, horizon=MAX_HORIZON):
+    predictions = model.forecast(steps=horizon)
+    return pd.DataFrame({
+        'date': predictions.index,
+        'prediction': predictions.values.round(0)
+    })
+
+def forecast_prophet(model, horizon=MAX_HORIZON):
+    # Seules les dates futures sont prédites (pas l'historique)
+    future = model.make_future_dataframe(periods=horizon, include_history=False)
+    forecast = model.predict(future)
+    return pd.DataFrame({
+        'date': forecast['ds'],
+        'prediction': forecast['yhat'].round(0),
+        'limite_basse': forecast['yhat_lower'].round(0),
+        'limite_haute': forecast['yhat_upper'].round(0)
+    })
+
+class ForecastEntry:
+    """Modèle chargé et sa prévision précalculée jusqu'à MAX_HORIZON"""
+    def __init__(self, name, path, fingerprint, model, forecast, load_seconds):
+        self.name = name
+        self.path = path
+        self.fingerprint = fingerprint
+        self.model = model
+        self.forecast = forecast
+        self.load_seconds = load_seconds
+
+    def slice(self, horizon):
+        return self.forecast.head(horizon)
+
+class CommandeModelRegistry:
+    """
+    Modèles de commandes en mémoire : les deux modèles globaux, et au plus
+    `maxsize` modèles par article (les moins récemment utilisés sont évincés)
+    """
+    def __init__(self, models_dir=MODELS_DIR, maxsize=64):
+        self.models_dir = models_dir
+        self.articles_dir = os.path.join(models_dir, ARTICLES_DIRNAME)
+        self.maxsize = maxsize
+        self._globals = {}
+        self._articles = OrderedDict()
+        self._article_names = None  # (mtime du dossier, {article: fichier})
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _load_entry(self, name, path, loader, forecaster):
+        start = time.perf_counter()
+        fingerprint = file_fingerprint([path])
+        model = loader(path)
+        forecast = forecaster(model, MAX_HORIZON)
+        return ForecastEntry(name, path, fingerprint, model, forecast, time.perf_counter() - start)
+
+    def _fresh(self, entry):
+        try:
+            return file_fingerprint([entry.path]) == entry.fingerprint
+        except FileNotFoundError:
+            return False
+
+    def _get_global(self, kind):
+        entry = self._globals.get(kind)
+        if entry is not None and self._fresh(entry):
+            return entry
+        with self._lock:
+            entry = self._globals.get(kind)
+            if entry is None or not self._fresh(entry):
+                if kind == EXP_SMOOTHING:
+                    entry = self._load_entry(kind, os.path.join(self.models_dir, EXP_SMOOTHING_FILENAME),
+                                             joblib.load, forecast_exp_smoothing)
+                else:
+                    entry = self._load_entry(kind, os.path.join(self.models_dir, PROPHET_GLOBAL_FILENAME),
+                                             load_prophet, forecast_prophet)
+                self._globals[kind] = entry
+            return entry
+
+    def available_articles(self):
+        """Articles ayant un modèle, relus seulement quand le dossier change"""
+        try:
+            mtime = os.stat(self.articles_dir).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        cached = self._article_names
+        if cached is None or cached[0] != mtime:
+            names = {
+                file[8:-5].replace('_', '/'): file  # Supprime 'prophet_' et '.json'
+                for file in os.listdir(self.articles_dir)
+                if file.startswith('prophet_') and file.endswith('.json')
+            }
+            self._article_names = cached = (mtime, names)
+        return sorted(cached[1])
+
+    def _get_article(self, article_name):
+        path = os.path.join(self.articles_dir, article_filename(article_name))
+        with self._lock:
+            entry = self._articles.get(article_name)
+            if entry is not None and self._fresh(entry):
+                self._articles.move_to_end(article_name)
+                self.hits += 1
+                return entry
+        if not os.path.exists(path):
+            raise ValueError(f"Pas de modèle trouvé pour l'article '{article_name}'")
+
+        # Chargement hors verrou : les autres articles restent servis pendant ce temps
+        entry = self._load_entry(article_name, path, load_prophet, forecast_prophet)
+        with self._lock:
+            self.misses += 1
+            self._articles[article_name] = entry
+            self._articles.move_to_end(article_name)
+            while len(self._articles) > self.maxsize:
+                self._articles.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def predict(self, kind, horizon, article_name=None):
+        """
+        Prévision des `horizon` prochains jours (tranche de la table précalculée)
+
+        Returns:
+            pd.DataFrame: date, prediction (et limite_basse, limite_haute pour Prophet)
+        """
+        if not 1 <= horizon <= MAX_HORIZON:
+            raise ValueError(f"L'horizon doit être compris entre 1 et {MAX_HORIZON} jours")
+        if kind == PROPHET_ARTICLE:
+            if not article_name:
+                raise ValueError("Un article est requis pour la prédiction par article")
+            results = self._get_article(article_name).slice(horizon).copy()
+            results['article'] = article_name
+            return results
+        if kind not in (EXP_SMOOTHING, PROPHET_GLOBAL):
+            raise ValueError(f"Type de modèle inconnu : {kind}")
+        return self._get_global(kind).slice(horizon)
+
+    def load_metrics(self):
+        with open(os.path.join(self.models_dir, METRICS_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def preload(self):
+        """Charge les modèles globaux disponibles (préchauffage) ; retourne les erreurs par modèle"""
+        errors = {}
+        for kind in (EXP_SMOOTHING, PROPHET_GLOBAL):
+            try:
+                self._get_global(kind)
+            except Exception as e:
+                errors[kind] = str(e)
+        return errors
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "global_models": sorted(self._globals),
+                "article_models": len(self._articles),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+registry = CommandeModelRegistry(maxsize=int(os.getenv("COMMANDE_MODEL_CACHE_SIZE", "64")))
@@ -4,16 +4,47 @@ import json
 import joblib
 from statsmodels.tsa.holtwinters import ExponentialSmoothing
 from prophet import Prophet
+from prophet.serialize import model_to_json
 from sklearn.metrics import r2_score, mean_absolute_percentage_error
+import argparse
 import os
+import time
+from model_registry import MODELS_DIR, ARTICLES_DIRNAME, article_filename
+from process_tasks import run_process_tasks
+
+# Budget par modèle (secondes) et nombre minimal de jours d'historique par série
+DEFAULT_TIME_BUDGET = 120
+MIN_POINTS = 30
 
 # Créer le dossier models s'il n'existe pas
 os.makedirs('models/articles', exist_ok=True)
 
+def write_atomic(path, write):
+    """
+    Écrit un fichier de modèle via un fichier temporaire puis os.replace :
+    model_registry recharge les modèles dont le fichier change et ne doit
+    jamais lire un fichier à moitié écrit
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_prophet_json(path, model):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            f.write(model_to_json(model))
+    write_atomic(path, write)
+
 def train_exponential_smoothing(df):
     model = ExponentialSmoothing(df['y'], trend='add', seasonal='add', seasonal_periods=12)
     model_fit = model.fit()
-    joblib.dump(model_fit, 'models/exp_smoothing_model.joblib')
+    write_atomic('models/exp_smoothing_model.joblib', lambda tmp_path: joblib.dump(model_fit, tmp_path))
     predictions = model_fit.fittedvalues
     
     return {
@@ -24,7 +55,8 @@ def train_exponential_smoothing(df):
 def train_prophet_global(df):
     model = Prophet()
     model.fit(df)
-    model.save('models/prophet_model.json')
+    # Format JSON lu par model_registry (prophet.serialize.model_from_json)
+    write_prophet_json('models/prophet_model.json', model)
     forecast = model.predict(df)
     
     return {
@@ -32,22 +64,131 @@ def train_prophet_global(df):
         'MAPE': mean_absolute_percentage_error(df['y'], forecast['yhat']) * 100
     }
 
-def train_prophet_articles(df):
-    articles_metrics = {}
-    model = Prophet()
-    model.add_regressor('article')
-    model.fit(df)
-    joblib.dump(model, 'models/prophet_articles_model.joblib')
-    forecast = model.predict(df)
+def _fit_article(conn, name, series, path):
+    """Exécuté dans un processus dédié : ajuste Prophet sur une série et écrit le modèle JSON"""
+    start = time.perf_counter()
+    try:
+        model = Prophet()
+        model.fit(series)
+        forecast = model.predict(series[['ds']])
+        write_prophet_json(path, model)
+        conn.send({
+            'status': 'ok',
+            'R2': r2_score(series['y'], forecast['yhat']),
+            'MAPE': mean_absolute_percentage_error(series['y'], forecast['yhat']) * 100,
+            'fit_seconds': time.perf_counter() - start
+        })
+    except Exception as e:
+        conn.send({'status': 'error', 'error': str(e), 'fit_seconds': time.perf_counter() - start})
+    finally:
+        conn.close()
 
-    articles_metrics['global'] = {
-        'R2': r2_score(df['y'], forecast['yhat']),
-        'MAPE': mean_absolute_percentage_error(df['y'], forecast['yhat']) * 100
+def run_fits(tasks, n_jobs=None, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    Ajuste chaque série dans son propre processus, au plus n_jobs à la fois ;
+    un ajustement qui dépasse `time_budget` secondes est arrêté avec son
+    processus cmdstan (voir process_tasks)
+
+    Args:
+        tasks (list): [(nom du modèle, série ds/y, chemin du fichier JSON)]
+
+    Returns:
+        dict: {nom du modèle: métriques et statut}
+    """
+    results = {}
+
+    def record(name, result):
+        results[name] = result
+        print(f"   [{len(results)}/{len(tasks)}] {name} : {result['status']} ({result['fit_seconds']:.1f}s)")
+
+    run_process_tasks([(name, (name, series, path)) for name, series, path in tasks], _fit_article,
+                      n_jobs=n_jobs, timeout=time_budget, on_result=record)
+    return results
+
+def article_series(df, by_establishment=False, min_points=MIN_POINTS):
+    """
+    Séries journalières par article (ou par établissement et article)
+
+    Returns:
+        tuple: ([(nom, série ds/y, chemin du modèle)], {nom: nombre de jours} des séries trop courtes)
+    """
+    keys = ['etablissement', 'article'] if by_establishment else ['article']
+    tasks, skipped = [], {}
+    for key, group in df.groupby(keys):
+        key = key if isinstance(key, tuple) else (key,)
+        etablissement, article = key if by_establishment else (None, key[0])
+        series = group.groupby('ds')['y'].sum().reset_index()
+        name = f"{etablissement} / {article}" if by_establishment else article
+        if len(series) < min_points:
+            skipped[name] = len(series)
+            continue
+        if by_establishment:
+            path = os.path.join(MODELS_DIR, 'etablissements', str(etablissement).replace("/", "_"),
+                                article_filename(article))
+        else:
+            path = os.path.join(MODELS_DIR, ARTICLES_DIRNAME, article_filename(article))
+        tasks.append((name, series, path))
+    return tasks, skipped
+
+def train_prophet_articles(df, by_establishment=False, n_jobs=None, time_budget=DEFAULT_TIME_BUDGET,
+                           min_points=MIN_POINTS):
+    """
+    Un modèle Prophet par article (ou par établissement et article), ajustés en
+    parallèle ; les séries de moins de `min_points` jours sont ignorées
+
+    Returns:
+        dict: métriques par modèle et résumé agrégé
+    """
+    tasks, skipped = article_series(df, by_establishment, min_points)
+    print(f"{len(tasks)} modèles à entraîner, {len(skipped)} séries ignorées (moins de {min_points} jours)")
+    start = time.perf_counter()
+    results = run_fits(tasks, n_jobs=n_jobs, time_budget=time_budget) if tasks else {}
+    for name, n_points in skipped.items():
+        results[name] = {'status': 'skipped', 'n_points': n_points}
+    for name, series, _ in tasks:
+        results[name]['n_points'] = len(series)
+
+    trained = [r for r in results.values() if r['status'] == 'ok']
+    summary = {
+        'models': len(results),
+        'trained': len(trained),
+        'skipped': len(skipped),
+        'timeout': sum(1 for r in results.values() if r['status'] == 'timeout'),
+        'failed': sum(1 for r in results.values() if r['status'] == 'error'),
+        'elapsed_seconds': time.perf_counter() - start,
+        'time_budget_seconds': time_budget,
+        'min_points': min_points
     }
+    if trained:
+        summary['R2_mean'] = float(np.mean([r['R2'] for r in trained]))
+        summary['MAPE_median'] = float(np.median([r['MAPE'] for r in trained]))
+    print(f"Modèles par article : {summary['trained']} entraînés, {summary['timeout']} hors budget, "
+          f"{summary['failed']} en erreur en {summary['elapsed_seconds']:.1f}s")
+    return {'summary': summary, 'models': dict(sorted(results.items()))}
+
+def save_article_metrics(article_metrics, key='prophet_articles', path='models/metrics.json'):
+    """Met à jour une entrée de models/metrics.json sans toucher aux autres modèles"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            metrics = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        metrics = {}
+    metrics[key] = article_metrics
 
-    return articles_metrics
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(metrics, f, indent=4)
+    write_atomic(path, write)
 
 def main():
+    parser = argparse.ArgumentParser(description="Entraînement des modèles de prévision des commandes")
+    parser.add_argument('--n-jobs', type=int, default=None, help="Processus pour les modèles par article (par défaut : nombre de CPU)")
+    parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET, help="Budget maximal par modèle (secondes)")
+    parser.add_argument('--min-points', type=int, default=MIN_POINTS, help="Jours d'historique minimum par série")
+    parser.add_argument('--par-etablissement', action='store_true',
+                        help="Entraîne aussi un modèle par établissement et article (colonne 'etablissement')")
+    args = parser.parse_args()
+
     df = pd.read_csv('donnees_finales.csv')  # Assurez-vous d'avoir ce fichier
     df['ds'] = pd.to_datetime(df['date'])
     df['y'] = df['quantite']
@@ -61,8 +202,17 @@ def main():
     print("Entraînement du modèle Prophet global...")
     metrics['prophet_global'] = train_prophet_global(df[['ds', 'y']])
 
-    print("Entraînement du modèle Prophet par article...")
-    metrics['prophet_articles'] = train_prophet_articles(df[['ds', 'y', 'article']])
+    print("Entraînement des modèles Prophet par article...")
+    metrics['prophet_articles'] = train_prophet_articles(
+        df[['ds', 'y', 'article']], n_jobs=args.n_jobs, time_budget=args.time_budget, min_points=args.min_points
+    )
+
+    if args.par_etablissement:
+        print("Entraînement des modèles Prophet par établissement et article...")
+        metrics['prophet_etablissements'] = train_prophet_articles(
+            df[['ds', 'y', 'etablissement', 'article']], by_establishment=True,
+            n_jobs=args.n_jobs, time_budget=args.time_budget, min_points=args.min_points
+        )
 
     # Sauvegarde des métriques
     with open('models/metrics.json', 'w', encoding='utf-8') as f:
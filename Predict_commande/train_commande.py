@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import json
+import argparse
 
 class PredicteurTemporel:
     def __init__(self, chemin_donnees='donnees_completes_logistique_formatted.csv'):
@@ -66,6 +67,14 @@ class PredicteurTemporel:
 
 # Code de test
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entraînement du prédicteur de commandes")
+    parser.add_argument('--articles', action='store_true',
+                        help="Entraîne aussi un modèle Prophet par article (models/articles, servis par model_registry)")
+    parser.add_argument('--n-jobs', type=int, default=None, help="Processus pour les modèles par article")
+    parser.add_argument('--time-budget', type=float, default=None, help="Budget maximal par modèle d'article (secondes)")
+    args = parser.parse_args()
+
+    print("Chargement des données de commandes...")
     predicteur = PredicteurTemporel()
 
     # Séparation des données (80% entraînement, 20% test)
@@ -76,14 +85,26 @@ if __name__ == "__main__":
     df_test_prophet = predicteur.preparer_donnees_prophet(test_data)
 
     # Entraînement du modèle
+    print("Entraînement du modèle Prophet global...")
     modele = predicteur.entrainer_modele(df_train_prophet)
 
     # Prédictions sur les données de test
+    print("Évaluation du modèle sur les données de test...")
     previsions = predicteur.predire(modele, df_test_prophet)
 
     # Évaluation des performances
     metrics = predicteur.evaluer_performances(df_test_prophet['y'].values, previsions['yhat'].values)
 
+    # Modèles par article, sur le même historique (colonnes renommées pour predict_commande)
+    if args.articles:
+        from predict_commande import DEFAULT_TIME_BUDGET, save_article_metrics, train_prophet_articles
+        print("Entraînement des modèles Prophet par article...")
+        df_articles = predicteur.df_historique.rename(columns={'DATE': 'ds', 'QUANTITE': 'y', 'ARTDES': 'article'})
+        save_article_metrics(train_prophet_articles(
+            df_articles[['ds', 'y', 'article']], n_jobs=args.n_jobs,
+            time_budget=args.time_budget or DEFAULT_TIME_BUDGET
+        ))
+
     # Export des metrics en JSON
     metrics['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     metrics['test_r2'] = metrics.pop('r2')
@@ -91,3 +112,4 @@ if __name__ == "__main__":
     metrics['test_rmse'] = metrics.pop('rmse')
     with open('./trained_models/model_metrics.json', 'w') as f:
         json.dump(metrics, f, indent=4)
+    print("Métriques sauvegardées dans trained_models/model_metrics.json")
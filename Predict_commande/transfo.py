@@ -1,34 +1,75 @@
 import pandas as pd
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingestion_manifest import IngestionManifest
 
 # Liste des fichiers à concaténer
 fichiers = ["2021.xlsx", "2022.xlsx", "2023.xlsx", "2024.xlsx"]
 
 # Colonnes à conserver
 colonnes_a_conserver = ["Date expédition", "Désignation article", "Poids", "Qté cdée", "Qté livrée", "Poids total"]
-
-# Initialisation d'une liste pour stocker les DataFrames
-dfs = []
+# Types imposés avant l'écriture des extraits parquet : les colonnes lues depuis
+# Excel peuvent mêler nombres et textes, ce que pyarrow refuse
+colonnes_numeriques = ["Poids", "Qté cdée", "Qté livrée", "Poids total"]
+colonnes_texte = ["Désignation article"]
 
 # Chemin du dossier contenant les fichiers (adaptez si nécessaire)
 dossier = "./Data/"
 
-# Boucle sur les fichiers pour les lire et les concaténer
-for idx, fichier in enumerate(fichiers):
-    chemin_fichier = os.path.join(dossier, fichier)
+# Extraits par fichier (colonnes conservées), relus tels quels si le fichier source n'a pas changé
+dossier_partitions = os.path.join(dossier, "partitions")
+fichier_final = os.path.join(dossier, "donnees_finales.xlsx")
+manifest = IngestionManifest(os.path.join(dossier, "ingestion_manifest.json"))
+
+chemins = [os.path.join(dossier, fichier) for fichier in fichiers]
+# Extraits des fichiers sources supprimés ou retirés de la liste
+for partition in manifest.remove_missing(chemins):
+    if os.path.exists(partition):
+        os.remove(partition)
+a_traiter = manifest.plan(chemins)
+
+def normaliser_types(df):
+    """Quantités et poids en nombres (valeurs non numériques -> NaN), libellés en texte, dates en datetime"""
+    df = df.copy()
+    for colonne in colonnes_numeriques:
+        df[colonne] = pd.to_numeric(df[colonne], errors='coerce')
+    for colonne in colonnes_texte:
+        df[colonne] = df[colonne].where(df[colonne].isna(), df[colonne].astype(str))
+    df["Date expédition"] = pd.to_datetime(df["Date expédition"], dayfirst=True, errors='coerce')
+    return df
+
+def lire_ou_transformer(chemin_fichier):
+    """Extrait d'un fichier : relu depuis sa partition s'il est inchangé, sinon retransformé"""
+    partition = os.path.join(dossier_partitions, os.path.basename(chemin_fichier).replace(".xlsx", ".parquet"))
+
+    if chemin_fichier not in a_traiter:
+        print(f"{chemin_fichier} inchangé, lecture de l'extrait {partition}")
+        return pd.read_parquet(partition)
 
     # Lecture du fichier en sautant la première ligne (l'entête est sur la 2e ligne)
     df = pd.read_excel(chemin_fichier, skiprows=1)
 
     # Conserver uniquement les colonnes souhaitées
-    df = df[colonnes_a_conserver]
-
-    dfs.append(df)
+    df = normaliser_types(df[colonnes_a_conserver])
 
-# Concaténation des DataFrames
-resultat_final = pd.concat(dfs, ignore_index=True)
+    os.makedirs(dossier_partitions, exist_ok=True)
+    df.to_parquet(partition, index=False)
+    manifest.record(chemin_fichier, [partition])
+    return df
 
-# Exportation vers un nouveau fichier Excel
-resultat_final.to_excel("./Data/donnees_finales.xlsx", index=False)
+# Concaténation des DataFrames et exportation (seulement si un fichier a changé) ;
+# sinon aucun extrait n'est relu
+if manifest.changed or a_traiter or not os.path.exists(fichier_final):
+    dfs = [lire_ou_transformer(chemin_fichier) for chemin_fichier in chemins if os.path.exists(chemin_fichier)]
+    resultat_final = pd.concat(dfs, ignore_index=True)
+    resultat_final.to_excel(fichier_final, index=False)
+    manifest.mark_rewritten(fichier_final)
+    print("La concaténation est terminée ! Le fichier final est 'donnees_finales.xlsx'.")
+else:
+    print("Aucun fichier modifié, 'donnees_finales.xlsx' est à jour.")
 
-print("La concaténation est terminée ! Le fichier final est 'donnees_finales.xlsx'.")
+manifest.save()
+for ligne in manifest.report.lines():
+    print(ligne)
@@ -0,0 +1,175 @@
+"""
+Manifeste d'ingestion : empreinte (SHA-256) de chaque fichier source et
+partitions qu'il a produites.
+
+Au lancement suivant, seuls les fichiers nouveaux ou modifiés (ou dont une
+partition a disparu) sont retransformés ; les sorties concaténées ne sont
+réécrites que si une de leurs partitions a changé. Un fichier source supprimé
+du disque est oublié comme un fichier retiré de l'entrée, et ses partitions
+sont rendues à l'appelant pour suppression.
+"""
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_sha256(path):
+    """SHA-256 d'un fichier, lu par blocs"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+class IngestionReport:
+    """Fichiers transformés, ignorés (inchangés) et supprimés lors d'un lancement"""
+    def __init__(self):
+        self.processed = []
+        self.skipped = []
+        self.removed = []
+        self.failed = []
+        self.rewritten = []
+
+    def lines(self):
+        yield f"Fichiers transformés : {len(self.processed)}"
+        for source in self.processed:
+            yield f"   + {source}"
+        yield f"Fichiers ignorés (inchangés) : {len(self.skipped)}"
+        for source in self.skipped:
+            yield f"   = {source}"
+        if self.removed:
+            yield f"Fichiers sources disparus : {len(self.removed)}"
+            for source in self.removed:
+                yield f"   - {source}"
+        if self.failed:
+            yield f"Fichiers en erreur : {len(self.failed)}"
+            for source in self.failed:
+                yield f"   ! {source}"
+        yield f"Sorties réécrites : {len(self.rewritten)}"
+        for output in self.rewritten:
+            yield f"   > {output}"
+
+class IngestionManifest:
+    """
+    Manifeste JSON stocké à côté des sorties d'un pipeline.
+
+    Les chemins sont enregistrés relativement à base_dir. Le hachage d'un
+    fichier n'est recalculé que si sa taille ou sa date de modification a
+    changé depuis le dernier passage.
+    """
+    def __init__(self, path, base_dir=None):
+        self.path = path
+        self.base_dir = base_dir or os.path.dirname(os.path.abspath(path))
+        self.entries = {}
+        self.report = IngestionReport()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f).get('sources', {})
+
+    def _key(self, path):
+        return os.path.relpath(os.path.abspath(path), self.base_dir).replace(os.sep, '/')
+
+    def _abs(self, key):
+        return os.path.join(self.base_dir, *key.split('/'))
+
+    def fingerprint(self, source):
+        """(sha256, taille, mtime_ns), en réutilisant le hachage connu si le fichier n'a pas bougé"""
+        stat = os.stat(source)
+        entry = self.entries.get(self._key(source))
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256'], stat.st_size, stat.st_mtime_ns
+        return file_sha256(source), stat.st_size, stat.st_mtime_ns
+
+    def needs_processing(self, source):
+        """Vrai si le fichier est nouveau, modifié ou si une de ses partitions manque"""
+        entry = self.entries.get(self._key(source))
+        if entry is None:
+            return True
+        sha256, _, _ = self.fingerprint(source)
+        if sha256 != entry['sha256']:
+            return True
+        return not all(os.path.exists(self._abs(partition)) for partition in entry['partitions'])
+
+    def plan(self, sources, force=False):
+        """
+        Sépare les sources à transformer des sources inchangées (ces dernières
+        sont ajoutées au rapport comme ignorées). Les sources absentes du disque
+        ne sont jamais planifiées : remove_missing doit être appelé avant pour
+        supprimer leurs partitions.
+        """
+        to_process = []
+        for source in sources:
+            if not os.path.exists(source):
+                if self._key(source) in self.entries:
+                    self._forget(self._key(source))
+            elif force or self.needs_processing(source):
+                to_process.append(source)
+            else:
+                self.report.skipped.append(self._key(source))
+        return to_process
+
+    def record(self, source, partitions):
+        """Enregistre l'empreinte d'une source transformée et les partitions produites"""
+        sha256, size, mtime_ns = self.fingerprint(source)
+        key = self._key(source)
+        self.entries[key] = {
+            'sha256': sha256,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'partitions': [self._key(partition) for partition in partitions],
+            'processed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        self.report.processed.append(key)
+
+    def record_failure(self, source):
+        """
+        Signale une source en erreur. L'entrée précédente et ses partitions sont
+        conservées : elles restent suivies (jamais orphelines) et, l'empreinte
+        enregistrée ne correspondant plus au fichier modifié, la source est
+        retentée au prochain lancement
+        """
+        self.report.failed.append(self._key(source))
+
+    def partitions(self, source):
+        entry = self.entries.get(self._key(source))
+        return [self._abs(partition) for partition in entry['partitions']] if entry else []
+
+    def _forget(self, key):
+        """Retire une source du manifeste et retourne ses partitions (chemins absolus)"""
+        entry = self.entries.pop(key, None)
+        if key not in self.report.removed:
+            self.report.removed.append(key)
+        return [self._abs(partition) for partition in entry['partitions']] if entry else []
+
+    def remove_missing(self, sources):
+        """
+        Oublie les sources qui ne font plus partie de l'entrée ou qui ont été
+        supprimées du disque, et retourne les partitions qu'elles avaient
+        produites (à supprimer par l'appelant)
+        """
+        current = {self._key(source) for source in sources if os.path.exists(source)}
+        orphan_partitions = []
+        for key in [key for key in self.entries if key not in current]:
+            orphan_partitions.extend(self._forget(key))
+        return orphan_partitions
+
+    def mark_rewritten(self, output):
+        self.report.rewritten.append(self._key(output))
+
+    @property
+    def changed(self):
+        return bool(self.report.processed or self.report.removed or self.report.failed)
+
+    def save(self):
+        """Écriture atomique du manifeste"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'sources': self.entries
+            }, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
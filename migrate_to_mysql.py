@@ -1,63 +1,377 @@
+import numpy as np
 import pandas as pd
 import sqlite3
 import mysql.connector
-from sqlalchemy import create_engine, Table, Column, Integer, Float, String, DateTime, MetaData
+from sqlalchemy import create_engine, Table, Column, Integer, Float, String, DateTime, MetaData, Index
 from datetime import datetime
+import argparse
 import os
+import time
 
-def migrate_data():
-    # Connexion à l'ancienne base SQLite
-    sqlite_conn = sqlite3.connect('predictions.db')
+from ingestion_manifest import file_sha256
 
-    # Lire toutes les tables de SQLite
-    tables = pd.read_sql_query(
-        "SELECT name FROM sqlite_master WHERE type='table'", 
-        sqlite_conn
+# Taille des blocs lus dans le CSV et insérés en une transaction
+CHUNK_SIZE = 50000
+# Nombre de lignes par requête INSERT multi-lignes
+INSERT_BATCH_SIZE = 5000
+
+STAGING_SUFFIX = '__staging'
+OLD_SUFFIX = '__old'
+NUMERIC_TYPES = ('DOUBLE', 'FLOAT', 'DECIMAL', 'TINYINT', 'SMALLINT', 'INT', 'BIGINT')
+# Types inférés, du plus étroit au plus large (élargissement quand un bloc ne tient plus)
+INFERRED_TYPE_ORDER = ('TINYINT(1)', 'BIGINT', 'DOUBLE', 'VARCHAR(255)', 'TEXT')
+# Type provisoire d'une colonne encore entièrement vide
+PLACEHOLDER_TYPE = 'VARCHAR(255)'
+
+# Synchronisation incrémentale : dernière date chargée et empreinte de chaque source
+WATERMARK_TABLE = 'migration_watermarks'
+# Les derniers jours déjà chargés sont resynchronisés (corrections tardives)
+OVERLAP_DAYS = 7
+
+# Schéma typé de la table commandes (colonnes après renommage)
+COMMANDES_COLUMNS = {
+    'etablissement': 'VARCHAR(255)',
+    'article': 'VARCHAR(255)',
+    'date_commande': 'DATE',
+    'quantite': 'DOUBLE',
+    'point_livraison': 'VARCHAR(255)',
+    'jour': 'SMALLINT',
+    'mois': 'SMALLINT',
+    'annee': 'SMALLINT'
+}
+# Index créés après le chargement (listes d'établissements/articles, filtres par date)
+COMMANDES_INDEXES = {
+    'ix_commandes_etablissement_article': ('etablissement', 'article'),
+    'ix_commandes_article': ('article',),
+    'ix_commandes_date_commande': ('date_commande',)
+}
+LIVRAISONS_INDEXES = {
+    'ix_livraisons_date_expedition': ('Date expédition',)
+}
+
+SQLITE_SOURCE = 'predictions.db'
+COMMANDES_SOURCE = 'donnees_completes_logistique_formatted.csv'
+LIVRAISONS_SOURCE = 'Planif_Livraisons/Planif livraisons.xlsx'
+PRESENCES_SOURCE = 'Gestion_RH/Total_Presents_Final.xlsx'
+
+COMMANDES_RENAME = {
+    'ETBDES': 'etablissement',
+    'ARTDES': 'article',
+    'DATE': 'date_commande',
+    'QUANTITE': 'quantite',
+    'PTLDES': 'point_livraison',
+    'Jour': 'jour',
+    'Mois': 'mois',
+    'Année': 'annee'
+}
+
+def infer_sql_type(series):
+    """Type MySQL d'une colonne dont le schéma n'est pas déclaré (None si elle est vide)"""
+    if series.isna().all():
+        return None
+    if pd.api.types.is_bool_dtype(series):
+        return 'TINYINT(1)'
+    if pd.api.types.is_integer_dtype(series):
+        return 'BIGINT'
+    if pd.api.types.is_float_dtype(series):
+        return 'DOUBLE'
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'DATETIME'
+    max_length = series.dropna().astype(str).str.len().max()
+    return 'VARCHAR(255)' if pd.isna(max_length) or max_length <= 255 else 'TEXT'
+
+def widen_sql_type(current, inferred):
+    """Plus petit type inféré qui contient les deux types (dates mêlées à autre chose : texte)"""
+    if current is None or current == inferred:
+        return inferred
+    if 'DATETIME' in (current, inferred):
+        return 'TEXT' if 'TEXT' in (current, inferred) else 'VARCHAR(255)'
+    return max(current, inferred, key=INFERRED_TYPE_ORDER.index)
+
+def coerce_chunk(df, columns):
+    """
+    Convertit un bloc vers les types déclarés et retourne des tuples prêts à
+    insérer (NaN/NaT -> NULL, dates au format MySQL)
+    """
+    df = df[list(columns)].copy()
+    for column, sql_type in columns.items():
+        base_type = sql_type.split('(')[0].upper()
+        if base_type in ('DATE', 'DATETIME'):
+            values = pd.to_datetime(df[column], errors='coerce')
+            df[column] = values.dt.strftime('%Y-%m-%d' if base_type == 'DATE' else '%Y-%m-%d %H:%M:%S')
+        elif base_type in NUMERIC_TYPES:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+def quote(name):
+    return f"`{name.replace('`', '``')}`"
+
+def insert_rows(cursor, table_name, columns, rows):
+    """Insère les lignes par requêtes INSERT multi-lignes"""
+    placeholders = ', '.join(['%s'] * len(columns))
+    query = f"INSERT INTO {quote(table_name)} ({', '.join(quote(c) for c in columns)}) VALUES ({placeholders})"
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        # PyMySQL regroupe executemany en INSERT ... VALUES (...), (...), ...
+        cursor.executemany(query, rows[start:start + INSERT_BATCH_SIZE])
+
+def table_exists(cursor, table_name):
+    """Existence exacte de la table (SHOW TABLES LIKE traiterait '_' comme un joker)"""
+    cursor.execute(
+        "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table_name,)
     )
+    return cursor.fetchone() is not None
 
-    # Configuration MySQL
-    mysql_config = {
-        'user': 'mikana_user',
-        'password': 'mikana_password',
-        'host': 'localhost',  # Changez à 'mysql' si vous utilisez Docker
-        'database': 'mikana_db'
-    }
+def swap_tables(cursor, table_name):
+    """Remplace la table par sa version de staging (RENAME TABLE atomique)"""
+    staging, old = table_name + STAGING_SUFFIX, table_name + OLD_SUFFIX
+    cursor.execute(f"DROP TABLE IF EXISTS {quote(old)}")
+    if table_exists(cursor, table_name):
+        cursor.execute(f"RENAME TABLE {quote(table_name)} TO {quote(old)}, {quote(staging)} TO {quote(table_name)}")
+        cursor.execute(f"DROP TABLE {quote(old)}")
+    else:
+        cursor.execute(f"RENAME TABLE {quote(staging)} TO {quote(table_name)}")
 
-    # Création de la connexion SQLAlchemy
-    engine = create_engine(f"mysql+pymysql://{mysql_config['user']}:{mysql_config['password']}@{mysql_config['host']}/{mysql_config['database']}")
+def bulk_load(engine, table_name, chunks, columns=None, indexes=None):
+    """
+    Charge une table complète sans interrompre la lecture de l'ancienne :
+    table de staging typée, blocs insérés en INSERT multi-lignes (un commit
+    par bloc), index créés après le chargement, puis bascule par RENAME.
 
-    # Migration de chaque table
-    for table_name in tables['name']:
-        # Lire les données de SQLite
-        df = pd.read_sql_query(f"SELECT * FROM {table_name}", sqlite_conn)
-        
-        # Écrire dans MySQL
-        df.to_sql(
-            table_name, 
-            engine, 
-            if_exists='replace', 
-            index=False
+    Args:
+        chunks: itérable de DataFrames (colonnes déjà renommées)
+        columns (dict): {colonne: type MySQL}; les colonnes non déclarées
+            sont typées d'après le premier bloc, puis élargies (ALTER TABLE
+            MODIFY) dès qu'un bloc suivant ne tient plus dans leur type
+        indexes (dict): {nom de l'index: colonnes}
+
+    Returns:
+        int: nombre de lignes chargées
+    """
+    staging = table_name + STAGING_SUFFIX
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {quote(staging)}")
+        table_columns = None
+        inferred = {}  # colonnes non déclarées -> type inféré jusqu'ici (None tant qu'elles sont vides)
+        total_rows = 0
+        start = time.perf_counter()
+        for chunk in chunks:
+            if table_columns is None:
+                inferred = {
+                    column: infer_sql_type(chunk[column])
+                    for column in chunk.columns if not (columns or {}).get(column)
+                }
+                table_columns = {
+                    column: (columns or {}).get(column) or inferred[column] or PLACEHOLDER_TYPE
+                    for column in chunk.columns
+                }
+                definition = ', '.join(f"{quote(c)} {t}" for c, t in table_columns.items())
+                cursor.execute(
+                    f"CREATE TABLE {quote(staging)} ({definition}) "
+                    "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci"
+                )
+            else:
+                for column, current in inferred.items():
+                    chunk_type = infer_sql_type(chunk[column])
+                    if chunk_type is None:
+                        continue
+                    widened = widen_sql_type(current, chunk_type)
+                    inferred[column] = widened
+                    if widened != table_columns[column]:
+                        cursor.execute(f"ALTER TABLE {quote(staging)} MODIFY {quote(column)} {widened}")
+                        print(f"   {table_name}: colonne {column} élargie de {table_columns[column]} à {widened}")
+                        table_columns[column] = widened
+            rows = coerce_chunk(chunk, table_columns)
+            insert_rows(cursor, staging, list(table_columns), rows)
+            connection.commit()
+            total_rows += len(rows)
+            elapsed = time.perf_counter() - start
+            print(f"   {table_name}: {total_rows} lignes ({total_rows / max(elapsed, 1e-9):.0f} lignes/s)")
+
+        if table_columns is None:
+            print(f"   {table_name}: aucune donnée, table conservée")
+            return 0
+
+        for name, index_columns in (indexes or {}).items():
+            index_start = time.perf_counter()
+            cursor.execute(
+                f"ALTER TABLE {quote(staging)} ADD INDEX {quote(name)} ({', '.join(quote(c) for c in index_columns)})"
+            )
+            print(f"   Index {name} créé en {time.perf_counter() - index_start:.1f}s")
+
+        swap_tables(cursor, table_name)
+        connection.commit()
+        print(f"   {table_name}: {total_rows} lignes chargées en {time.perf_counter() - start:.1f}s")
+        return total_rows
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+def ensure_watermark_table(cursor):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {quote(WATERMARK_TABLE)} ("
+        "`source` VARCHAR(100) NOT NULL PRIMARY KEY, "
+        "`last_date` DATETIME NULL, "
+        "`fingerprint` CHAR(64) NULL, "
+        "`rows_written` BIGINT NULL, "
+        "`synced_at` DATETIME NOT NULL"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci"
+    )
+
+def read_watermark(cursor, source):
+    cursor.execute(f"SELECT last_date, fingerprint FROM {quote(WATERMARK_TABLE)} WHERE source = %s", (source,))
+    row = cursor.fetchone()
+    return {'last_date': row[0], 'fingerprint': row[1]} if row else None
+
+def write_watermark(cursor, source, last_date, fingerprint, rows_written):
+    cursor.execute(
+        f"INSERT INTO {quote(WATERMARK_TABLE)} (source, last_date, fingerprint, rows_written, synced_at) "
+        "VALUES (%s, %s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE last_date = VALUES(last_date), fingerprint = VALUES(fingerprint), "
+        "rows_written = VALUES(rows_written), synced_at = VALUES(synced_at)",
+        (source, last_date, fingerprint, rows_written, datetime.now())
+    )
+
+def existing_columns(cursor, table_name):
+    """Colonnes et types de la table MySQL existante ({} si elle n'existe pas)"""
+    cursor.execute(
+        "SELECT COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+        (table_name,)
+    )
+    return {name: data_type.upper() for name, data_type in cursor.fetchall()}
+
+def source_date_summary(read_chunks, date_column, numeric_columns):
+    """
+    Nombre de lignes et sommes des colonnes numériques par jour dans la source
+    (lue par blocs) ; colonnes '_rows' puis les colonnes numériques présentes
+    """
+    parts = []
+    for chunk in read_chunks():
+        dates = pd.to_datetime(chunk[date_column], errors='coerce').dt.normalize()
+        values = pd.DataFrame({'_rows': 1}, index=chunk.index)
+        for column in numeric_columns:
+            if column in chunk.columns:
+                values[column] = pd.to_numeric(chunk[column], errors='coerce')
+        parts.append(values.groupby(dates).sum())
+    if not parts:
+        return pd.DataFrame(columns=['_rows'])
+    return pd.concat(parts).groupby(level=0).sum()
+
+def table_date_summary(cursor, table_name, date_column, numeric_columns):
+    """Mêmes agrégats par jour que source_date_summary, calculés par MySQL"""
+    sums = ''.join(f", SUM({quote(column)})" for column in numeric_columns)
+    cursor.execute(
+        f"SELECT DATE({quote(date_column)}), COUNT(*){sums} FROM {quote(table_name)} "
+        f"WHERE {quote(date_column)} IS NOT NULL GROUP BY DATE({quote(date_column)})"
+    )
+    rows = cursor.fetchall()
+    summary = pd.DataFrame([row[1:] for row in rows], columns=['_rows', *numeric_columns],
+                           index=pd.to_datetime([row[0] for row in rows]))
+    return summary.astype(float)
+
+def earliest_changed_date(source, table):
+    """Premier jour dont le nombre de lignes ou une somme diffère entre la source et la table (None si aucun)"""
+    dates = source.index.union(table.index)
+    source = source.reindex(dates).fillna(0).astype(float)
+    table = table.reindex(index=dates, columns=source.columns).fillna(0).astype(float)
+    changed = ~np.isclose(source.to_numpy(), table.to_numpy(), rtol=1e-9, atol=1e-6).all(axis=1)
+    return dates[changed].min() if changed.any() else None
+
+def sync_table(engine, table_name, source_path, read_chunks, date_column=None, columns=None, indexes=None, full=False):
+    """
+    Synchronise une table avec son fichier source :
+    - source inchangée (même empreinte SHA-256 que la dernière fois) : aucune écriture
+    - premier passage, --full ou source sans colonne date : rechargement complet (bulk_load)
+    - sinon seules les lignes datées à partir de la dernière date chargée moins
+      OVERLAP_DAYS sont supprimées puis réinsérées, dans une seule transaction ;
+      la fenêtre remonte au premier jour dont le nombre de lignes ou les sommes
+      des colonnes numériques diffèrent entre la source et la table (mois
+      ancien corrigé ou rechargé)
+
+    Args:
+        read_chunks: fonction retournant un nouvel itérable de DataFrames
+
+    Returns:
+        int: nombre de lignes écrites
+    """
+    fingerprint = file_sha256(source_path)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        ensure_watermark_table(cursor)
+        watermark = read_watermark(cursor, table_name)
+        table = existing_columns(cursor, table_name)
+        connection.commit()
+
+        if not full and table and watermark and watermark['fingerprint'] == fingerprint:
+            print(f"   {table_name}: source inchangée, aucune écriture")
+            return 0
+
+        if full or not table or not date_column or date_column not in table or not watermark or watermark['last_date'] is None:
+            rows_written = bulk_load(engine, table_name, read_chunks(), columns, indexes)
+            last_date = None
+            if date_column:
+                cursor.execute(f"SELECT MAX({quote(date_column)}) FROM {quote(table_name)}")
+                last_date = cursor.fetchone()[0]
+            write_watermark(cursor, table_name, last_date, fingerprint, rows_written)
+            connection.commit()
+            return rows_written
+
+        # Lignes de la fenêtre [dernière date - OVERLAP_DAYS, ...] relues depuis la source
+        start = time.perf_counter()
+        last_date = pd.Timestamp(watermark['last_date'])
+        window_start = last_date.normalize() - pd.Timedelta(days=OVERLAP_DAYS)
+        numeric_columns = [column for column, data_type in table.items()
+                           if data_type in NUMERIC_TYPES and column != date_column]
+        source_summary = source_date_summary(read_chunks, date_column, numeric_columns)
+        changed_since = earliest_changed_date(
+            source_summary,
+            table_date_summary(cursor, table_name, date_column, list(source_summary.columns[1:]))
         )
-    sqlite_conn.close()
+        if changed_since is not None and changed_since < window_start:
+            print(f"   {table_name}: lignes modifiées depuis le {changed_since:%Y-%m-%d}, fenêtre élargie")
+            window_start = changed_since
+        load_columns = None
+        delta = []
+        for chunk in read_chunks():
+            if load_columns is None:
+                load_columns = {column: sql_type for column, sql_type in table.items() if column in chunk.columns}
+            dates = pd.to_datetime(chunk[date_column], errors='coerce')
+            in_window = dates >= window_start
+            if in_window.any():
+                delta.extend(coerce_chunk(chunk[in_window], load_columns))
+                last_date = max(last_date, dates[in_window].max())
 
-    # Migration des commandes
-    print("Migration des commandes...")
-    df_commandes = pd.read_csv('donnees_completes_logistique_formatted.csv', low_memory=False)
-    df_commandes.rename(columns={
-        'ETBDES': 'etablissement',
-        'ARTDES': 'article',
-        'DATE': 'date_commande',
-        'QUANTITE': 'quantite',
-        'PTLDES': 'point_livraison',
-        'Jour': 'jour',
-        'Mois': 'mois',
-        'Année': 'annee'
-    }, inplace=True)
-    df_commandes.to_sql('commandes', engine, if_exists='replace', index=False)
+        cursor.execute(f"DELETE FROM {quote(table_name)} WHERE {quote(date_column)} >= %s", (window_start.to_pydatetime(),))
+        deleted = cursor.rowcount
+        if delta:
+            insert_rows(cursor, table_name, list(load_columns), delta)
+        write_watermark(cursor, table_name, last_date.to_pydatetime(), fingerprint, len(delta))
+        connection.commit()
+        print(
+            f"   {table_name}: fenêtre depuis le {window_start:%Y-%m-%d}, {deleted} lignes remplacées "
+            f"par {len(delta)} en {time.perf_counter() - start:.1f}s (jusqu'au {last_date:%Y-%m-%d})"
+        )
+        return len(delta)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
 
-    # Migration des livraisons
-    print("Migration des livraisons...")
-    df_livraisons = pd.read_excel('Planif_Livraisons/Planif livraisons.xlsx')
+def read_commandes():
+    """Commandes lues par blocs depuis le CSV (jamais chargé en entier en mémoire)"""
+    for chunk in pd.read_csv(COMMANDES_SOURCE, low_memory=False, chunksize=CHUNK_SIZE):
+        yield chunk.rename(columns=COMMANDES_RENAME)
+
+def read_livraisons():
+    df_livraisons = pd.read_excel(LIVRAISONS_SOURCE)
     df_livraisons.rename(columns={
         'Année': 'annee',
         'Client': 'client',
@@ -66,12 +380,11 @@ def migrate_data():
         'Poids (kg)': 'poids_kg',
         'Qté': 'quantite'
     }, inplace=True)
-    df_livraisons.to_sql('livraisons', engine, if_exists='replace', index=False)
+    return [df_livraisons]
 
-    # Migration des présences
-    print("Migration des présences RH...")
+def read_presences():
     # Lire directement le fichier qui contient toutes les années
-    df_presences = pd.read_excel('Gestion_RH/Total_Presents_Final.xlsx')
+    df_presences = pd.read_excel(PRESENCES_SOURCE)
     
     # Ajouter une colonne année si elle n'existe pas déjà
     if 'annee' not in df_presences.columns:
@@ -91,10 +404,53 @@ def migrate_data():
     
     print("Données des présences avant import:", df_presences.head())
     print("Types de données:", df_presences.dtypes)
-    
+    return [df_presences]
+
+def migrate_data(full=False):
+    # Connexion à l'ancienne base SQLite
+    sqlite_conn = sqlite3.connect(SQLITE_SOURCE)
+
+    # Lire toutes les tables de SQLite
+    tables = pd.read_sql_query(
+        "SELECT name FROM sqlite_master WHERE type='table'", 
+        sqlite_conn
+    )
+
+    # Configuration MySQL
+    mysql_config = {
+        'user': 'mikana_user',
+        'password': 'mikana_password',
+        'host': 'localhost',  # Changez à 'mysql' si vous utilisez Docker
+        'database': 'mikana_db'
+    }
+
+    # Création de la connexion SQLAlchemy
+    engine = create_engine(f"mysql+pymysql://{mysql_config['user']}:{mysql_config['password']}@{mysql_config['host']}/{mysql_config['database']}")
+
+    # Migration de chaque table (rechargée seulement si predictions.db a changé)
+    for table_name in tables['name']:
+        # Lire les données de SQLite
+        read_table = lambda table_name=table_name: [pd.read_sql_query(f"SELECT * FROM {table_name}", sqlite_conn)]
+        
+        # Écrire dans MySQL
+        sync_table(engine, table_name, SQLITE_SOURCE, read_table, full=full)
+    sqlite_conn.close()
+
+    # Migration des commandes
+    print("Migration des commandes...")
+    sync_table(engine, 'commandes', COMMANDES_SOURCE, read_commandes, 'date_commande',
+               COMMANDES_COLUMNS, COMMANDES_INDEXES, full=full)
+
+    # Migration des livraisons
+    print("Migration des livraisons...")
+    sync_table(engine, 'livraisons', LIVRAISONS_SOURCE, read_livraisons, 'Date expédition',
+               indexes=LIVRAISONS_INDEXES, full=full)
+
+    # Migration des présences
+    print("Migration des présences RH...")
     # Import dans MySQL
     try:
-        df_presences.to_sql('presences', engine, if_exists='replace', index=False)
+        sync_table(engine, 'presences', PRESENCES_SOURCE, read_presences, full=full)
         print("Import des présences réussi!")
     except Exception as e:
         print(f"Erreur lors de l'import des présences: {str(e)}")
@@ -111,7 +467,9 @@ def migrate_data():
             Column('mae', Float),
             Column('rmse', Float),
             Column('training_date', DateTime, default=datetime.utcnow),
-            Column('additional_info', String(500))  # Pour stocker des informations supplémentaires si nécessaire
+            Column('additional_info', String(500)),  # Pour stocker des informations supplémentaires si nécessaire
+            Index('ix_metrics_history_model_date', 'model_name', 'training_date'),
+            Index('ix_metrics_history_training_date', 'training_date')
         )
 
         # Créer la table dans la base de données
@@ -123,4 +481,8 @@ def migrate_data():
     print("Migration terminée !")
 
 if __name__ == "__main__":
-    migrate_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Migration des données vers MySQL")
+    parser.add_argument('--full', action='store_true',
+                        help="Recharger toutes les tables au lieu de la synchronisation incrémentale")
+    args = parser.parse_args()
+    migrate_data(full=args.full)
\ No newline at end of file
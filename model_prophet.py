@@ -2,10 +2,24 @@ import pandas as pd
 import numpy as np
 from prophet import Prophet
 import logging
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 
+@contextmanager
+def mesurer_etape(durees, etape):
+    """Mesure la durée d'une étape de prédiction ; sans effet si durees vaut None"""
+    if durees is None:
+        yield
+        return
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        durees[etape] = time.perf_counter() - debut
+
 class PredicteurTemporel:
     def __init__(self, chemin_donnees='donnees_completes_logistique_formatted.csv'):
         """Initialise le prédicteur avec Prophet"""
@@ -81,8 +95,12 @@ class PredicteurTemporel:
             self.logger.error(f"❌ Erreur lors de l'entraînement: {str(e)}")
             raise e
 
-    def predire(self, dates_prediction, etablissement=None, article=None):
-        """Prédit les quantités pour des dates futures"""
+    def predire(self, dates_prediction, etablissement=None, article=None, durees=None):
+        """
+        Prédit les quantités pour des dates futures.
+        Si durees est un dict, il reçoit la durée en secondes de chaque étape
+        (filtrage, entrainement, prediction, serialisation).
+        """
         try:
             # Conversion en DatetimeIndex si nécessaire
             if isinstance(dates_prediction, (str, pd.Timestamp)):
@@ -95,17 +113,18 @@ class PredicteurTemporel:
             dates_prediction = pd.DatetimeIndex(dates_prediction)
 
             # Filtrage des données
-            df_filtered = self.df_historique.copy()
-            
-            if etablissement:
-                df_filtered = df_filtered[df_filtered['ETBDES'] == etablissement]
-            if article:
-                df_filtered = df_filtered[df_filtered['ARTDES'] == article]
+            with mesurer_etape(durees, 'filtrage'):
+                df_filtered = self.df_historique.copy()
+                
+                if etablissement:
+                    df_filtered = df_filtered[df_filtered['ETBDES'] == etablissement]
+                if article:
+                    df_filtered = df_filtered[df_filtered['ARTDES'] == article]
 
-            # Calculer les statistiques de base
-            moyenne = df_filtered['QUANTITE'].mean() if not df_filtered.empty else 100
-            min_historique = df_filtered['QUANTITE'].min() if not df_filtered.empty else 10
-            max_historique = df_filtered['QUANTITE'].max() if not df_filtered.empty else 200
+                # Calculer les statistiques de base
+                moyenne = df_filtered['QUANTITE'].mean() if not df_filtered.empty else 100
+                min_historique = df_filtered['QUANTITE'].min() if not df_filtered.empty else 10
+                max_historique = df_filtered['QUANTITE'].max() if not df_filtered.empty else 200
             
             # Si pas assez de données ou moyenne trop faible
             if len(df_filtered) < 2:
@@ -146,7 +165,8 @@ class PredicteurTemporel:
             # Création ou récupération du modèle
             model_key = f"{etablissement}_{article}"
             if model_key not in self.models:
-                self.entrainer_modele(etablissement, article)
+                with mesurer_etape(durees, 'entrainement'):
+                    self.entrainer_modele(etablissement, article)
             
             model = self.models[model_key]
             
@@ -154,9 +174,11 @@ class PredicteurTemporel:
             future_dates = pd.DataFrame({'ds': dates_prediction})
             
             # Prédiction
-            forecast = model.predict(future_dates)
+            with mesurer_etape(durees, 'prediction'):
+                forecast = model.predict(future_dates)
             
             # S'assurer que nous avons une prédiction pour chaque date
+            debut_serialisation = time.perf_counter()
             resultats = []
             for date in dates_prediction:
                 forecast_row = forecast[forecast['ds'] == date].iloc[0]
@@ -183,6 +205,8 @@ class PredicteurTemporel:
                 }
                 resultats.append(resultat)
             
+            if durees is not None:
+                durees['serialisation'] = time.perf_counter() - debut_serialisation
             return resultats
             
         except Exception as e:
@@ -0,0 +1,252 @@
+"""
+Stockage versionné des artefacts de modèles.
+
+Chaque entraînement écrit ses fichiers dans un nouveau dossier
+<dossier du modèle>/versions/<version>/, puis remplace atomiquement (os.replace)
+le fichier pointeur CURRENT. Un lecteur voit donc soit l'ancienne version
+complète, soit la nouvelle, jamais un fichier à moitié écrit.
+
+Les services surveillent ce pointeur (ArtifactWatcher) : la nouvelle version
+est chargée en arrière-plan dans chaque processus, puis substituée à l'ancienne
+en une seule affectation, sans redémarrage. Seules les versions publiées sont
+rechargées à chaud : les fichiers historiques d'un dossier non versionné
+peuvent être lus en cours d'écriture et ne sont chargés qu'au démarrage.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime
+
+import joblib
+
+VERSIONS_DIRNAME = 'versions'
+POINTER_FILENAME = 'CURRENT'
+METADATA_FILENAME = 'metadata.json'
+LEGACY_PREFIX = 'legacy:'
+DEFAULT_KEEP_VERSIONS = 3
+
+logger = logging.getLogger(__name__)
+
+def _fsync_file(path):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+def _fsync_dir(path):
+    """Rend durable un renommage dans le dossier (sans objet sous Windows)"""
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def current_version(model_dir):
+    """Version pointée par CURRENT, ou None si le dossier n'est pas encore versionné"""
+    try:
+        with open(os.path.join(model_dir, POINTER_FILENAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def artifact_path(model_dir, filename, version=None):
+    """
+    Chemin d'un artefact dans la version donnée (par défaut la version courante).
+    Sans version publiée, retourne le fichier historique à la racine du dossier.
+    """
+    if version is None:
+        version = current_version(model_dir)
+    if version is None or version.startswith(LEGACY_PREFIX):
+        return os.path.join(model_dir, filename)
+    return os.path.join(model_dir, VERSIONS_DIRNAME, version, filename)
+
+def file_fingerprint(paths, optional_paths=()):
+    """Empreinte mtime/taille d'une liste de fichiers (les fichiers optionnels absents sont ignorés)"""
+    parts = []
+    for path in paths:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Le fichier n'existe pas: {path}")
+        stat = os.stat(path)
+        parts.append(f"{stat.st_mtime_ns}-{stat.st_size}")
+    for path in optional_paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            parts.append(f"{stat.st_mtime_ns}-{stat.st_size}")
+    return LEGACY_PREFIX + ":".join(parts)
+
+def artifact_fingerprint(model_dir, filenames, optional_filenames=()):
+    """
+    Identifiant de la version à servir : le contenu de CURRENT, ou pour un
+    dossier non versionné un identifiant fixe des fichiers historiques. Ces
+    fichiers ne sont pas écrits atomiquement : leur mtime/taille n'est pas
+    suivi, seule la publication d'une version déclenche un rechargement.
+    """
+    version = current_version(model_dir)
+    if version is not None:
+        return version
+    for name in filenames:
+        path = os.path.join(model_dir, name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Le fichier n'existe pas: {path}")
+    return LEGACY_PREFIX + 'historique'
+
+def _write_pointer(model_dir, version):
+    tmp_path = os.path.join(model_dir, f".{POINTER_FILENAME}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(model_dir, POINTER_FILENAME))
+    _fsync_dir(model_dir)
+
+def list_versions(model_dir):
+    """Versions publiées, de la plus ancienne à la plus récente"""
+    versions_dir = os.path.join(model_dir, VERSIONS_DIRNAME)
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(versions_dir)
+        if not name.startswith('.') and os.path.isdir(os.path.join(versions_dir, name))
+    )
+
+def prune_versions(model_dir, keep=DEFAULT_KEEP_VERSIONS):
+    """
+    Supprime les anciennes versions en gardant les `keep` plus récentes, la
+    version courante et celle qui la précède : un lecteur qui vient de lire
+    l'ancien CURRENT peut encore être en train d'en ouvrir les fichiers
+    """
+    current = current_version(model_dir)
+    versions = list_versions(model_dir)
+    protected = {current}
+    if current in versions and versions.index(current) > 0:
+        protected.add(versions[versions.index(current) - 1])
+    removed = []
+    for version in versions[:-keep] if keep > 0 else versions:
+        if version in protected:
+            continue
+        shutil.rmtree(os.path.join(model_dir, VERSIONS_DIRNAME, version), ignore_errors=True)
+        removed.append(version)
+    return removed
+
+def publish_version(model_dir, artifacts, metadata=None, keep=DEFAULT_KEEP_VERSIONS):
+    """
+    Publie une nouvelle version : les artefacts ({nom de fichier: objet}) sont
+    écrits avec joblib dans un dossier temporaire, renommé en versions/<version>,
+    puis CURRENT est basculé vers cette version.
+
+    Returns:
+        str: identifiant de la version publiée
+    """
+    versions_dir = os.path.join(model_dir, VERSIONS_DIRNAME)
+    os.makedirs(versions_dir, exist_ok=True)
+    version = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{uuid.uuid4().hex[:4]}"
+    staging_dir = os.path.join(versions_dir, f".{version}.tmp")
+    os.makedirs(staging_dir)
+    try:
+        for filename, obj in artifacts.items():
+            path = os.path.join(staging_dir, filename)
+            joblib.dump(obj, path)
+            _fsync_file(path)
+        with open(os.path.join(staging_dir, METADATA_FILENAME), 'w') as f:
+            json.dump({
+                'version': version,
+                'published_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'files': sorted(artifacts),
+                **(metadata or {})
+            }, f, indent=4, default=str)
+        os.rename(staging_dir, os.path.join(versions_dir, version))
+        _fsync_dir(versions_dir)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    _write_pointer(model_dir, version)
+    prune_versions(model_dir, keep)
+    return version
+
+class ArtifactWatcher:
+    """
+    Garde en mémoire l'objet chargé depuis la version courante d'un artefact.
+
+    Le premier accès charge la version de façon synchrone et démarre un thread
+    de surveillance. Quand l'empreinte change (nouveau CURRENT), la nouvelle version est chargée en arrière-plan puis
+    substituée en une seule affectation ; les requêtes continuent d'être servies
+    par l'ancienne version pendant le chargement. En cas d'échec, la version en
+    service est conservée.
+    """
+    def __init__(self, name, fingerprint, loader, interval=2.0):
+        self.name = name
+        self.fingerprint = fingerprint
+        self.loader = loader
+        self.interval = interval
+        self._current = None  # (version, objet chargé)
+        self._failed_version = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def version(self):
+        current = self._current
+        return current[0] if current is not None else None
+
+    def peek(self):
+        """Objet chargé de la version en service, ou None s'il n'est pas encore chargé"""
+        current = self._current
+        return current[1] if current is not None else None
+
+    def get(self):
+        """Objet chargé de la version en service"""
+        current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    version = self.fingerprint()
+                    self._current = (version, self.loader(version))
+                    logger.info(f"{self.name} chargé (version {version})")
+                current = self._current
+            self.start()
+        return current[1]
+
+    def check(self):
+        """Charge et bascule vers la nouvelle version si l'empreinte a changé"""
+        with self._lock:
+            version = self.fingerprint()
+            if self._current is not None and version in (self._current[0], self._failed_version):
+                return False
+            try:
+                value = self.loader(version)
+            except Exception as e:
+                if self._current is None:
+                    raise
+                # Une version illisible n'est signalée qu'une fois, jusqu'à la suivante
+                self._failed_version = version
+                logger.warning(f"Rechargement de {self.name} impossible, version {self._current[0]} conservée: {str(e)}")
+                return False
+            self._current = (version, value)
+            self._failed_version = None
+        logger.info(f"{self.name} rechargé (version {version})")
+        return True
+
+    def start(self):
+        """Démarre le thread de surveillance (une seule fois par processus)"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._watch, name=f"watch-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(f"Surveillance de {self.name} : {str(e)}")
@@ -0,0 +1,98 @@
+"""
+Exécution de tâches longues, une par processus, avec un délai par tâche.
+
+Chaque tâche tourne dans son propre processus (au plus n_jobs à la fois) et
+envoie un unique dict de résultat par un pipe. Sous POSIX, chaque processus
+est chef de son propre groupe : une tâche qui dépasse le délai est arrêtée
+avec tout ce qu'elle a lancé (par exemple le binaire cmdstan de Prophet, qui
+sinon continuerait de tourner une fois le processus Python tué).
+"""
+import multiprocessing as mp
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+
+def _run_in_group(target, conn, args):
+    """Point d'entrée du processus : nouveau groupe, puis la tâche"""
+    if hasattr(os, 'setpgid'):
+        os.setpgid(0, 0)
+    target(conn, *args)
+
+def _kill(process):
+    """
+    Arrête le processus et son groupe. Un identifiant de groupe n'est pas
+    réattribué tant qu'un membre du groupe vit encore
+    """
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    if process.is_alive():
+        process.terminate()
+
+def run_process_tasks(tasks, target, n_jobs=None, timeout=None, on_result=None):
+    """
+    Exécute `target(conn, *args)` pour chaque tâche ; la cible envoie un dict
+    de résultat avec conn.send puis se termine
+
+    Args:
+        tasks (list): [(clé, args)]
+        timeout (float): délai par tâche en secondes (None : pas de délai)
+        on_result: appelé avec (clé, résultat) dès qu'une tâche se termine
+
+    Returns:
+        list: [(clé, résultat)] dans l'ordre de fin ; une tâche arrêtée a le
+        statut 'timeout', un processus mort sans résultat le statut 'error'
+    """
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(tasks)))
+    pending = list(tasks)
+    running = {}  # connexion -> (processus, clé, début)
+    results = []
+
+    def record(key, result):
+        results.append((key, result))
+        if on_result is not None:
+            on_result(key, result)
+
+    while pending or running:
+        while pending and len(running) < n_jobs:
+            key, args = pending.pop(0)
+            parent_conn, child_conn = mp.Pipe(duplex=False)
+            process = mp.Process(target=_run_in_group, args=(target, child_conn, args), daemon=True)
+            process.start()
+            if hasattr(os, 'setpgid'):
+                # Aussi côté parent : le groupe existe avant tout killpg
+                try:
+                    os.setpgid(process.pid, process.pid)
+                except OSError:
+                    pass
+            child_conn.close()
+            running[parent_conn] = (process, key, time.perf_counter())
+
+        for conn in wait(list(running), timeout=0.5):
+            process, key, started = running.pop(conn)
+            try:
+                result = conn.recv()
+            except EOFError:
+                # Processus mort sans résultat : ses éventuels sous-processus sont arrêtés
+                process.join(1)
+                exitcode = process.exitcode
+                _kill(process)
+                result = {'status': 'error', 'error': f"processus arrêté (code {exitcode})",
+                          'fit_seconds': time.perf_counter() - started}
+            conn.close()
+            process.join()
+            record(key, result)
+
+        now = time.perf_counter()
+        for conn, (process, key, started) in list(running.items()):
+            if timeout is not None and now - started > timeout:
+                _kill(process)
+                process.join()
+                conn.close()
+                del running[conn]
+                record(key, {'status': 'timeout', 'error': f"délai de {timeout}s dépassé",
+                             'fit_seconds': now - started})
+    return results
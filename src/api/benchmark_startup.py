@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Mesure le démarrage du service de prédiction :
+- temps d'import du module (interpréteur neuf à chaque essai)
+- délai avant la première réponse de /healthz puis avant la fin du préchauffage
+- latence de la première et de la deuxième requête sur quelques endpoints
+
+À lancer depuis la racine du dépôt :
+    python -m src.api.benchmark_startup [--no-warmup] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODULE = "src.api.prediction_service"
+
+# Endpoints sans écriture en base : (méthode, chemin, paramètres de requête, corps JSON)
+# Chaque sonde doit répondre en 2xx : une erreur mesurerait le chemin d'erreur, pas l'endpoint
+PROBES = [
+    ("POST", "/api/predict-sarima", None, {"weeks": 30}),
+    ("GET", "/api/historical-data", {"month": 1, "day": 15}, None),
+    ("POST", "/api/predict-delivery/batch", None,
+     {"lines": [{"date": "2025-01-31", "article": "DRAP", "quantity": 100}], "save_history": False}),
+]
+
+def measure_import(repeat):
+    """Temps d'import du module dans un interpréteur neuf (secondes)"""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {MODULE}; print(time.perf_counter() - start)"
+    )
+    durations = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], cwd=BASE_DIR, capture_output=True,
+                                text=True, env={**os.environ, "MODEL_WATCH_INTERVAL": "0"})
+        if output.returncode != 0:
+            raise RuntimeError(f"Import impossible : {output.stderr.strip().splitlines()[-1:]}")
+        durations.append(float(output.stdout.strip().splitlines()[-1]))
+    return durations
+
+def request(base_url, method, path, body=None, timeout=120, params=None):
+    """(code HTTP, durée en secondes) ; code None si le serveur ne répond pas"""
+    data = json.dumps(body).encode() if body is not None else None
+    url = base_url + path + (f"?{urllib.parse.urlencode(params)}" if params else "")
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        status = None
+    return status, time.perf_counter() - start
+
+def wait_for(base_url, path, expected, deadline, started):
+    """Délai (depuis le lancement) avant que `path` réponde avec le code attendu"""
+    while time.perf_counter() < deadline:
+        status, _ = request(base_url, "GET", path, timeout=2)
+        if status in expected:
+            return time.perf_counter() - started
+        time.sleep(0.05)
+    return None
+
+def wait_for_warmup(base_url, deadline, started):
+    """
+    Délai avant la fin du préchauffage (plus aucun sous-système en attente ou
+    en cours de chargement) et état de /readyz à ce moment
+    """
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/healthz", timeout=2) as response:
+                health = json.loads(response.read())
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            health = None
+        if health and all(s["state"] in ("ready", "failed") for s in health["subsystems"].values()):
+            return time.perf_counter() - started, health["ready"]
+        time.sleep(0.05)
+    return None, False
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def measure_server(warmup, timeout):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "WARMUP_ON_STARTUP": "1" if warmup else "0"}
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{MODULE}:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BASE_DIR, env=env
+    )
+    results = {}
+    try:
+        deadline = started + timeout
+        results["healthz_s"] = wait_for(base_url, "/healthz", {200}, deadline, started)
+        if warmup:
+            results["warmup_s"], results["ready"] = wait_for_warmup(base_url, deadline, started)
+
+        for method, path, params, body in PROBES:
+            first_status, first = request(base_url, method, path, body, params=params)
+            second_status, second = request(base_url, method, path, body, params=params)
+            results[path] = {"status": first_status, "second_status": second_status,
+                             "first_ms": first * 1e3, "second_ms": second * 1e3}
+
+        with urllib.request.urlopen(base_url + "/healthz", timeout=5) as response:
+            results["subsystems"] = json.loads(response.read())["subsystems"]
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage du service de prédiction")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre d'imports mesurés")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Désactive le préchauffage : les sous-systèmes sont chargés par la première requête")
+    parser.add_argument("--timeout", type=float, default=600, help="Attente maximale du démarrage (secondes)")
+    parser.add_argument("--output", help="Écrit les résultats en JSON dans ce fichier")
+    args = parser.parse_args()
+
+    imports = measure_import(args.repeat)
+    server = measure_server(not args.no_warmup, args.timeout)
+
+    print(f"\n=== Démarrage de {MODULE} ({'sans' if args.no_warmup else 'avec'} préchauffage) ===")
+    print(f"Import du module     : {min(imports):.3f}s (min) / {sum(imports) / len(imports):.3f}s (moyenne)")
+    for key, label in (("healthz_s", "Première réponse    "), ("warmup_s", "Fin du préchauffage ")):
+        if key in server:
+            value = server[key]
+            print(f"{label} : {f'{value:.3f}s' if value is not None else 'délai dépassé'}")
+    if "ready" in server:
+        print(f"/readyz              : {'200 (prêt)' if server['ready'] else '503 (sous-système requis indisponible)'}")
+    print(f"\n{'endpoint':<32}{'statut':>8}{'1re (ms)':>12}{'2e (ms)':>12}")
+    for _, path, _, _ in PROBES:
+        probe = server[path]
+        print(f"{path:<32}{str(probe['status']):>8}{probe['first_ms']:>12.1f}{probe['second_ms']:>12.1f}")
+    print("\nSous-systèmes :")
+    for name, state in server.get("subsystems", {}).items():
+        duration = f"{state['init_seconds']:.3f}s" if state["init_seconds"] is not None else "-"
+        print(f"   {name:<20}{state['state']:<10}{duration:>10}  {state['error'] or ''}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"import_s": imports, **server}, f, indent=4)
+
+    failed = [
+        f"{path} ({server[path]['status']}, {server[path]['second_status']})"
+        for _, path, _, _ in PROBES
+        if not all(status is not None and 200 <= status < 300
+                   for status in (server[path]["status"], server[path]["second_status"]))
+    ]
+    if failed:
+        sys.exit(f"\nSondes sans réponse 2xx, mesures non significatives : {', '.join(failed)}")
+
+if __name__ == "__main__":
+    main()
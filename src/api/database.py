@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, JSON, Numeric
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Float, DateTime, JSON, Numeric
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -50,9 +50,33 @@ class PredictionHistory(Base):
             "recommendation": self.recommendation
         }
 
+# Index de metrics_history : dernière métrique par modèle et historique trié par date
+METRICS_HISTORY_INDEXES = {
+    "ix_metrics_history_model_date": ("model_name", "training_date"),
+    "ix_metrics_history_training_date": ("training_date",),
+}
+
 def init_db():
     Base.metadata.create_all(bind=engine)
 
+def migrate_metrics_history_indexes(bind=engine):
+    """
+    Crée les index manquants de metrics_history (migration idempotente,
+    sans effet si les index existent déjà). Retourne les index créés.
+    """
+    inspector = inspect(bind)
+    if not inspector.has_table("metrics_history"):
+        return []
+    existing = {index["name"] for index in inspector.get_indexes("metrics_history")}
+    created = []
+    with bind.begin() as connection:
+        for name, columns in METRICS_HISTORY_INDEXES.items():
+            if name in existing:
+                continue
+            connection.execute(text(f"CREATE INDEX {name} ON metrics_history ({', '.join(columns)})"))
+            created.append(name)
+    return created
+
 def get_db():
     db = SessionLocal()
     try:
@@ -62,4 +86,5 @@ def get_db():
 
 # Initialisation de la base si c'est le fichier principal
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    init_db()
+    print(f"Index créés sur metrics_history : {migrate_metrics_history_indexes() or 'aucun'}")
\ No newline at end of file
@@ -0,0 +1,404 @@
+import json
+import logging
+import os
+import signal
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# États possibles d'un job d'entraînement
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+class JobCancelError(RuntimeError):
+    """Le job est exécuté par un autre processus vivant, que ce processus ne peut pas arrêter"""
+
+class JobSpec:
+    """
+    Description d'un entraînement : commande à lancer, dossier de travail,
+    jalons de progression repérés dans la sortie du script et traitement final
+    """
+    def __init__(self, module: str, command: List[str], cwd: Path,
+                 progress_markers: Optional[List[tuple]] = None,
+                 on_success: Optional[Callable[[], Optional[str]]] = None):
+        self.module = module
+        self.command = command
+        self.cwd = cwd
+        self.progress_markers = progress_markers or []
+        self.on_success = on_success
+
+class TrainingJobManager:
+    """
+    File d'exécution des entraînements en arrière-plan.
+
+    - pool de workers borné, un seul job actif par module (même entre processus,
+      grâce à la transaction SQLite lors de la soumission) ;
+    - suivi de l'état et de la progression, annulation du sous-processus ;
+    - historique persistant dans une base SQLite qui survit aux redémarrages.
+
+    on_finish(module, status, duration) est appelé à la fin de chaque job
+    exécuté par ce processus (durée en secondes depuis le démarrage effectif).
+    """
+    def __init__(self, db_path: Path, max_workers: int = 2, log_tail_lines: int = 20,
+                 on_finish: Optional[Callable[[str, str, float], None]] = None):
+        self.db_path = str(db_path)
+        self.log_tail_lines = log_tail_lines
+        self.on_finish = on_finish
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="training-job")
+        self._module_locks: Dict[str, threading.Lock] = {}
+        self._processes: Dict[str, subprocess.Popen] = {}
+        self._started: Dict[str, tuple] = {}
+        self._cancel_requested = set()
+        self._lock = threading.Lock()
+        self._init_db()
+        self._recover_orphans()
+
+    # ------------------- Stockage SQLite -------------------
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def _init_db(self):
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS training_jobs (
+                    id TEXT PRIMARY KEY,
+                    module TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT,
+                    log_tail TEXT,
+                    error TEXT,
+                    return_code INTEGER,
+                    owner_pid INTEGER,
+                    owner_started TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            """)
+            # Bases créées avant la colonne owner_started
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(training_jobs)")}
+            if "owner_started" not in columns:
+                connection.execute("ALTER TABLE training_jobs ADD COLUMN owner_started TEXT")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_training_jobs_module_status ON training_jobs (module, status)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_training_jobs_created_at ON training_jobs (created_at)"
+            )
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{key} = :{key}" for key in fields)
+        with self._connect() as connection:
+            connection.execute(f"UPDATE training_jobs SET {assignments} WHERE id = :id", {**fields, "id": job_id})
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job = dict(row)
+        job["log_tail"] = json.loads(job["log_tail"]) if job["log_tail"] else []
+        return job
+
+    def _recover_orphans(self):
+        """
+        Les jobs actifs d'un processus disparu (redémarrage) sont marqués interrompus.
+
+        Le PID seul ne suffit pas : après un redémarrage, le nouveau processus
+        reprend souvent le même PID (PID 1 en conteneur). Un job n'est conservé
+        que si son propriétaire est un autre processus vivant dont l'heure de
+        démarrage est celle enregistrée avec le job.
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id, owner_pid, owner_started FROM training_jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchall()
+        for row in rows:
+            if _owner_alive(row["owner_pid"], row["owner_started"]):
+                continue
+            logging.warning(f"Job d'entraînement {row['id']} interrompu par un redémarrage")
+            self._update(row["id"], status=INTERRUPTED, finished_at=_now(),
+                         message="Interrompu par un redémarrage du service")
+
+    # ------------------- API publique -------------------
+    def submit(self, spec: JobSpec) -> dict:
+        """
+        Enregistre un job et le confie au pool. Si un job est déjà actif pour
+        ce module, il est retourné tel quel au lieu d'en lancer un second.
+        """
+        job_id = uuid.uuid4().hex
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            active = connection.execute(
+                "SELECT * FROM training_jobs WHERE module = ? AND status IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+                (spec.module, *ACTIVE_STATUSES)
+            ).fetchone()
+            if active is not None:
+                connection.execute("COMMIT")
+                return {**self._to_dict(active), "already_active": True}
+
+            connection.execute(
+                """
+                INSERT INTO training_jobs (id, module, status, progress, message, owner_pid, owner_started, created_at)
+                VALUES (?, ?, ?, 0, ?, ?, ?, ?)
+                """,
+                (job_id, spec.module, QUEUED, "En attente d'un worker", os.getpid(), _OWNER_STARTED, _now())
+            )
+            connection.execute("COMMIT")
+
+        self._executor.submit(self._run, job_id, spec)
+        return {**self.get(job_id), "already_active": False}
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM training_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def list(self, module: Optional[str] = None, limit: int = 50) -> List[dict]:
+        query = "SELECT * FROM training_jobs"
+        params: list = []
+        if module:
+            query += " WHERE module = ?"
+            params.append(module)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as connection:
+            rows = connection.execute(query, params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        Annule un job en attente, ou arrête le sous-processus d'un job en cours.
+
+        Raises:
+            JobCancelError: le job est en cours dans un autre processus vivant
+                (autre worker du service), dont le sous-processus est hors d'atteinte
+        """
+        job = self.get(job_id)
+        if job is None or job["status"] not in ACTIVE_STATUSES:
+            return job
+
+        owned = job["owner_pid"] == os.getpid() and job["owner_started"] == _OWNER_STARTED
+        if job["status"] == RUNNING and not owned:
+            if _owner_alive(job["owner_pid"], job["owner_started"]):
+                raise JobCancelError(
+                    f"Job {job_id} en cours dans un autre processus (PID {job['owner_pid']}) : "
+                    "annulation impossible depuis ce processus"
+                )
+            self._update(job_id, status=INTERRUPTED, finished_at=_now(),
+                         message="Interrompu par un redémarrage du service")
+            return self.get(job_id)
+
+        with self._lock:
+            self._cancel_requested.add(job_id)
+            process = self._processes.get(job_id)
+        if process is not None:
+            _terminate(process)
+        elif job["status"] == QUEUED:
+            # Un job en attente d'un autre processus relit cet état avant de démarrer (voir _run)
+            self._update(job_id, status=CANCELLED, finished_at=_now(), message="Annulé avant démarrage")
+        return self.get(job_id)
+
+    def shutdown(self):
+        with self._lock:
+            processes = list(self._processes.items())
+            self._cancel_requested.update(job_id for job_id, _ in processes)
+        for _, process in processes:
+            _terminate(process)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ------------------- Exécution -------------------
+    def _module_lock(self, module: str) -> threading.Lock:
+        with self._lock:
+            return self._module_locks.setdefault(module, threading.Lock())
+
+    def _run(self, job_id: str, spec: JobSpec):
+        with self._module_lock(spec.module):
+            with self._lock:
+                self._started[job_id] = (spec.module, time.perf_counter())
+            job = self.get(job_id)
+            if job is not None and job["status"] == CANCELLED:
+                # Annulé depuis un autre processus pendant l'attente
+                return
+            if job_id in self._cancel_requested:
+                self._finish(job_id, CANCELLED, "Annulé avant démarrage")
+                return
+
+            self._update(job_id, status=RUNNING, started_at=_now(), progress=0.05,
+                         message="Entraînement démarré")
+            log_tail: List[str] = []
+            try:
+                process = subprocess.Popen(
+                    spec.command,
+                    cwd=spec.cwd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    bufsize=1,
+                    env={**os.environ, "PYTHONUNBUFFERED": "1"},
+                    start_new_session=True
+                )
+                with self._lock:
+                    self._processes[job_id] = process
+                    cancel_pending = job_id in self._cancel_requested
+                # Annulation demandée entre le passage à RUNNING et l'enregistrement du processus
+                if cancel_pending:
+                    _terminate(process)
+
+                progress = 0.05
+                for line in process.stdout:
+                    line = line.rstrip()
+                    if not line:
+                        continue
+                    log_tail = (log_tail + [line])[-self.log_tail_lines:]
+                    for marker, marker_progress in spec.progress_markers:
+                        if marker in line:
+                            progress = max(progress, marker_progress)
+                    self._update(job_id, progress=progress, message=line, log_tail=json.dumps(log_tail))
+                return_code = process.wait()
+            except Exception as e:
+                logging.error(f"Erreur lors du lancement du job {job_id} : {str(e)}")
+                self._finish(job_id, FAILED, "Échec du lancement", error=str(e), log_tail=log_tail)
+                return
+            finally:
+                with self._lock:
+                    self._processes.pop(job_id, None)
+
+            if job_id in self._cancel_requested:
+                self._finish(job_id, CANCELLED, "Entraînement annulé", return_code=return_code, log_tail=log_tail)
+                return
+            if return_code != 0:
+                self._finish(job_id, FAILED, "Le script d'entraînement a échoué", return_code=return_code,
+                             error=f"Code de retour {return_code}", log_tail=log_tail)
+                return
+
+            try:
+                message = spec.on_success() if spec.on_success else None
+            except Exception as e:
+                logging.error(f"Erreur après l'entraînement du job {job_id} : {str(e)}")
+                self._finish(job_id, FAILED, "Erreur lors de l'enregistrement des métriques",
+                             return_code=return_code, error=str(e), log_tail=log_tail)
+                return
+            self._finish(job_id, SUCCEEDED, message or "Entraînement terminé avec succès",
+                         return_code=return_code, log_tail=log_tail)
+
+    def _finish(self, job_id: str, status: str, message: str, return_code: Optional[int] = None,
+                error: Optional[str] = None, log_tail: Optional[List[str]] = None):
+        fields = {
+            "status": status,
+            "message": message,
+            "return_code": return_code,
+            "error": error,
+            "finished_at": _now()
+        }
+        if status == SUCCEEDED:
+            fields["progress"] = 1.0
+        if log_tail is not None:
+            fields["log_tail"] = json.dumps(log_tail)
+        self._update(job_id, **fields)
+        with self._lock:
+            self._cancel_requested.discard(job_id)
+            started = self._started.pop(job_id, None)
+        logging.info(f"Job d'entraînement {job_id} terminé : {status}")
+        if started is not None and self.on_finish is not None:
+            module, start = started
+            try:
+                self.on_finish(module, status, time.perf_counter() - start)
+            except Exception as e:
+                logging.warning(f"Erreur lors du suivi de la durée du job {job_id} : {str(e)}")
+
+    def active_counts(self) -> Dict[str, int]:
+        """Nombre de jobs en attente ou en cours, par état"""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) AS n FROM training_jobs WHERE status IN (?, ?) GROUP BY status",
+                ACTIVE_STATUSES
+            ).fetchall()
+        counts = {status: 0 for status in ACTIVE_STATUSES}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+def _process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill(pid, 0) enverrait CTRL_C_EVENT sous Windows : OpenProcess + code de sortie
+        return _windows_process_alive(pid)
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+def _windows_process_alive(pid: int) -> bool:
+    import ctypes
+
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    ERROR_ACCESS_DENIED = 5
+    STILL_ACTIVE = 259
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # Processus d'un autre utilisateur : il existe, mais n'est pas accessible
+        return kernel32.GetLastError() == ERROR_ACCESS_DENIED
+    try:
+        exit_code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return True
+        return exit_code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+def _process_started(pid: int) -> Optional[str]:
+    """
+    Heure de démarrage du processus (en ticks depuis le boot, /proc/<pid>/stat),
+    ou None si elle n'est pas disponible (hors Linux)
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Le nom du processus (2e champ) peut contenir des espaces : on repart après ')'
+    return stat.rsplit(")", 1)[1].split()[19]
+
+# Heure de démarrage de ce processus, enregistrée avec ses jobs (avec le PID)
+_OWNER_STARTED = _process_started(os.getpid())
+
+def _owner_alive(pid: Optional[int], started: Optional[str]) -> bool:
+    """Le processus propriétaire d'un job actif est-il toujours celui qui l'a soumis ?"""
+    if not pid or pid == os.getpid():
+        # Ce processus vient de démarrer : ses propres jobs ne peuvent pas être actifs
+        return False
+    if not _process_alive(pid):
+        return False
+    current = _process_started(pid)
+    # Sans heure de démarrage connue (anciens jobs, hors Linux), le PID fait foi
+    return started is None or current is None or current == started
+
+def _terminate(process: subprocess.Popen, timeout: float = 10.0):
+    """Arrête le script d'entraînement et ses éventuels processus enfants"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, AttributeError):
+        process.terminate()
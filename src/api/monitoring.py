@@ -0,0 +1,310 @@
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi.responses import PlainTextResponse
+
+# Bornes des histogrammes : latence en secondes, tailles en octets, durée d'entraînement en secondes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864, 268435456)
+TRAINING_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Histogram:
+    """Histogramme à bornes fixes (compteurs par intervalle, somme et nombre d'observations)"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """Compteurs cumulés par borne supérieure (la dernière est +Inf)"""
+        total = 0
+        cumulative = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimation d'un quantile : borne supérieure de l'intervalle qui le contient"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative_counts():
+            if total >= rank:
+                return bound
+        return float("inf")
+
+# ------------------- Exposition au format Prometheus -------------------
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class LabeledHistogram:
+    """Famille d'histogrammes, une série par combinaison de valeurs de labels"""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        with self._lock:
+            histogram = self._series.get(labelvalues)
+            if histogram is None:
+                histogram = self._series[labelvalues] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def series(self) -> Dict[Tuple, Histogram]:
+        with self._lock:
+            return dict(self._series)
+
+    def render(self):
+        for labelvalues, histogram in sorted(self.series().items()):
+            for bound, total in histogram.cumulative_counts():
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {total}"
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(histogram.sum)}"
+            yield f"{self.name}_count{labels} {histogram.count}"
+
+class Counter:
+    """Compteur monotone, une valeur par combinaison de valeurs de labels"""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def values(self) -> Dict[Tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        for labelvalues, value in sorted(self.values().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+
+class CallbackMetric:
+    """
+    Métrique lue au moment de la collecte : la fonction retourne soit une
+    valeur, soit une liste de couples (valeurs des labels, valeur)
+    """
+    def __init__(self, name: str, documentation: str, callback: Callable,
+                 labelnames: Iterable[str] = (), metric_type: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.type = metric_type
+
+    def render(self):
+        try:
+            result = self.callback()
+        except Exception as e:
+            logging.warning(f"Métrique {self.name} indisponible : {str(e)}")
+            return
+        if result is None:
+            return
+        if not isinstance(result, (list, tuple)):
+            result = [((), result)]
+        for labelvalues, value in result:
+            yield f"{self.name}{_format_labels(self.labelnames, tuple(labelvalues))} {_format_value(value)}"
+
+class MetricsRegistry:
+    """Ensemble des métriques d'un service, rendu au format texte de Prometheus"""
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets=LATENCY_BUCKETS) -> LabeledHistogram:
+        return self.register(LabeledHistogram(name, documentation, labelnames, buckets))
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, callback: Callable,
+              labelnames: Iterable[str] = (), metric_type: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, callback, labelnames, metric_type))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+def metrics_response(registry: MetricsRegistry) -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+def register_db_pool_metrics(registry: MetricsRegistry, engine):
+    """Occupation du pool de connexions SQLAlchemy"""
+    registry.gauge("db_pool_size", "Taille configurée du pool de connexions",
+                   lambda: engine.pool.size())
+    registry.gauge("db_pool_checked_out", "Connexions actuellement empruntées au pool",
+                   lambda: engine.pool.checkedout())
+    registry.gauge("db_pool_overflow", "Connexions ouvertes au-delà de la taille du pool",
+                   lambda: max(engine.pool.overflow(), 0))
+
+def observe_stage_timings(histogram: LabeledHistogram, endpoint: str, timings: Dict[str, float]):
+    """Reporte dans l'histogramme les durées d'étapes mesurées par le code métier"""
+    for stage, duration in timings.items():
+        histogram.observe(duration, endpoint, stage)
+
+# ------------------- Statistiques HTTP -------------------
+class RequestMetrics:
+    """
+    Statistiques HTTP en mémoire : latence, tailles de requête/réponse et codes
+    de statut par route. Les routes sont identifiées par leur gabarit
+    (/api/performance/jobs/{job_id}) pour garder un nombre de séries borné.
+    """
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        registry = registry or MetricsRegistry()
+        self.latency = registry.histogram(
+            "http_request_duration_seconds", "Latence des requêtes HTTP par route",
+            ("method", "route"), LATENCY_BUCKETS
+        )
+        self.request_size = registry.histogram(
+            "http_request_size_bytes", "Taille du corps des requêtes HTTP par route",
+            ("method", "route"), SIZE_BUCKETS
+        )
+        self.response_size = registry.histogram(
+            "http_response_size_bytes", "Taille du corps des réponses HTTP par route",
+            ("method", "route"), SIZE_BUCKETS
+        )
+        self.status_counts = registry.counter(
+            "http_requests_total", "Nombre de requêtes HTTP par route et code de statut",
+            ("method", "route", "status")
+        )
+
+    def observe(self, method: str, route: str, status: int, duration: float,
+                request_size: int, response_size: int):
+        self.latency.observe(duration, method, route)
+        self.request_size.observe(request_size, method, route)
+        self.response_size.observe(response_size, method, route)
+        self.status_counts.inc(1, method, route, str(status))
+
+    def snapshot(self):
+        """Résumé par route, pour consultation en JSON"""
+        request_sizes = self.request_size.series()
+        response_sizes = self.response_size.series()
+        status_counts = self.status_counts.values()
+        routes = []
+        for (method, route), latency in sorted(self.latency.series().items()):
+            routes.append({
+                "method": method,
+                "route": route,
+                "count": latency.count,
+                "latency_avg_ms": latency.sum / latency.count * 1000,
+                "latency_p50_ms": latency.quantile(0.5) * 1000,
+                "latency_p95_ms": latency.quantile(0.95) * 1000,
+                "latency_p99_ms": latency.quantile(0.99) * 1000,
+                "request_bytes_total": request_sizes[(method, route)].sum,
+                "response_bytes_total": response_sizes[(method, route)].sum,
+                "status_codes": {
+                    status: int(count)
+                    for (m, r, status), count in sorted(status_counts.items())
+                    if m == method and r == route
+                }
+            })
+        return routes
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI de mesure : n'intercepte que les messages échangés, sans
+    jamais lire ni mettre en tampon le corps des requêtes (les uploads restent
+    en flux). Un aperçu du corps n'est journalisé que pour une fraction
+    échantillonnée des requêtes, ou pour toutes si le mode debug est activé.
+    """
+    def __init__(self, app, metrics: RequestMetrics, sample_rate: float = 0.0,
+                 log_bodies: bool = False, preview_bytes: int = 500):
+        self.app = app
+        self.metrics = metrics
+        self.sample_rate = sample_rate
+        self.log_bodies = log_bodies
+        self.preview_bytes = preview_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        sampled = self.log_bodies or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        state = {"status": 500, "request_size": 0, "response_size": 0}
+        preview = bytearray()
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                state["request_size"] += len(body)
+                if sampled and len(preview) < self.preview_bytes:
+                    preview.extend(body[:self.preview_bytes - len(preview)])
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["response_size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            self.metrics.observe(scope["method"], route_path, state["status"], duration,
+                                 state["request_size"], state["response_size"])
+            if sampled:
+                logging.debug(
+                    f"=== {scope['method']} {scope['path']} -> {state['status']} "
+                    f"en {duration * 1000:.1f} ms ===\nBody preview: {bytes(preview)}..."
+                )
+
+def middleware_options_from_env() -> dict:
+    """Échantillonnage des aperçus de corps : LOG_BODY_SAMPLE_RATE et LOG_REQUEST_BODIES"""
+    return {
+        "sample_rate": float(os.getenv("LOG_BODY_SAMPLE_RATE", "0")),
+        "log_bodies": os.getenv("LOG_REQUEST_BODIES", "false").lower() in ("1", "true", "yes")
+    }
@@ -1,25 +1,39 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Depends
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 from pydantic import BaseModel, Field
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 import json
 import os
+import uuid
+import asyncio
+import hashlib
+import sys
 import shutil
 import logging
-import subprocess
+import threading
+import time
 from datetime import datetime
 import aiofiles
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from .database import SessionLocal, get_db
+from .database import SessionLocal, engine, get_db, migrate_metrics_history_indexes
+from .jobs import JobCancelError, JobSpec, TrainingJobManager
+from .monitoring import (
+    TRAINING_BUCKETS, MetricsMiddleware, MetricsRegistry, RequestMetrics,
+    metrics_response, middleware_options_from_env, register_db_pool_metrics
+)
 
 # Configuration des logs
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "DEBUG").upper())
 ALLOWED_EXTENSIONS = {".csv", ".xlsx"}
 
+# Upload en flux : taille des blocs, taille maximale par fichier et écritures simultanées
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_FILE_SIZE = int(os.getenv("MAX_UPLOAD_FILE_SIZE_MB", "500")) * 1024 * 1024
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+
 # Configuration MySQL
 MYSQL_CONFIG = {
     'user': 'mikana_user',
@@ -28,18 +42,6 @@ MYSQL_CONFIG = {
     'database': 'mikana_db'
 }
 
-# ------------------- Middleware de logging -------------------
-class LogMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        logging.debug(f"\n=== Requête reçue: {request.method} {request.url} ===")
-        
-        if request.method == "POST":
-            body = await request.body()
-            logging.debug(f"Body preview: {body[:500]}...")
-        
-        response = await call_next(request)
-        return response
-
 # ------------------- Configuration FastAPI -------------------
 app = FastAPI()
 
@@ -52,8 +54,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware de logging
-app.add_middleware(LogMiddleware)
+# Middleware de mesure (latence, tailles, statuts) avec aperçu des corps échantillonné
+metrics_registry = MetricsRegistry()
+request_metrics = RequestMetrics(metrics_registry)
+app.add_middleware(MetricsMiddleware, metrics=request_metrics, **middleware_options_from_env())
+register_db_pool_metrics(metrics_registry, engine)
+training_duration = metrics_registry.histogram(
+    "training_job_duration_seconds", "Durée des jobs d'entraînement par module et état final",
+    ("module", "status"), TRAINING_BUCKETS
+)
 
 # ------------------- Modèles Pydantic -------------------
 class ModelInfo(BaseModel):
@@ -93,6 +102,69 @@ def get_db_connection():
         logging.error(f"Erreur de connexion à MySQL : {e}")
         raise
 
+class LatestMetricsSnapshot:
+    """
+    Dernières métriques de chaque modèle, gardées en mémoire pour la vue
+    d'ensemble : mises à jour à chaque enregistrement par save_metrics_to_db,
+    et rechargées depuis la base (via l'index model_name, training_date) au
+    premier accès puis périodiquement, pour suivre les écritures des autres
+    processus.
+    """
+    LATEST_QUERY = """
+        SELECT m.model_name, m.r2_score, m.mae, m.rmse, m.training_date
+        FROM metrics_history m
+        JOIN (
+            SELECT model_name, MAX(training_date) AS training_date
+            FROM metrics_history
+            GROUP BY model_name
+        ) latest
+          ON latest.model_name = m.model_name AND latest.training_date = m.training_date
+    """
+
+    def __init__(self, refresh_interval: float = 300.0):
+        self.refresh_interval = refresh_interval
+        self._latest: Dict[str, dict] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> List[dict]:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+            self.reload(db)
+        with self._lock:
+            return [self._latest[name] for name in sorted(self._latest)]
+
+    def reload(self, db: Session):
+        rows = db.execute(self.LATEST_QUERY).fetchall()
+        with self._lock:
+            latest = dict(self._latest)
+            for row in rows:
+                self._merge(latest, row.model_name, row.r2_score, row.mae, row.rmse, row.training_date)
+            self._latest = latest
+            self._loaded_at = time.monotonic()
+
+    def update(self, model_name: str, r2_score, mae, rmse, training_date: datetime):
+        with self._lock:
+            self._merge(self._latest, model_name, r2_score, mae, rmse, training_date)
+
+    @staticmethod
+    def _merge(latest: Dict[str, dict], model_name: str, r2_score, mae, rmse, training_date):
+        """Ne remplace une entrée que par une mesure au moins aussi récente"""
+        current = latest.get(model_name)
+        if current is not None and training_date is not None and current["training_date"] is not None \
+                and current["training_date"] > training_date:
+            return
+        latest[model_name] = {
+            "model_name": model_name,
+            "r2_score": float(r2_score) if r2_score is not None else None,
+            "mae": float(mae) if mae is not None else None,
+            "rmse": float(rmse) if rmse is not None else None,
+            "training_date": training_date
+        }
+
+latest_metrics = LatestMetricsSnapshot(
+    refresh_interval=float(os.getenv("METRICS_SNAPSHOT_REFRESH_SECONDS", "300"))
+)
+
 def save_metrics_to_db(model_name: str, metrics: dict, db: Session, additional_info: str = None):
     """Sauvegarde les métriques d'entraînement dans la base de données en utilisant SQL"""
     try:
@@ -114,6 +186,8 @@ def save_metrics_to_db(model_name: str, metrics: dict, db: Session, additional_i
         
         db.execute(query, values)
         db.commit()
+        latest_metrics.update(model_name, values["r2_score"], values["mae"], values["rmse"],
+                              values["training_date"])
         
         logging.info(f"Métriques sauvegardées pour le modèle {model_name}")
         
@@ -121,42 +195,39 @@ def save_metrics_to_db(model_name: str, metrics: dict, db: Session, additional_i
         logging.error(f"Erreur lors de la sauvegarde des métriques : {str(e)}")
         raise
 
+@app.on_event("startup")
+def apply_metrics_history_migration():
+    """Index (model_name, training_date) et (training_date) de metrics_history"""
+    try:
+        created = migrate_metrics_history_indexes()
+        if created:
+            logging.info(f"Index créés sur metrics_history : {', '.join(created)}")
+    except Exception as e:
+        logging.warning(f"Migration des index de metrics_history impossible : {str(e)}")
+
 # ------------------- Endpoints -------------------
+@app.get("/metrics", include_in_schema=False)
+def get_prometheus_metrics():
+    """Métriques du service au format texte Prometheus"""
+    return metrics_response(metrics_registry)
+
+@app.get("/api/performance/request-metrics")
+async def get_request_metrics():
+    """Latence, tailles et codes de statut par route depuis le démarrage"""
+    return {"success": True, "data": request_metrics.snapshot()}
+
 @app.get("/api/performance/overview", response_model=PerformanceResponse)
 async def get_performance_overview(db: Session = Depends(get_db)):
-    """Endpoint principal pour les performances"""
+    """Endpoint principal pour les performances (dernières métriques servies depuis la mémoire)"""
     try:
-        query = """
-            WITH RankedMetrics AS (
-                SELECT 
-                    model_name,
-                    r2_score,
-                    mae,
-                    rmse,
-                    training_date,
-                    ROW_NUMBER() OVER (PARTITION BY model_name ORDER BY training_date DESC) as rn
-                FROM metrics_history
-            )
-            SELECT 
-                model_name,
-                r2_score,
-                mae,
-                rmse,
-                training_date
-            FROM RankedMetrics
-            WHERE rn = 1
-        """
-        
-        results = db.execute(query).fetchall()
-        
         metrics = []
-        for row in results:
+        for latest in latest_metrics.get(db):
             metrics.append(ModelMetrics(
-                model_name=row.model_name,
-                r2_score=float(row.r2_score) if row.r2_score is not None else 0.0,
-                rmse=row.rmse,
-                mae=row.mae,
-                timestamp=row.training_date.isoformat() if row.training_date else None
+                model_name=latest["model_name"],
+                r2_score=latest["r2_score"] if latest["r2_score"] is not None else 0.0,
+                rmse=latest["rmse"],
+                mae=latest["mae"],
+                timestamp=latest["training_date"].isoformat() if latest["training_date"] else None
             ))
 
         if not metrics:
@@ -232,6 +303,47 @@ async def get_metrics_history(db: Session = Depends(get_db)):
             detail=f"Erreur lors de la récupération de l'historique : {str(e)}"
         )
 
+async def stream_upload_to_disk(file: UploadFile, file_path: Path, commit: bool = True) -> Dict[str, Any]:
+    """
+    Écrit un fichier uploadé par blocs dans un fichier temporaire, en calculant
+    son SHA-256 au fil de l'eau, puis le renomme atomiquement vers sa destination.
+    Avec commit=False, le fichier temporaire est conservé (clé "tmp_path") et
+    c'est à l'appelant de le renommer ou de le supprimer.
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}.part")
+    sha256 = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Fichier trop volumineux: {file.filename} "
+                               f"(maximum {MAX_UPLOAD_FILE_SIZE // (1024 * 1024)} Mo)"
+                    )
+                sha256.update(chunk)
+                await f.write(chunk)
+        if commit:
+            os.replace(tmp_path, file_path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+    finally:
+        await file.close()
+
+    info = {"size": size, "sha256": sha256.hexdigest()}
+    if not commit:
+        info["tmp_path"] = tmp_path
+    return info
+
 @app.post("/api/performance/upload")
 async def upload_files(
     module: str = Form(...),
@@ -261,27 +373,53 @@ async def upload_files(
         logging.info(f"Dossier cible: {target_dir}")
         
         target_dir.mkdir(parents=True, exist_ok=True)
-        
-        saved_files = []
+        resolved_target = target_dir.resolve()
+
+        destinations = []
         for file, path in zip(files, paths):
-            file_path = target_dir / path
-            file_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            logging.info(f"Sauvegarde du fichier: {file_path}")
-            
-            async with aiofiles.open(file_path, 'wb') as f:
-                content = await file.read()
-                await f.write(content)
-            
-            saved_files.append(str(file_path.relative_to(base_dir)))
-            logging.info(f"Fichier sauvegardé: {file_path}")
+            file_path = (target_dir / path).resolve()
+            if resolved_target not in file_path.parents:
+                raise HTTPException(status_code=400, detail=f"Chemin de fichier invalide: {path}")
+            destinations.append((file, file_path))
+
+        # Les fichiers d'un dossier sont écrits en parallèle (nombre d'écritures borné)
+        # dans des fichiers temporaires, publiés seulement quand tous sont complets
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+        async def save(file: UploadFile, file_path: Path) -> Dict[str, Any]:
+            async with semaphore:
+                logging.info(f"Sauvegarde du fichier: {file_path}")
+                info = await stream_upload_to_disk(file, file_path, commit=False)
+                logging.info(f"Fichier reçu: {file_path} ({info['size']} octets, sha256={info['sha256']})")
+                return {"path": str(file_path.relative_to(base_dir.resolve())), **info}
+
+        tasks = [asyncio.ensure_future(save(file, file_path)) for file, file_path in destinations]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Un fichier en erreur (413...) annule les autres écritures : aucun fichier
+            # du dossier n'est publié et les fichiers temporaires déjà écrits sont supprimés
+            for task in tasks:
+                task.cancel()
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(result, dict) and result["tmp_path"].exists():
+                    result["tmp_path"].unlink()
+            raise
+
+        saved = [task.result() for task in tasks]
+        for (_, file_path), info in zip(destinations, saved):
+            os.replace(info.pop("tmp_path"), file_path)
+        saved_files = [info["path"] for info in saved]
 
         return JSONResponse({
             "status": "success",
             "message": f"{len(saved_files)} fichier(s) sauvegardé(s)",
-            "saved_files": saved_files
+            "saved_files": saved_files,
+            "files": saved
         })
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Erreur lors de l'upload: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -289,77 +427,132 @@ async def upload_files(
             detail=str(e)
         )
 
-@app.post("/api/performance/train-commandes")
-async def train_commandes_model(db: Session = Depends(get_db)):
-    """Endpoint pour entraîner le modèle de prédiction des commandes"""
+# ------------------- Entraînements en arrière-plan -------------------
+def _record_training_metrics(model_name: str, metrics_path: Path, nested: bool = False) -> str:
+    """Lit les métriques produites par un script d'entraînement et les enregistre en base"""
+    with open(metrics_path, 'r') as f:
+        metrics = json.load(f)
+    if nested:
+        metrics = metrics.get('metrics', {})
+
+    db = SessionLocal()
     try:
-        base_dir = BASE_DIR / "Predict_commande"
-        subprocess.run(["python", "train_commande.py"], cwd=base_dir, check=True)
-        
-        metrics_path = base_dir / "trained_models" / "model_metrics.json"
-        with open(metrics_path, 'r') as f:
-            metrics = json.load(f)
-        
         save_metrics_to_db(
-            "Prédiction Commandes",
+            model_name,
             metrics, db,
             f"Entraînement effectué le {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
         )
-        
-        return {"message": "Entraînement du modèle de prédiction des commandes terminé avec succès"}
-    except Exception as e:
-        logging.error(f"Erreur lors de l'entraînement du modèle de commandes : {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de l'entraînement : {str(e)}"
-        )
+    finally:
+        db.close()
+    return f"Entraînement du modèle {model_name} terminé avec succès"
 
-@app.post("/api/performance/train-livraisons")
-async def train_livraisons_model(db: Session = Depends(get_db)):
-    """Endpoint pour entraîner le modèle de planification des livraisons"""
-    try:
-        base_dir = BASE_DIR / "Planif_Livraisons"
-        subprocess.run(["python", "train.py"], cwd=base_dir, check=True)
-        
-        metrics_path = base_dir / "model_metrics.json"
-        with open(metrics_path, 'r') as f:
-            metrics = json.load(f)
-        
-        save_metrics_to_db(
-            "Planification Livraisons",
-            metrics.get('metrics', {}), db,
-            f"Entraînement effectué le {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+TRAINING_JOBS = {
+    "commandes": lambda: JobSpec(
+        module="commandes",
+        command=[sys.executable, "train_commande.py", "--articles"],
+        cwd=BASE_DIR / "Predict_commande",
+        progress_markers=[
+            # Messages affichés par train_commande.py
+            ("Chargement des données de commandes", 0.1),
+            ("Entraînement du modèle Prophet global", 0.2),
+            ("Évaluation du modèle sur les données de test", 0.3),
+            ("Entraînement des modèles Prophet par article", 0.4),
+            ("Métriques sauvegardées", 0.95)
+        ],
+        on_success=lambda: _record_training_metrics(
+            "Prédiction Commandes", BASE_DIR / "Predict_commande" / "trained_models" / "model_metrics.json"
         )
-        
-        return {"message": "Entraînement du modèle de planification des livraisons terminé avec succès"}
-    except Exception as e:
-        logging.error(f"Erreur lors de l'entraînement du modèle de livraisons : {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de l'entraînement : {str(e)}"
+    ),
+    "livraisons": lambda: JobSpec(
+        module="livraisons",
+        command=[sys.executable, "train.py"],
+        cwd=BASE_DIR / "Planif_Livraisons",
+        progress_markers=[
+            ("Chargement et prétraitement", 0.1),
+            ("Préparation des données", 0.2),
+            ("Entraînement du modèle XGBoost", 0.4),
+            ("Évaluation du modèle", 0.8)
+        ],
+        on_success=lambda: _record_training_metrics(
+            "Planification Livraisons", BASE_DIR / "Planif_Livraisons" / "model_metrics.json", nested=True
+        )
+    ),
+    "rh": lambda: JobSpec(
+        module="rh",
+        command=[sys.executable, "Predictions_budget_RH_vf.py", "--search"],
+        cwd=BASE_DIR / "Gestion_RH",
+        progress_markers=[
+            ("Recherche des ordres SARIMA", 0.1),
+            ("Modèle chargé", 0.5),
+            ("Modèle entraîné", 0.5),
+            # Message affiché par Predictions_budget_RH_vf.py après l'export des métriques
+            ("Metrics exported successfully", 0.9)
+        ],
+        on_success=lambda: _record_training_metrics(
+            "Gestion RH", BASE_DIR / "Gestion_RH" / "model_metrics.json"
         )
+    )
+}
+
+job_manager = TrainingJobManager(
+    db_path=Path(os.getenv("TRAINING_JOBS_DB", str(BASE_DIR / "training_jobs.db"))),
+    max_workers=int(os.getenv("TRAINING_MAX_WORKERS", "2")),
+    on_finish=lambda module, status, duration: training_duration.observe(duration, module, status)
+)
+metrics_registry.gauge(
+    "training_jobs_active", "Jobs d'entraînement en attente ou en cours",
+    lambda: [((status,), count) for status, count in job_manager.active_counts().items()],
+    ("status",)
+)
+
+@app.on_event("shutdown")
+def stop_training_jobs():
+    job_manager.shutdown()
+
+def _submit_training(module: str) -> JSONResponse:
+    job = job_manager.submit(TRAINING_JOBS[module]())
+    return JSONResponse(status_code=202, content={
+        "message": "Un entraînement est déjà en cours pour ce modèle" if job["already_active"]
+                   else "Entraînement lancé en arrière-plan",
+        "job_id": job["id"],
+        "job": job
+    })
+
+@app.post("/api/performance/train-commandes", status_code=202)
+async def train_commandes_model():
+    """Lance l'entraînement du modèle de prédiction des commandes"""
+    return _submit_training("commandes")
+
+@app.post("/api/performance/train-livraisons", status_code=202)
+async def train_livraisons_model():
+    """Lance l'entraînement du modèle de planification des livraisons"""
+    return _submit_training("livraisons")
+
+@app.post("/api/performance/train-rh", status_code=202)
+async def train_rh_model():
+    """Lance l'entraînement du modèle de gestion RH"""
+    return _submit_training("rh")
+
+@app.get("/api/performance/jobs")
+async def list_training_jobs(module: Optional[str] = None, limit: int = 50):
+    """Historique des entraînements (les plus récents d'abord)"""
+    return {"success": True, "data": job_manager.list(module=module, limit=limit)}
+
+@app.get("/api/performance/jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """État et progression d'un entraînement"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job introuvable: {job_id}")
+    return job
 
-@app.post("/api/performance/train-rh")
-async def train_rh_model(db: Session = Depends(get_db)):
-    """Endpoint pour entraîner le modèle de gestion RH"""
+@app.post("/api/performance/jobs/{job_id}/cancel")
+def cancel_training_job(job_id: str):
+    """Annule un entraînement en attente ou en cours"""
     try:
-        base_dir = BASE_DIR / "Gestion_RH"
-        subprocess.run(["python", "Predictions_budget_RH_vf.py"], cwd=base_dir, check=True)
-        
-        metrics_path = base_dir / "model_metrics.json"
-        with open(metrics_path, 'r') as f:
-            metrics = json.load(f)
-        
-        save_metrics_to_db(
-            "Gestion RH",
-            metrics, db,
-            f"Entraînement effectué le {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        )
-        
-        return {"message": "Entraînement du modèle de gestion RH terminé avec succès"}
-    except Exception as e:
-        logging.error(f"Erreur lors de l'entraînement du modèle RH : {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de l'entraînement : {str(e)}"
-        )
+        job = job_manager.cancel(job_id)
+    except JobCancelError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job introuvable: {job_id}")
+    return job
@@ -4,23 +4,30 @@ from pydantic import BaseModel
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 import pandas as pd
-from model_prophet import PredicteurTemporel
-from Planif_Livraisons.predict import predict_delivery
+from Planif_Livraisons.predict import predict_delivery, predict_delivery_batch, prediction_cache
+from Planif_Livraisons.predict import registry as delivery_registry
+from Gestion_RH.sarima_artifact import SLIM_FILENAME as SARIMA_SLIM_FILENAME, load_sarima
+from Gestion_RH.budget_simulation import DEFAULT_QUANTILES, quantile_key, simulate_budget
+from Predict_commande.model_registry import MAX_HORIZON as COMMANDE_MAX_HORIZON
+from Predict_commande.model_registry import registry as commande_registry
 from io import BytesIO
 from fastapi.responses import StreamingResponse, FileResponse
 from sqlalchemy.orm import Session
-from .database import get_db, PredictionHistory
+from .database import engine, get_db, PredictionHistory
+from model_store import ArtifactWatcher, artifact_fingerprint, artifact_path, file_fingerprint
+from .monitoring import (
+    MetricsMiddleware, MetricsRegistry, RequestMetrics, metrics_response,
+    middleware_options_from_env, observe_stage_timings, register_db_pool_metrics
+)
+from .readiness import SubsystemRegistry
 import joblib
 import os
 import numpy as np
 from pathlib import Path
 import uuid
+import time
+from types import SimpleNamespace
 from fastapi_cache import FastAPICache
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph
 from datetime import timedelta
 
 app = FastAPI()
@@ -32,14 +39,82 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-)                                                                                                                                                                                                                                                                                               
+)
+
+# Middleware de mesure (latence, tailles, statuts par route)
+metrics_registry = MetricsRegistry()
+request_metrics = RequestMetrics(metrics_registry)
+app.add_middleware(MetricsMiddleware, metrics=request_metrics, **middleware_options_from_env())
+prediction_stages = metrics_registry.histogram(
+    "prediction_stage_duration_seconds", "Durée des étapes de prédiction par endpoint",
+    ("endpoint", "stage")
+)
 
 # @app.get("/")
 # async def root():
 #     return {"message": "API de prédiction RH active"}
 
-# Initialisation du prédicteur
-predicteur = PredicteurTemporel()
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+HISTORY_DATA_PATH = os.path.join(BASE_DIR, "donnees_completes_logistique_formatted.csv")
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "2"))
+# Préchauffage des sous-systèmes dans un thread au démarrage (sinon au premier usage)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+
+# Sous-systèmes initialisés au premier usage ou par le préchauffage (voir readiness)
+subsystems = SubsystemRegistry()
+
+def load_predicteur(version):
+    # Import différé : prophet et matplotlib ne sont chargés qu'avec le prédicteur
+    from model_prophet import PredicteurTemporel
+    return PredicteurTemporel(HISTORY_DATA_PATH)
+
+# Initialisation du prédicteur : reconstruit en arrière-plan (modèles Prophet
+# vidés) quand le fichier d'historique des commandes est remplacé
+predicteurs = ArtifactWatcher(
+    "Prédicteur temporel",
+    lambda: file_fingerprint([HISTORY_DATA_PATH]),
+    load_predicteur,
+    interval=MODEL_WATCH_INTERVAL
+)
+orders_forecaster = subsystems.register("orders_forecaster", predicteurs.get)
+delivery_model = subsystems.register("delivery_model", delivery_registry.get)
+
+def load_pdf_toolkit():
+    """Modules reportlab utilisés par l'export PDF (importés au premier export)"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
+    from reportlab.lib.styles import getSampleStyleSheet
+    return SimpleNamespace(colors=colors, letter=letter, landscape=landscape, SimpleDocTemplate=SimpleDocTemplate,
+                           Table=Table, TableStyle=TableStyle, Paragraph=Paragraph,
+                           getSampleStyleSheet=getSampleStyleSheet)
+
+pdf_export = subsystems.register("pdf_export", load_pdf_toolkit, required=False)
+
+def load_commande_models():
+    """Registre des modèles de commandes, modèles globaux chargés au premier appel"""
+    if not commande_registry.stats()["global_models"]:
+        errors = commande_registry.preload()
+        if len(errors) == 2:
+            raise RuntimeError(f"Aucun modèle de commandes disponible : {errors}")
+    return commande_registry
+
+# Modèles de Predict_commande (facultatifs : absents tant qu'ils n'ont pas été entraînés)
+commande_models = subsystems.register("commande_models", load_commande_models, required=False)
+
+# Tailles des caches de modèles et du pool de connexions, lues à chaque collecte
+# (sans déclencher le chargement d'un sous-système pas encore initialisé)
+metrics_registry.gauge("prophet_models_cached", "Modèles Prophet gardés en mémoire",
+                       lambda: len(getattr(predicteurs.peek(), "models", {})))
+metrics_registry.gauge("commande_article_models_cached", "Modèles Prophet par article gardés en mémoire",
+                       lambda: commande_registry.stats()["article_models"])
+metrics_registry.gauge("delivery_prediction_cache_entries", "Entrées du cache des prédictions de livraison",
+                       lambda: prediction_cache.stats()["size"])
+metrics_registry.gauge("delivery_prediction_cache_hits_total", "Prédictions de livraison servies par le cache",
+                       lambda: prediction_cache.stats()["hits"], metric_type="counter")
+metrics_registry.gauge("delivery_prediction_cache_misses_total", "Prédictions de livraison calculées",
+                       lambda: prediction_cache.stats()["misses"], metric_type="counter")
+register_db_pool_metrics(metrics_registry, engine)
 
 # Initialisation du prédicteur RH
 # hr_predictor = HRPredictor()
@@ -57,6 +132,10 @@ class DeliveryPredictionRequest(BaseModel):
     article: str
     quantity: float
 
+class DeliveryBatchPredictionRequest(BaseModel):
+    lines: List[DeliveryPredictionRequest]
+    save_history: bool = False
+
 class Alert(BaseModel):
     id: str
     type: str
@@ -90,7 +169,7 @@ async def get_linen_types(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/predict")
-async def predict(request: PredictionRequest):
+def predict(request: PredictionRequest):
     try:
         print("\n=== Nouvelle requête de prédiction ===")
         print(f"Type de date: {request.dateType}")
@@ -122,13 +201,18 @@ async def predict(request: PredictionRequest):
 
         print(f"Dates à traiter: {[d.strftime('%Y-%m-%d') for d in dates_prediction]}")
         
-        predictions = predicteur.predire(
+        durees = {}
+        predictions = orders_forecaster.get().predire(
             dates_prediction=dates_prediction,
             etablissement=request.establishment if request.establishment else None,
-            article=request.linenType if request.linenType else None
+            article=request.linenType if request.linenType else None,
+            durees=durees
         )
+        observe_stage_timings(prediction_stages, "predict", durees)
         
         return {"predictions": predictions}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erreur: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
@@ -169,7 +253,7 @@ async def predict(request: PredictionRequest):
 #         raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
 
 @app.post("/api/predict-delivery")
-async def predict_delivery_endpoint(
+def predict_delivery_endpoint(
    request: DeliveryPredictionRequest,
    db: Session = Depends(get_db)
 ):
@@ -178,11 +262,15 @@ async def predict_delivery_endpoint(
        delivery_date = datetime.fromisoformat(request.date.replace('Z', '+00:00'))
 
        # Appeler la fonction de prédiction
+       delivery_model.get()
+       timings = {}
        result = predict_delivery(
            date=delivery_date,
            article=request.article,
-           quantity=request.quantity
+           quantity=request.quantity,
+           timings=timings
        )
+       db_start = time.perf_counter()
 
        # Créer l'entrée dans l'historique avec une requête SQL directe
        query = """
@@ -204,14 +292,106 @@ async def predict_delivery_endpoint(
        })
         
        db.commit()
+       timings["db_insert"] = time.perf_counter() - db_start
+       observe_stage_timings(prediction_stages, "predict_delivery", timings)
        
        return result
 
+   except HTTPException:
+       raise
    except Exception as e:
        raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
 
+@app.post("/api/predict-delivery/batch")
+def predict_delivery_batch_endpoint(
+    request: DeliveryBatchPredictionRequest,
+    db: Session = Depends(get_db)
+):
+    try:
+        if not request.lines:
+            return {"predictions": [], "total": 0, "errors": 0}
+
+        # Seule la partie date (AAAA-MM-JJ) est utilisée par le modèle
+        dates = pd.to_datetime(
+            pd.Series([line.date for line in request.lines]).str.slice(0, 10),
+            format='%Y-%m-%d',
+            errors='coerce'
+        )
+        delivery_model.get()
+        results = predict_delivery_batch(
+            dates=dates,
+            articles=[line.article for line in request.lines],
+            quantities=[line.quantity for line in request.lines]
+        )
+
+        valid = results[results['error'].isna()]
+        if request.save_history and not valid.empty:
+            query = """
+                INSERT INTO prediction_history 
+                (date, article, quantity_ordered, quantity_predicted, delivery_rate, status, recommendation, created_at)
+                VALUES 
+                (:date, :article, :quantity_ordered, :quantity_predicted, :delivery_rate, :status, :recommendation, :created_at)
+            """
+            created_at = datetime.now()
+            db.execute(query, [{
+                "date": row.date.to_pydatetime(),
+                "article": row.article,
+                "quantity_ordered": row.quantity,
+                "quantity_predicted": row.predicted_quantity,
+                "delivery_rate": row.delivery_rate,
+                "status": row.status,
+                "recommendation": row.recommendation,
+                "created_at": created_at
+            } for row in valid.itertuples(index=False)])
+            db.commit()
+
+        results['date'] = results['date'].dt.strftime('%Y-%m-%d')
+        predictions = results.astype(object).where(results.notna(), None).to_dict(orient='records')
+
+        return {
+            "predictions": predictions,
+            "total": len(results),
+            "errors": int(results['error'].notna().sum())
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction par lot: {str(e)}")
+
+@app.get("/metrics", include_in_schema=False)
+def get_prometheus_metrics():
+    """Métriques du service au format texte Prometheus"""
+    return metrics_response(metrics_registry)
+
+@app.on_event("startup")
+def warm_up_subsystems():
+    """Charge les modèles et données en arrière-plan : le service accepte les requêtes immédiatement"""
+    if WARMUP_ON_STARTUP:
+        subsystems.warm_up()
+
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    """Liveness : le processus répond, avec l'état de chaque sous-système"""
+    return subsystems.health_response()
+
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    """Readiness : 503 tant qu'un sous-système requis n'est pas prêt"""
+    return subsystems.readiness_response()
+
+@app.get("/api/predict-delivery/cache")
+async def get_delivery_cache_stats():
+    """Compteurs du cache des prédictions de livraison"""
+    return prediction_cache.stats()
+
+@app.delete("/api/predict-delivery/cache")
+async def clear_delivery_cache():
+    prediction_cache.clear()
+    return prediction_cache.stats()
+
 @app.get("/api/historical-data")
-async def get_historical_data(establishment: str = None, linenType: str = None, month: int = None, day: int = None):
+def get_historical_data(establishment: str = None, linenType: str = None, month: int = None, day: int = None):
     try:
         print(f"\n=== Recherche données historiques ===")
         print(f"Établissement: {establishment}")
@@ -219,7 +399,7 @@ async def get_historical_data(establishment: str = None, linenType: str = None,
         print(f"Date: {day}/{month}")
 
         # Convertir les colonnes de date
-        df_filtered = predicteur.df_historique.copy()
+        df_filtered = orders_forecaster.get().df_historique.copy()
         df_filtered['DATE'] = pd.to_datetime(df_filtered['DATE'])
 
         # Appliquer les filtres seulement s'ils sont spécifiés
@@ -252,15 +432,17 @@ async def get_historical_data(establishment: str = None, linenType: str = None,
             "linenType": linenType
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erreur lors de la récupération des données historiques: {str(e)}")
         print(f"Pour: {establishment}, {linenType}, {month}/{day}")
         raise HTTPException(status_code=500, detail=str(e)) 
 
 @app.get("/api/seasonal-trends")
-async def get_seasonal_trends(establishment: str = None, linenType: str = None):
+def get_seasonal_trends(establishment: str = None, linenType: str = None):
     try:
-        df = predicteur.df_historique.copy()
+        df = orders_forecaster.get().df_historique.copy()
         df['DATE'] = pd.to_datetime(df['DATE'])
 
         # Filtrer par établissement et type de linge si spécifiés
@@ -297,14 +479,16 @@ async def get_seasonal_trends(establishment: str = None, linenType: str = None):
             "data": heatmap_data
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erreur lors de la récupération des tendances saisonnières: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
 
 @app.get("/api/weather-impact")
-async def get_weather_impact(establishment: str = None, linenType: str = None):
+def get_weather_impact(establishment: str = None, linenType: str = None):
     try:
-        df = predicteur.df_historique.copy()
+        df = orders_forecaster.get().df_historique.copy()
         df['DATE'] = pd.to_datetime(df['DATE'])
 
         # Simuler des données météo (à remplacer par de vraies données)
@@ -357,6 +541,8 @@ async def get_weather_impact(establishment: str = None, linenType: str = None):
 
         return correlations
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erreur lors de l'analyse de l'impact météorologique: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e)) 
@@ -426,7 +612,7 @@ async def get_prediction_history(
         return {"success": False, "error": str(e)}
 
 @app.get("/api/export/{format}")
-async def export_predictions(
+def export_predictions(
     format: str,
     db: Session = Depends(get_db),
     start_date: Optional[datetime] = None,
@@ -467,10 +653,11 @@ async def export_predictions(
             )
         elif format.lower() == "pdf":
             # Création du PDF
+            pdf = pdf_export.get()
             output = BytesIO()
-            doc = SimpleDocTemplate(
+            doc = pdf.SimpleDocTemplate(
                 output,
-                pagesize=landscape(letter),
+                pagesize=pdf.landscape(pdf.letter),
                 rightMargin=30,
                 leftMargin=30,
                 topMargin=30,
@@ -480,8 +667,8 @@ async def export_predictions(
             elements = []
             
             # Style pour le titre
-            styles = getSampleStyleSheet()
-            title = Paragraph("Historique des Prédictions", styles['Title'])
+            styles = pdf.getSampleStyleSheet()
+            title = pdf.Paragraph("Historique des Prédictions", styles['Title'])
             elements.append(title)
             
             # Préparation des données pour le tableau
@@ -498,21 +685,21 @@ async def export_predictions(
                 data.append(formatted_row)
             
             # Création du tableau
-            table = Table(data, repeatRows=1)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            table = pdf.Table(data, repeatRows=1)
+            table.setStyle(pdf.TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), pdf.colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), pdf.colors.whitesmoke),
                 ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
                 ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
                 ('FONTSIZE', (0, 0), (-1, 0), 12),
                 ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+                ('BACKGROUND', (0, 1), (-1, -1), pdf.colors.beige),
+                ('TEXTCOLOR', (0, 1), (-1, -1), pdf.colors.black),
                 ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
                 ('FONTSIZE', (0, 1), (-1, -1), 9),
                 ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.whitesmoke, colors.white]),
+                ('GRID', (0, 0), (-1, -1), 1, pdf.colors.black),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [pdf.colors.whitesmoke, pdf.colors.white]),
             ]))
             
             elements.append(table)
@@ -531,6 +718,8 @@ async def export_predictions(
         else:
             raise HTTPException(status_code=400, detail="Format non supporté. Utilisez 'excel' ou 'pdf'")
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'export: {str(e)}")
 
@@ -591,16 +780,17 @@ async def get_delivery_stats(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 # Définir les chemins relatifs par rapport au dossier de l'API
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-MODEL_PATH = os.path.join(BASE_DIR, "Gestion_RH", "sarima_model.joblib")
-DATA_PATH = os.path.join(BASE_DIR, "Gestion_RH", "Total_Presents_Final.xlsx")
-
-# Charger le modèle SARIMA
-try:
-    sarima_model = joblib.load(MODEL_PATH)
-    print("Modèle SARIMA chargé avec succès.")
-except FileNotFoundError:
-    raise RuntimeError("Le modèle SARIMA n'a pas été trouvé. Entraînez-le d'abord.")
+RH_DIR = os.path.join(BASE_DIR, "Gestion_RH")
+SARIMA_FILENAME = "sarima_model.joblib"
+DATA_PATH = os.path.join(RH_DIR, "Total_Presents_Final.xlsx")
+# Prévisions calculées une fois au chargement du modèle, jusqu'à cet horizon et à ces niveaux de confiance
+SARIMA_MAX_HORIZON = int(os.getenv("SARIMA_MAX_HORIZON", "104"))
+SARIMA_CONFIDENCE_LEVELS = tuple(
+    round(float(level), 4) for level in os.getenv("SARIMA_CONFIDENCE_LEVELS", "0.8,0.9,0.95").split(",")
+)
+DEFAULT_CONFIDENCE_LEVEL = 0.95
+# Nombre maximal de trajectoires par simulation de budget
+BUDGET_SIMULATION_MAX_PATHS = int(os.getenv("BUDGET_SIMULATION_MAX_PATHS", "20000"))
 
 # Convertir Année + Semaines en Date
 def year_week_to_date(year, week):
@@ -613,57 +803,214 @@ def year_week_to_date(year, week):
     # Ajouter le nombre de semaines nécessaire
     return first_monday + timedelta(weeks=week_num-1)
 
-# Charger les données et créer la colonne Date
-print("Chargement des données...")
-# Lire le fichier en spécifiant le séparateur décimal
-df = pd.read_excel(DATA_PATH, decimal=',')
-# Créer la colonne Date
-df['Date'] = df.apply(lambda row: year_week_to_date(int(row['Annee']), row['Semaines']), axis=1)
-df['Date'] = pd.to_datetime(df['Date'])
-# Trier les données par date
-df = df.sort_values('Date')
-last_date = df['Date'].max()
-print(f"Dernière date dans les données : {last_date.strftime('%Y-%m-%d')}")
+def load_rh_forecaster(version):
+    """
+    Charge le modèle SARIMA de la version donnée (artefact allégé, ou pickle
+    complet pour les versions publiées avant lui) et la dernière date des données RH
+    """
+    model_version = version.split("|")[0]
+    try:
+        start = time.perf_counter()
+        sarima_model, model_format = load_sarima(
+            artifact_path(RH_DIR, SARIMA_SLIM_FILENAME, model_version),
+            artifact_path(RH_DIR, SARIMA_FILENAME, model_version)
+        )
+        print(f"Modèle SARIMA chargé avec succès (version {model_version}, format {model_format}, "
+              f"{time.perf_counter() - start:.2f}s).")
+    except FileNotFoundError:
+        raise RuntimeError("Le modèle SARIMA n'a pas été trouvé. Entraînez-le d'abord.")
+
+    # Charger les données et créer la colonne Date
+    print("Chargement des données...")
+    # Lire le fichier en spécifiant le séparateur décimal
+    df = pd.read_excel(DATA_PATH, decimal=',')
+    # Créer la colonne Date
+    df['Date'] = df.apply(lambda row: year_week_to_date(int(row['Annee']), row['Semaines']), axis=1)
+    df['Date'] = pd.to_datetime(df['Date'])
+    last_date = df['Date'].max()
+    print(f"Dernière date dans les données : {last_date.strftime('%Y-%m-%d')}")
+
+    start = time.perf_counter()
+    levels = sorted(set(SARIMA_CONFIDENCE_LEVELS) | {DEFAULT_CONFIDENCE_LEVEL})
+    forecasts = build_sarima_forecasts(sarima_model, last_date, SARIMA_MAX_HORIZON, levels)
+    print(f"Prévisions SARIMA précalculées ({SARIMA_MAX_HORIZON} semaines, niveaux {levels}) "
+          f"en {time.perf_counter() - start:.2f}s")
+    return {"model": sarima_model, "last_date": last_date, "forecasts": forecasts}
+
+def sarima_periods(last_date, steps):
+    """Libellés "lundi - dimanche" des `steps` semaines qui suivent la dernière date"""
+    # Date de début des prédictions : la semaine suivante, ramenée au lundi
+    start_date = last_date + timedelta(weeks=1)
+    start_date = start_date - timedelta(days=start_date.weekday())
+    # W-MON force les dates à être des lundis ; la période va du lundi au dimanche
+    future_index = pd.date_range(start=start_date, periods=steps, freq='W-MON')
+    return (future_index.strftime('%d/%m/%Y') + " - " + (future_index + pd.Timedelta(days=6)).strftime('%d/%m/%Y')).tolist()
+
+def build_sarima_forecasts(sarima_model, last_date, steps, levels):
+    """
+    Prévisions des `steps` prochaines semaines, déjà au format de la réponse,
+    pour chaque niveau de confiance : {niveau: [prédiction, ...]}
+    """
+    periods = sarima_periods(last_date, steps)
+    future_forecast = sarima_model.get_forecast(steps=steps)
+    means = np.round(np.asarray(future_forecast.predicted_mean, dtype=float), 2).tolist()
+    forecasts = {}
+    for level in levels:
+        ci = np.round(np.asarray(future_forecast.conf_int(alpha=1 - level), dtype=float), 2).tolist()
+        forecasts[level] = [
+            {"period": period, "predicted_presences": mean, "confidence_interval": bounds}
+            for period, mean, bounds in zip(periods, means, ci)
+        ]
+    return forecasts
+
+# Modèle SARIMA et données RH, rechargés en arrière-plan après chaque entraînement
+rh_forecaster = ArtifactWatcher(
+    "Modèle SARIMA",
+    lambda: f"{artifact_fingerprint(RH_DIR, [SARIMA_FILENAME])}|{file_fingerprint([DATA_PATH])}",
+    load_rh_forecaster,
+    interval=MODEL_WATCH_INTERVAL
+)
+rh_sarima = subsystems.register("rh_sarima", rh_forecaster.get)
 
 # Définir la structure de la requête
 class SARIMAPredictionRequest(BaseModel):
     weeks: int = 30  # Nombre de semaines à prédire par défaut
+    confidence_level: float = DEFAULT_CONFIDENCE_LEVEL
 
 @app.post("/api/predict-sarima")
-async def predict_sarima(request: SARIMAPredictionRequest):
+def predict_sarima(request: SARIMAPredictionRequest):
+    level = round(request.confidence_level, 4)
+    if request.weeks < 1:
+        raise HTTPException(status_code=400, detail="Le nombre de semaines doit être au moins 1")
     try:
-        # Déterminer la date de début des prédictions (s'assurer que c'est un lundi)
-        start_date = last_date + timedelta(weeks=1)
-        # Ajuster au lundi si nécessaire
-        start_date = start_date - timedelta(days=start_date.weekday())
-        
-        # Créer l'index des dates futures (uniquement des lundis)
-        future_index = pd.date_range(start=start_date, 
-                                   periods=request.weeks, 
-                                   freq='W-MON')  # W-MON force les dates à être des lundis
-        
-        # Faire les prévisions
-        future_forecast = sarima_model.get_forecast(steps=request.weeks)
-        future_mean = future_forecast.predicted_mean
-        future_ci = future_forecast.conf_int()
-        
-        # Construire la réponse
-        predictions = []
-        for date, pred, ci_lower, ci_upper in zip(future_index, future_mean, 
-                                                future_ci.iloc[:, 0], 
-                                                future_ci.iloc[:, 1]):
-            # Calculer la fin de la semaine (dimanche)
-            week_end = date + timedelta(days=6)  # +6 jours pour aller du lundi au dimanche
-            predictions.append({
-                "period": f"{date.strftime('%d/%m/%Y')} - {week_end.strftime('%d/%m/%Y')}",
-                "predicted_presences": round(pred, 2),
-                "confidence_interval": [round(ci_lower, 2), round(ci_upper, 2)]
-            })
-        
+        forecaster = rh_sarima.get()
+        if level not in forecaster["forecasts"]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Niveau de confiance non disponible : {request.confidence_level}. "
+                       f"Niveaux précalculés : {sorted(forecaster['forecasts'])}"
+            )
+
+        # Tranche de la table précalculée ; au-delà de l'horizon, calcul à la demande
+        if request.weeks <= SARIMA_MAX_HORIZON:
+            predictions = forecaster["forecasts"][level][:request.weeks]
+        else:
+            predictions = build_sarima_forecasts(
+                forecaster["model"], forecaster["last_date"], request.weeks, [level]
+            )[level]
+
         return {"predictions": predictions}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class BudgetScenario(BaseModel):
+    name: str
+    weekly_rate: Optional[float] = None  # coût par présence, identique chaque semaine
+    weekly_rates: Optional[List[float]] = None  # ou un coût par semaine (le dernier est prolongé)
+    presence_factor: float = 1.0  # ex. 1.1 pour +10 % de présences
+    fixed_weekly_cost: float = 0.0
+
+class BudgetSimulationRequest(BaseModel):
+    weeks: int = 52
+    n_paths: int = 5000
+    scenarios: List[BudgetScenario]
+    quantiles: List[float] = list(DEFAULT_QUANTILES)
+    seed: Optional[int] = None
+
+def _summary_rows(summary, periods):
+    """{'mean': [...], 'q5': [...]} -> [{'period', 'mean', 'q5', ...}] arrondis à 2 décimales"""
+    rounded = {key: np.round(values, 2).tolist() for key, values in summary.items()}
+    return [
+        {"period": period, **{key: values[i] for key, values in rounded.items()}}
+        for i, period in enumerate(periods)
+    ]
+
+@app.post("/api/simulate-budget")
+def simulate_rh_budget(request: BudgetSimulationRequest):
+    """
+    Simulation Monte-Carlo du budget de personnel : trajectoires de présences
+    tirées du modèle SARIMA, coûts appliqués par scénario, quantiles du budget
+    hebdomadaire, cumulé et total
+    """
+    if not 1 <= request.weeks <= SARIMA_MAX_HORIZON:
+        raise HTTPException(status_code=400, detail=f"Le nombre de semaines doit être entre 1 et {SARIMA_MAX_HORIZON}")
+    if not 1 <= request.n_paths <= BUDGET_SIMULATION_MAX_PATHS:
+        raise HTTPException(status_code=400, detail=f"Le nombre de trajectoires doit être entre 1 et {BUDGET_SIMULATION_MAX_PATHS}")
+    if not request.scenarios:
+        raise HTTPException(status_code=400, detail="Au moins un scénario est requis")
+    if not request.quantiles or any(not 0 <= q <= 1 for q in request.quantiles):
+        raise HTTPException(status_code=400, detail="Les quantiles doivent être compris entre 0 et 1")
+    scenarios = []
+    for scenario in request.scenarios:
+        rates = scenario.weekly_rates if scenario.weekly_rates else scenario.weekly_rate
+        if rates is None:
+            raise HTTPException(status_code=400, detail=f"Scénario '{scenario.name}' : weekly_rate ou weekly_rates requis")
+        scenarios.append({
+            "name": scenario.name,
+            "rates": rates,
+            "presence_factor": scenario.presence_factor,
+            "fixed_weekly_cost": scenario.fixed_weekly_cost
+        })
+    if len({s["name"] for s in scenarios}) != len(scenarios):
+        raise HTTPException(status_code=400, detail="Les noms de scénarios doivent être uniques")
+
+    try:
+        forecaster = rh_sarima.get()
+        start = time.perf_counter()
+        quantiles = sorted(set(request.quantiles))
+        simulation = simulate_budget(forecaster["model"], request.weeks, scenarios,
+                                     n_paths=request.n_paths, quantiles=quantiles, seed=request.seed)
+        periods = sarima_periods(forecaster["last_date"], request.weeks)
+        return {
+            "n_paths": request.n_paths,
+            "quantiles": [quantile_key(q) for q in quantiles],
+            "presences": _summary_rows(simulation["presences"], periods),
+            "scenarios": {
+                name: {
+                    "weekly": _summary_rows(result["weekly"], periods),
+                    "cumulative": _summary_rows(result["cumulative"], periods),
+                    "total": {key: round(value, 2) for key, value in result["total"].items()}
+                }
+                for name, result in simulation["scenarios"].items()
+            },
+            "simulation_seconds": round(time.perf_counter() - start, 3)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class CommandeForecastRequest(BaseModel):
+    model: str = "prophet_global"  # exp_smoothing, prophet_global ou prophet_article
+    horizon: int = 7
+    article: Optional[str] = None
+
+@app.post("/api/predict-commande")
+def predict_commande(request: CommandeForecastRequest):
+    """Prévision des commandes (tranche de la prévision précalculée sur 30 jours)"""
+    if not 1 <= request.horizon <= COMMANDE_MAX_HORIZON:
+        raise HTTPException(status_code=400, detail=f"L'horizon doit être compris entre 1 et {COMMANDE_MAX_HORIZON} jours")
+    try:
+        registry = commande_models.get()
+        results = registry.predict(request.model, request.horizon, request.article)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    results = results.astype(object).where(results.notna(), None)
+    results["date"] = results["date"].astype(str)
+    return {"model": request.model, "horizon": request.horizon, "predictions": results.to_dict(orient="records")}
+
+@app.get("/api/predict-commande/articles")
+async def list_commande_articles():
+    """Articles disposant d'un modèle Prophet"""
+    return {"articles": commande_registry.available_articles(), "cache": commande_registry.stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,137 @@
+"""
+Initialisation paresseuse des sous-systèmes d'un service.
+
+Aucun modèle ni fichier de données n'est chargé à l'import du service : chaque
+sous-système est initialisé à son premier usage, ou plus tôt par le
+préchauffage lancé au démarrage dans un thread. Un fichier manquant rend le
+sous-système indisponible (état "failed") sans arrêter le worker ; l'erreur
+est exposée par /healthz et /readyz et l'initialisation est retentée au
+prochain usage.
+
+get() charge de façon synchrone : les handlers qui l'appellent doivent être
+des `def` (exécutés dans le threadpool), jamais des `async def` qui
+bloqueraient la boucle d'événements. Tant qu'un sous-système est en cours de
+chargement ou en échec, get() lève SubsystemUnavailable, rendu en 503.
+"""
+import logging
+import threading
+import time
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+# Délai (secondes) suggéré aux clients avant de réessayer
+RETRY_AFTER = 5
+
+class SubsystemUnavailable(HTTPException):
+    """Sous-système en cours de chargement ou en échec : réponse 503 avec Retry-After"""
+    def __init__(self, name, error):
+        super().__init__(status_code=503, detail=f"Sous-système '{name}' indisponible : {error}",
+                         headers={"Retry-After": str(RETRY_AFTER)})
+        self.name = name
+
+class Subsystem:
+    """
+    Sous-système initialisé au premier appel de get().
+
+    `load` est rappelé à chaque get() (il doit donc être peu coûteux une fois
+    le sous-système prêt, par exemple ArtifactWatcher.get) ; seul le premier
+    appel réussi est mesuré.
+    """
+    def __init__(self, name, load, required=True):
+        self.name = name
+        self.load = load
+        self.required = required
+        self.state = PENDING
+        self.error = None
+        self.duration = None
+        self.ready_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.state == READY:
+            return self.load()
+        # Pas d'attente derrière un chargement en cours (préchauffage ou autre requête)
+        if not self._lock.acquire(blocking=False):
+            raise SubsystemUnavailable(self.name, "chargement en cours")
+        try:
+            if self.state != READY:
+                self.state = LOADING
+                start = time.perf_counter()
+                try:
+                    value = self.load()
+                except Exception as e:
+                    self.state = FAILED
+                    self.error = str(e)
+                    self.duration = time.perf_counter() - start
+                    logger.error(f"Initialisation de {self.name} impossible : {self.error}")
+                    raise SubsystemUnavailable(self.name, e) from e
+                self.state = READY
+                self.error = None
+                self.duration = time.perf_counter() - start
+                self.ready_at = time.time()
+                logger.info(f"{self.name} prêt en {self.duration:.2f}s")
+                return value
+        finally:
+            self._lock.release()
+        return self.load()
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "required": self.required,
+            "init_seconds": round(self.duration, 3) if self.duration is not None else None,
+            "error": self.error
+        }
+
+class SubsystemRegistry:
+    def __init__(self):
+        self.subsystems = {}
+        self.started_at = time.time()
+        self._warmup_thread = None
+
+    def register(self, name, load, required=True):
+        subsystem = Subsystem(name, load, required)
+        self.subsystems[name] = subsystem
+        return subsystem
+
+    def warm_up(self):
+        """Initialise tous les sous-systèmes dans un thread (une seule fois par processus)"""
+        if self._warmup_thread is not None:
+            return
+        self._warmup_thread = threading.Thread(target=self._warm_up_all, name="warmup", daemon=True)
+        self._warmup_thread.start()
+
+    def _warm_up_all(self):
+        for subsystem in self.subsystems.values():
+            try:
+                subsystem.get()
+            except SubsystemUnavailable:
+                pass
+
+    @property
+    def ready(self):
+        return all(s.state == READY for s in self.subsystems.values() if s.required)
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "subsystems": {name: s.to_dict() for name, s in self.subsystems.items()}
+        }
+
+    def health_response(self):
+        """Liveness : le processus répond, avec l'état de chaque sous-système"""
+        return {"status": "ok", **self.status()}
+
+    def readiness_response(self):
+        """Readiness : 200 quand tous les sous-systèmes requis sont prêts, 503 sinon"""
+        status = self.status()
+        return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
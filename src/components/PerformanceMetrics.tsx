@@ -32,6 +32,33 @@ type MetricsHistory = {
 }[];
 
 const API_URL = 'http://localhost:8001/api/performance'
+const JOB_POLL_INTERVAL_MS = 2000
+
+interface TrainingJob {
+  id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled' | 'interrupted';
+  progress: number;
+  message: string | null;
+  error: string | null;
+}
+
+async function waitForTrainingJob(
+  jobId: string,
+  onProgress: (progress: number, message: string) => void
+): Promise<TrainingJob> {
+  for (;;) {
+    const response = await fetch(`${API_URL}/jobs/${jobId}`);
+    if (!response.ok) {
+      throw new Error('Impossible de suivre l\'entraînement');
+    }
+    const job: TrainingJob = await response.json();
+    if (job.status !== 'queued' && job.status !== 'running') {
+      return job;
+    }
+    onProgress(job.progress, job.message ?? '');
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+}
 
 export function PerformanceMetrics() {
   const [data, setData] = useState<PerformanceData | null>(null);
@@ -119,6 +146,22 @@ export function PerformanceMetrics() {
         throw new Error('Erreur lors de l\'entraînement');
       }
 
+      // L'entraînement tourne en arrière-plan : suivi du job jusqu'à sa fin
+      const { job_id } = await response.json();
+      const job = await waitForTrainingJob(job_id, (progress, message) => {
+        setTrainingStatus(prev => ({
+          ...prev,
+          [modelName]: {
+            status: 'training',
+            message: `Entraînement en cours (${Math.round(progress * 100)}%) : ${message}`
+          }
+        }));
+      });
+
+      if (job.status !== 'succeeded') {
+        throw new Error(job.error || job.message || 'Erreur lors de l\'entraînement');
+      }
+
       setTrainingStatus(prev => ({
         ...prev,
         [modelName]: { status: 'success', message: 'Entraînement réussi!' }